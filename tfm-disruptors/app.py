@@ -1,30 +1,24 @@
-from src.etl.edlist_etl import procesar_edlist
-from src.etl.echa_etl import procesar_echa
-from src.etl.cosing_etl import procesar_cosing
-from src.etl.pesticidas_etl import procesar_pesticidas
-from src.etl.merge_edlist_echa_pesticidas_cosing import merge_edlist_echa_pesticidas
-from src.etl.lista_definitiva import lista_disruptores_definitiva
+from src.etl.pipeline_etl import ejecutar_etl
 
 from src.ocr.ocr_process import procesar_ocr
+from src.ocr.cache_ocr import obtener_cache
 from src.nlp.nlp_functions import normalize
 from src.nlp.nlp_entityruler import cargar_entity_ruler, analizar_texto
+from src.nlp.cache_textos import obtener_cache as obtener_cache_textos
 
 
 if __name__ == "__main__":
-    ### proceso ETL - Ejecutar SOLO 1 vez para generación de archivos ###
-    # procesar_edlist()
-    # procesar_echa()
-    # procesar_cosing()
-    # procesar_pesticidas()
-    # merge_edlist_echa_pesticidas()
-    # lista_disruptores_definitiva()
+    ### proceso ETL - Incremental: solo reconstruye las etapas cuyas entradas cambiaron (ver src/etl/pipeline_etl.py) ###
+    # edlist/echa/cosing/pesticidas (en paralelo) -> merge -> lista_definitiva -> patrones
+    # ejecutar_etl()
 
     # Carga de modelo NLP y Proceso OCR
     nlp_model = cargar_entity_ruler()
-    texto_ocr = procesar_ocr("etiqueta_153.jpg") # probar con: "etiqueta_001.jpg" a "etiqueta_170.jpg"
+    texto_ocr = procesar_ocr("etiqueta_153.jpg", cache=obtener_cache()) # probar con: "etiqueta_001.jpg" a "etiqueta_170.jpg"
+    print("Texto extraído:\n", texto_ocr)
 
     # Analizamos texto
-    entidades = analizar_texto(texto_ocr, nlp_model)
+    entidades = analizar_texto(texto_ocr, nlp_model, cache=obtener_cache_textos(nlp_model))
 
     # Mostramos el texto normalizado
     texto_normalizado = normalize(texto_ocr)
@@ -0,0 +1,79 @@
+import timeit
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.etl.merge_edlist_echa_pesticidas_cosing import nombre_mas_informativo_generico
+from benchmarks.corpus import RUTA_DISRUPTORES
+
+# PARA EJECUTAR:  python -m benchmarks.bench_nombre_informativo --factores 1 10 100
+# 1) Paridad: versión vectorizada == versión original por filas (apply axis=1) con nulos, iguales y empates
+# 2) Benchmark a 1x, 10x y 100x el tamaño de la tabla EDlist x ECHA actual
+
+
+def nombre_mas_informativo_original(df, col1, col2, nueva_col):
+    """Implementación original con apply por fila (referencia para la paridad)."""
+    def elegir_mas_informativo(row):
+        val1 = row[col1]
+        val2 = row[col2]
+
+        if pd.isna(val1):
+            return val2
+        if pd.isna(val2):
+            return val1
+        if val1 == val2:
+            return val1
+        return val1 if len(str(val1)) > len(str(val2)) else val2
+
+    df[nueva_col] = df.apply(elegir_mas_informativo, axis=1)
+    return df
+
+
+def tabla_nombres(n_filas, semilla=0):
+    """
+    Tabla sintética con dos columnas de nombres a partir de los nombres reales de disruptores_final:
+    ~20% de nulos en cada columna, ~20% de filas con el mismo nombre y empates de longitud.
+    """
+    nombres = pd.read_parquet(RUTA_DISRUPTORES, columns=["Name_Edlist_Echa", "Name_Chemical_Cosing", "nombre_etiqueta"])
+    nombres = pd.unique(nombres.stack().dropna().astype(str).to_numpy())
+    rnd = np.random.default_rng(semilla)
+    col1 = rnd.choice(nombres, n_filas).astype(object)
+    col2 = rnd.choice(nombres, n_filas).astype(object)
+
+    iguales = rnd.random(n_filas) < 0.2
+    col2[iguales] = col1[iguales]
+    empates = rnd.random(n_filas) < 0.05
+    col2[empates] = [s[::-1] for s in col1[empates]]   # misma longitud, distinto texto
+    col1[rnd.random(n_filas) < 0.2] = np.nan
+    col2[rnd.random(n_filas) < 0.2] = None
+    return pd.DataFrame({"Name and abbreviation": col1, "Substance name": col2})
+
+
+def test_paridad(n_filas=20000):
+    """Devuelve las filas donde difieren la versión original y la vectorizada (vacío = paridad)."""
+    df = tabla_nombres(n_filas, semilla=1)
+    esperado = nombre_mas_informativo_original(df.copy(), "Name and abbreviation", "Substance name", "nombre")["nombre"]
+    obtenido = nombre_mas_informativo_generico(df.copy(), "Name and abbreviation", "Substance name", "nombre")["nombre"]
+    distintos = ~((esperado == obtenido) | (esperado.isna() & obtenido.isna()))
+    return df[distintos]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paridad y benchmark de nombre_mas_informativo_generico.")
+    parser.add_argument("--filas-base", type=int, default=400, help="Filas de la tabla actual (EDlist x ECHA)")
+    parser.add_argument("--factores", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    distintos = test_paridad()
+    print(f"Paridad: {'OK' if distintos.empty else f'{len(distintos)} filas distintas'}\n")
+
+    for factor in args.factores:
+        df = tabla_nombres(args.filas_base * factor)
+        t_original = min(timeit.repeat(
+            lambda: nombre_mas_informativo_original(df.copy(), "Name and abbreviation", "Substance name", "n"),
+            number=1, repeat=args.repeticiones))
+        t_vector = min(timeit.repeat(
+            lambda: nombre_mas_informativo_generico(df.copy(), "Name and abbreviation", "Substance name", "n"),
+            number=1, repeat=args.repeticiones))
+        print(f"x{factor:<4} {len(df):>9} filas   apply: {t_original:8.4f} s   vectorizada: {t_vector:8.4f} s   x{t_original / t_vector:.0f}")
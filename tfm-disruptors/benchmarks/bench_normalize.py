@@ -0,0 +1,38 @@
+import timeit
+import argparse
+import pandas as pd
+
+from src.nlp.nlp_functions import normalize, normalize_series, get_tokens, to_lowercase, no_symbols
+from benchmarks.corpus import RUTA_BEAUTY, textos_corpus
+
+# PARA EJECUTAR:  python -m benchmarks.bench_normalize --n 20000
+# Micro-benchmark: original vs una pasada vs vectorizada (pd.Series). La paridad se comprueba en tests/test_normalize.py
+
+
+def normalize_original(text):
+    """Implementación original de normalize en varias pasadas (referencia del benchmark)."""
+    words = get_tokens(text)
+    words = to_lowercase(words)
+    words = no_symbols(words)
+    return " ".join(words)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark de normalize.")
+    parser.add_argument("--corpus", default=RUTA_BEAUTY)
+    parser.add_argument("--n", type=int, default=None)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    textos = textos_corpus(args.corpus, args.n)
+    serie = pd.Series(textos)
+    print(f"Textos: {len(textos)}\n")
+
+    tiempos = {
+        "original (por pasos)": min(timeit.repeat(lambda: [normalize_original(t) for t in textos], number=1, repeat=args.repeticiones)),
+        "una pasada": min(timeit.repeat(lambda: [normalize(t) for t in textos], number=1, repeat=args.repeticiones)),
+        "vectorizada (Series)": min(timeit.repeat(lambda: normalize_series(serie), number=1, repeat=args.repeticiones)),
+    }
+    base = tiempos["original (por pasos)"]
+    for nombre, t in tiempos.items():
+        print(f"{nombre:<22} {t:8.3f} s   {len(textos) / t:>10.0f} textos/s   x{base / t:.1f}")
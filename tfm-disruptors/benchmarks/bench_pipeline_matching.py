@@ -0,0 +1,84 @@
+import time
+import argparse
+import multiprocessing as mp
+import psutil
+
+from src.nlp.nlp_entityruler import cargar_pipeline, comparar_tokenizacion
+from src.nlp.nlp_functions import normalize
+from benchmarks.corpus import RUTA_BEAUTY, textos_corpus
+
+# PARA EJECUTAR:  python -m benchmarks.bench_pipeline_matching --n 20000
+# Compara el pipeline "matching" (spacy.blank + entity_ruler) con el "completo" (en_core_web_md + entity_ruler):
+# docs/seg, memoria (RSS) y que tokenización y entidades sean idénticas.
+
+# Casos delicados de tokenización: números CAS/EC y nombres INCI con guiones y comas
+TEXTOS_CONTROL = [
+    "CAS 128-37-0, EC 204-881-4: butylated hydroxytoluene",
+    "4-methylbenzylidene camphor, 3-benzylidene camphor, benzophenone-3, BP-3",
+    "2-bromo-2-nitropropane-1,3-diol; isoamyl p-methoxycinnamate; ci 77820 (silver)",
+    "butylated-hydroxy-toluene, butylatedhydroxytoluene, cyclomethicone 4, octoxynol-9",
+    "Aqua, Glycerin, Propylparaben, Butylparaben – Triclosan — Resorcinol 1,3-benzenediol",
+]
+
+
+def _medir_modo(modo, textos, batch_size, cola):
+    """Mide carga, velocidad y RSS de un modo en un proceso limpio (así la memoria de un modo no contamina al otro)."""
+    proceso = psutil.Process()
+    rss_inicio = proceso.memory_info().rss
+
+    inicio = time.perf_counter()
+    nlp = cargar_pipeline(modo=modo)
+    carga = time.perf_counter() - inicio
+
+    normalizados = [normalize(t) for t in textos]
+    inicio = time.perf_counter()
+    entidades = [[(e.text, e.ent_id_, e.label_) for e in doc.ents] for doc in nlp.pipe(normalizados, batch_size=batch_size)]
+    duracion = time.perf_counter() - inicio
+
+    cola.put({
+        "modo": modo,
+        "componentes": nlp.pipe_names,
+        "carga_s": round(carga, 2),
+        "docs_seg": round(len(textos) / duracion, 1),
+        "rss_mb": round(proceso.memory_info().rss / 2**20, 1),
+        "rss_incremento_mb": round((proceso.memory_info().rss - rss_inicio) / 2**20, 1),
+        "entidades": entidades,
+    })
+
+
+def medir(modo, textos, batch_size):
+    ctx = mp.get_context("spawn")
+    cola = ctx.Queue()
+    p = ctx.Process(target=_medir_modo, args=(modo, textos, batch_size, cola))
+    p.start()
+    resultado = cola.get()
+    p.join()
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pipeline matching vs completo.")
+    parser.add_argument("--corpus", default=RUTA_BEAUTY, help="Parquet de Open Beauty Facts")
+    parser.add_argument("--n", type=int, default=None, help="Nº de textos (por defecto, todos)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    textos = textos_corpus(args.corpus, args.n)
+    print(f"Textos: {len(textos)}\n")
+
+    resultados = {modo: medir(modo, textos, args.batch_size) for modo in ("completo", "matching")}
+    for r in resultados.values():
+        print({k: v for k, v in r.items() if k != "entidades"})
+
+    # Paridad: mismas entidades en todo el corpus y misma tokenización en corpus + casos de control
+    iguales = resultados["completo"]["entidades"] == resultados["matching"]["entidades"]
+    print(f"\nEntidades idénticas en todo el corpus: {iguales}")
+
+    diferencias = comparar_tokenizacion(cargar_pipeline(modo="completo"), cargar_pipeline(modo="matching"),
+                                        TEXTOS_CONTROL + textos)
+    print(f"Textos con tokenización distinta: {len(diferencias)}")
+    for texto, tokens_a, tokens_b in diferencias[:5]:
+        print(" -", texto[:80], "\n   completo:", tokens_a[:20], "\n   matching:", tokens_b[:20])
+
+    velocidad = resultados["matching"]["docs_seg"] / resultados["completo"]["docs_seg"]
+    print(f"\nSpeedup matching vs completo: x{velocidad:.1f}")
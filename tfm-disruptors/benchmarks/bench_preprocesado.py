@@ -0,0 +1,73 @@
+import os
+import time
+import argparse
+import statistics
+import pandas as pd
+
+from src.ocr.ocr_process import leer_texto
+from src.ocr.ocr_reader import precargar_reader
+from src.nlp.nlp_entityruler import cargar_entity_ruler, analizar_texto
+from src.nlp.nlp_functions import make_ent_id
+
+# PARA EJECUTAR:  python -m benchmarks.bench_preprocesado --n 30
+# Compara latencia de OCR y recall de entidades para cada tamaño de lado largo (None = imagen original).
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RUTA_ETIQUETAS = os.path.join(BASE_DIR, "data", "raw", "etiquetas")
+RUTA_DISRUPTORES = os.path.join(BASE_DIR, "data", "processed", "disruptores_final.parquet")
+
+
+def ids_esperados_por_imagen(df):
+    """Devuelve {imagen: {ent_id, ...}} a partir de la columna imagen_nombre ('etiqueta_001.jpg/etiqueta_002.jpg')."""
+    esperados = {}
+    for _, r in df[df["imagen_nombre"].notna()].iterrows():
+        ent_id = make_ent_id(r["CAS Number"], r["EC Number"])
+        for imagen in str(r["imagen_nombre"]).split("/"):
+            esperados.setdefault(imagen.strip(), set()).add(ent_id)
+    return esperados
+
+
+def medir(imagenes, esperados, nlp_model, preprocesado):
+    """OCR + NER de cada imagen con un preprocesado. Devuelve latencias (s) y el recall de entidades."""
+    latencias, encontrados, total = [], 0, 0
+    for imagen in imagenes:
+        inicio = time.perf_counter()
+        texto = leer_texto(os.path.join(RUTA_ETIQUETAS, imagen), preprocesado=preprocesado)
+        latencias.append(time.perf_counter() - inicio)
+
+        detectados = {ent_id for _, ent_id, _ in analizar_texto(texto, nlp_model)}
+        encontrados += len(esperados[imagen] & detectados)
+        total += len(esperados[imagen])
+    return latencias, (encontrados / total if total else float("nan"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del preprocesado de imágenes antes del OCR.")
+    parser.add_argument("--n", type=int, default=None, help="Nº de imágenes etiquetadas a usar (por defecto, todas)")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[0, 2560, 1920, 1600, 1280, 960],
+                        help="Lados largos a probar (0 = imagen original sin preprocesar)")
+    parser.add_argument("--color", action="store_true", help="No pasar a gris")
+    parser.add_argument("--recortar", action="store_true", help="Recortar a la zona de texto")
+    args = parser.parse_args()
+
+    esperados = ids_esperados_por_imagen(pd.read_parquet(RUTA_DISRUPTORES))
+    imagenes = sorted(i for i in esperados if os.path.isfile(os.path.join(RUTA_ETIQUETAS, i)))[:args.n]
+    print(f"Imágenes etiquetadas: {len(imagenes)}")
+
+    nlp_model = cargar_entity_ruler()
+    print(f"Carga del lector OCR: {precargar_reader():.2f} s\n")
+
+    filas = []
+    for lado in args.escalas:
+        preprocesado = None if not lado else {"lado_max": lado, "gris": not args.color, "recortar": args.recortar}
+        latencias, recall = medir(imagenes, esperados, nlp_model, preprocesado)
+        filas.append({
+            "lado_max": lado or "original",
+            "media_s": round(statistics.mean(latencias), 3),
+            "p50_s": round(statistics.median(latencias), 3),
+            "max_s": round(max(latencias), 3),
+            "recall": round(recall, 3),
+        })
+        print(filas[-1])
+
+    print("\n", pd.DataFrame(filas).to_string(index=False))
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import base64
+import argparse
+import threading
+import http.client
+import numpy as np
+
+from benchmarks.corpus import BASE_DIR, RUTA_BEAUTY, textos_corpus
+
+# PARA EJECUTAR (con el servicio arrancado:  python -m src.servicio.api --port 8000):
+#   python -m benchmarks.carga_api --ruta /score-text --peticiones 2000 --concurrencia 8
+#   python -m benchmarks.carga_api --ruta /score-texts --lote 64
+#   python -m benchmarks.carga_api --ruta /score-image --peticiones 50 --concurrencia 2
+# Prueba de carga local: cada hilo mantiene una conexión persistente y envía peticiones en bucle.
+# Informa de latencia p50/p99 (ms), peticiones/s y, en las rutas por lotes, textos/s.
+
+DIR_ETIQUETAS = os.path.join(BASE_DIR, "data", "raw", "etiquetas")
+
+
+def cuerpos_peticion(ruta, corpus, n_textos, lote, n_imagenes):
+    """Lista de (cuerpo en bytes, Content-Type, elementos por petición) según la ruta a probar."""
+    if ruta in ("/score-image", "/score-images"):
+        nombres = sorted(f for f in os.listdir(DIR_ETIQUETAS) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        imagenes = []
+        for nombre in nombres[:n_imagenes]:
+            with open(os.path.join(DIR_ETIQUETAS, nombre), "rb") as f:
+                imagenes.append(f.read())
+        if ruta == "/score-image":
+            return [(img, "application/octet-stream", 1) for img in imagenes]
+        b64 = [base64.b64encode(img).decode("ascii") for img in imagenes]
+        return [(json.dumps({"imagenes": b64[i:i + lote]}).encode("utf-8"), "application/json", len(b64[i:i + lote]))
+                for i in range(0, len(b64), lote)]
+
+    textos = textos_corpus(corpus, n_textos)
+    if ruta == "/score-text":
+        return [(json.dumps({"texto": t}).encode("utf-8"), "application/json", 1) for t in textos]
+    return [(json.dumps({"textos": textos[i:i + lote]}).encode("utf-8"), "application/json", len(textos[i:i + lote]))
+            for i in range(0, len(textos), lote)]
+
+
+def prueba_carga(host, puerto, ruta, cuerpos, n_peticiones, concurrencia, timeout=300):
+    """
+    Lanza n_peticiones repartidas entre 'concurrencia' hilos (cada uno con su conexión HTTP/1.1).
+    Devuelve (latencias en s de las peticiones correctas, elementos procesados, errores, segundos totales).
+    """
+    siguiente = iter(range(n_peticiones))
+    lock = threading.Lock()
+    latencias, errores, elementos = [], [], [0]
+
+    def trabajador():
+        conexion = http.client.HTTPConnection(host, puerto, timeout=timeout)
+        while True:
+            with lock:
+                i = next(siguiente, None)
+            if i is None:
+                break
+            cuerpo, tipo, n = cuerpos[i % len(cuerpos)]
+            inicio = time.perf_counter()
+            try:
+                conexion.request("POST", ruta, body=cuerpo, headers={"Content-Type": tipo})
+                respuesta = conexion.getresponse()
+                datos = respuesta.read()
+                duracion = time.perf_counter() - inicio
+            except (OSError, http.client.HTTPException) as e:
+                conexion.close()
+                conexion = http.client.HTTPConnection(host, puerto, timeout=timeout)
+                with lock:
+                    errores.append(f"{type(e).__name__}: {e}")
+                continue
+            with lock:
+                if respuesta.status == 200:
+                    latencias.append(duracion)
+                    elementos[0] += n
+                else:
+                    errores.append(f"{respuesta.status}: {datos[:200].decode('utf-8', 'replace')}")
+        conexion.close()
+
+    hilos = [threading.Thread(target=trabajador) for _ in range(concurrencia)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return latencias, elementos[0], errores, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga del servicio HTTP de disruptores.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ruta", default="/score-text", choices=["/score-text", "/score-texts", "/score-image", "/score-images"])
+    parser.add_argument("--peticiones", type=int, default=1000)
+    parser.add_argument("--concurrencia", type=int, default=4)
+    parser.add_argument("--lote", type=int, default=32, help="Elementos por petición en las rutas por lotes")
+    parser.add_argument("--corpus", default=RUTA_BEAUTY)
+    parser.add_argument("--n-textos", type=int, default=5000)
+    parser.add_argument("--n-imagenes", type=int, default=20)
+    parser.add_argument("--calentamiento", type=int, default=10, help="Peticiones previas que no se miden")
+    args = parser.parse_args()
+
+    cuerpos = cuerpos_peticion(args.ruta, args.corpus, args.n_textos, args.lote, args.n_imagenes)
+    if not cuerpos:
+        raise SystemExit("No hay datos para construir las peticiones")
+    prueba_carga(args.host, args.port, args.ruta, cuerpos, args.calentamiento, 1)
+
+    latencias, elementos, errores, total = prueba_carga(args.host, args.port, args.ruta, cuerpos,
+                                                        args.peticiones, args.concurrencia)
+    print(f"Ruta: {args.ruta} | Peticiones: {args.peticiones} | Concurrencia: {args.concurrencia} | Errores: {len(errores)}")
+    if latencias:
+        ms = np.array(latencias) * 1000
+        print(f"Latencia p50: {np.percentile(ms, 50):.1f} ms | p99: {np.percentile(ms, 99):.1f} ms | máx: {ms.max():.1f} ms")
+        print(f"Rendimiento: {len(latencias) / total:.1f} peticiones/s | {elementos / total:.1f} elementos/s")
+    for error in errores[:5]:
+        print(" -", error)
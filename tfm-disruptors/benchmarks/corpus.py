@@ -0,0 +1,32 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Corpus usados por los benchmarks
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+RUTA_BEAUTY = os.path.join(BASE_DIR, "data", "raw", "beauty.parquet")
+RUTA_DISRUPTORES = os.path.join(BASE_DIR, "data", "processed", "disruptores_final.parquet")
+
+
+def extract_text(x):
+    """Extrae el valor asociado a la clave 'text' de un array de diccionarios (igual que en NLP_analisis_beauty)."""
+    if isinstance(x, (np.ndarray, list)):
+        for it in x:
+            if isinstance(it, dict) and "text" in it:
+                return it.get("text") or None
+        return None
+    return x if isinstance(x, str) and x else None
+
+
+def textos_corpus(ruta=RUTA_BEAUTY, n=None):
+    """
+    Devuelve una lista de ingredients_text del dataset de Open Beauty Facts (beauty.parquet).
+    Si no está descargado, usa los textos etiquetados de disruptores_final (columna texto).
+    """
+    if os.path.isfile(ruta):
+        serie = pd.read_parquet(ruta, columns=["ingredients_text"])["ingredients_text"].map(extract_text)
+    else:
+        print(f"No existe {ruta}: se usan los textos etiquetados de disruptores_final.parquet")
+        serie = pd.read_parquet(RUTA_DISRUPTORES, columns=["texto"])["texto"]
+    textos = serie.dropna().astype(str).tolist()
+    return textos[:n] if n else textos
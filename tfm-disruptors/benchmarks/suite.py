@@ -0,0 +1,305 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+import tempfile
+import contextlib
+import multiprocessing as mp
+from importlib import metadata
+
+import psutil
+import pandas as pd
+
+from benchmarks.corpus import BASE_DIR, RUTA_DISRUPTORES, textos_corpus
+
+# PARA EJECUTAR:  python -m benchmarks.suite ejecutar                          (todas las pruebas)
+#                 python -m benchmarks.suite ejecutar --solo normalize etl_cosing -o actual.json
+#                 python -m benchmarks.suite comparar baseline.json actual.json --umbral 0.15
+# Suite de benchmarks reproducible sobre los puntos de entrada reales: OCR, normalize, build_patterns_from_df,
+# arranque en frío de cargar_entity_ruler, analizar_texto (uno a uno y por lotes) y cada etapa del ETL
+# con los Excel de data/raw. Guarda un JSON con los tiempos y los metadatos del entorno; 'comparar' marca
+# las regresiones frente a un JSON de referencia y termina con código 1 si hay alguna.
+
+DIR_RESULTADOS = os.path.join(BASE_DIR, "data", "processed", "benchmarks")
+RUTA_ETIQUETAS = os.path.join(BASE_DIR, "data", "raw", "etiquetas")
+PAQUETES = ["numpy", "pandas", "pyarrow", "spacy", "easyocr", "torch", "opencv-python", "openpyxl",
+            "python-calamine", "rapidfuzz"]
+UMBRAL_REGRESION = 0.15
+
+
+class Omitida(Exception):
+    """La prueba no se puede ejecutar en este entorno (falta un archivo o una dependencia)."""
+
+
+def entorno():
+    """Metadatos del entorno para poder comparar resultados: Python, SO, CPU, memoria, paquetes y commit."""
+    versiones = {}
+    for paquete in PAQUETES:
+        try:
+            versiones[paquete] = metadata.version(paquete)
+        except metadata.PackageNotFoundError:
+            versiones[paquete] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+        "memoria_gb": round(psutil.virtual_memory().total / 2**30, 1),
+        "commit": commit,
+        "paquetes": versiones,
+    }
+
+
+def medir(funcion, repeticiones, calentamiento=1, preparar=None):
+    """
+    Ejecuta la función 'calentamiento' veces sin medir y 'repeticiones' veces midiendo. Devuelve los tiempos (s).
+    Con preparar, antes de cada ejecución se llama (sin medir) a preparar() y la función recibe lo que devuelve.
+    """
+    def una_vez():
+        if preparar is None:
+            inicio = time.perf_counter()
+            funcion()
+        else:
+            estado = preparar()
+            inicio = time.perf_counter()
+            funcion(estado)
+        return time.perf_counter() - inicio
+
+    for _ in range(calentamiento):
+        una_vez()
+    return [una_vez() for _ in range(repeticiones)]
+
+
+def resumen(tiempos, n=None):
+    """Estadísticos de una serie de tiempos; con n (elementos por ejecución) añade el rendimiento por segundo."""
+    mediana = statistics.median(tiempos)
+    datos = {"mediana_s": round(mediana, 6), "min_s": round(min(tiempos), 6), "max_s": round(max(tiempos), 6),
+             "repeticiones": len(tiempos)}
+    if n:
+        datos["n"] = n
+        datos["por_segundo"] = round(n / mediana, 1) if mediana else None
+    return datos
+
+
+### Pruebas. Cada una recibe los argumentos de la línea de comandos y devuelve el resumen de resumen()
+
+def prueba_ocr(args):
+    """procesar_ocr sobre un subconjunto fijo (las primeras n imágenes en orden) de data/raw/etiquetas."""
+    try:
+        from src.ocr.ocr_process import procesar_ocr
+        from src.ocr.ocr_reader import precargar_reader
+    except ImportError as e:
+        raise Omitida(f"OCR no disponible ({e})")
+    imagenes = sorted(os.listdir(RUTA_ETIQUETAS))[:args.imagenes]
+    precargar_reader()
+
+    def ocr():
+        for imagen in imagenes:
+            procesar_ocr(os.path.join(RUTA_ETIQUETAS, imagen))
+    return resumen(medir(ocr, max(1, args.repeticiones // 3), calentamiento=0), len(imagenes))
+
+
+def prueba_normalize(args):
+    from src.nlp.nlp_functions import normalize
+    textos = textos_corpus(n=args.textos)
+    return resumen(medir(lambda: [normalize(t) for t in textos], args.repeticiones), len(textos))
+
+
+def prueba_build_patterns(args):
+    from src.nlp.nlp_functions import build_patterns_from_df
+    disruptores = pd.read_parquet(RUTA_DISRUPTORES)
+    return resumen(medir(lambda: build_patterns_from_df(disruptores), args.repeticiones), len(disruptores))
+
+
+def _arranque_en_frio(cola):
+    """En un proceso nuevo: importación de spaCy y del módulo y carga del pipeline compilado."""
+    inicio = time.perf_counter()
+    from src.nlp.nlp_entityruler import cargar_entity_ruler
+    importacion = time.perf_counter() - inicio
+    cargar_entity_ruler()
+    cola.put((importacion, time.perf_counter() - inicio))
+
+
+def prueba_cargar_entity_ruler(args):
+    """Arranque en frío (proceso nuevo cada vez) de cargar_entity_ruler. El pipeline se compila antes si falta."""
+    from src.nlp.nlp_entityruler import cargar_entity_ruler
+    cargar_entity_ruler()
+    ctx = mp.get_context("spawn")
+    tiempos, importaciones = [], []
+    for _ in range(max(1, args.repeticiones // 2)):
+        cola = ctx.Queue()
+        p = ctx.Process(target=_arranque_en_frio, args=(cola,))
+        p.start()
+        importacion, total = cola.get()
+        p.join()
+        importaciones.append(importacion)
+        tiempos.append(total)
+    return {**resumen(tiempos), "importacion_mediana_s": round(statistics.median(importaciones), 6)}
+
+
+def prueba_analizar_texto(args):
+    from src.nlp.nlp_entityruler import cargar_entity_ruler, analizar_texto
+    nlp_model = cargar_entity_ruler()
+    textos = textos_corpus(n=args.textos)
+    return resumen(medir(lambda: [analizar_texto(t, nlp_model) for t in textos], args.repeticiones), len(textos))
+
+
+def prueba_analizar_textos_lote(args):
+    from src.nlp.nlp_entityruler import cargar_entity_ruler, analizar_textos
+    nlp_model = cargar_entity_ruler()
+    textos = textos_corpus(n=args.textos)
+    return resumen(medir(lambda: list(analizar_textos(textos, nlp_model, batch_size=256)), args.repeticiones), len(textos))
+
+
+def _prueba_etapa(nombre):
+    """
+    Prueba de una etapa del ETL (ver pipeline_etl.ETAPAS). Cada ejecución (también el calentamiento) escribe en un
+    data/processed temporal nuevo con solo sus entradas: así no reutiliza cachés de la anterior (p. ej. las copias
+    Parquet de los anexos de COSING) y se mide siempre la etapa completa.
+    """
+    def prueba(args):
+        from src.etl.pipeline_etl import ETAPAS, RAW_DIR, ruta_absoluta, _ejecutar_etapa
+        for entrada in ETAPAS[nombre]["entradas"]:
+            if not os.path.isfile(ruta_absoluta(entrada, RAW_DIR, args.processed_etl)):
+                raise Omitida(f"falta {entrada}")
+
+        with tempfile.TemporaryDirectory() as base_tmp:
+            carpetas = []
+
+            def preparar():
+                # Entradas de data/processed: la salida de la etapa anterior si ya se midió en esta ejecución,
+                # si no la copia de data/processed del proyecto (args.processed_etl, ver ejecutar)
+                processed_tmp = tempfile.mkdtemp(dir=base_tmp)
+                for entrada in ETAPAS[nombre]["entradas"]:
+                    if entrada.startswith("processed/"):
+                        destino = ruta_absoluta(entrada, RAW_DIR, processed_tmp)
+                        os.makedirs(os.path.dirname(destino), exist_ok=True)
+                        shutil.copy2(ruta_absoluta(entrada, RAW_DIR, args.processed_etl), destino)
+                carpetas.append(processed_tmp)
+                return processed_tmp
+
+            with contextlib.redirect_stdout(None):
+                tiempos = medir(lambda processed_tmp: _ejecutar_etapa(nombre, RAW_DIR, processed_tmp), args.repeticiones,
+                                preparar=preparar)
+
+            # Las salidas de la última ejecución quedan disponibles para las etapas siguientes
+            processed_tmp = carpetas[-1]
+            for salida in ETAPAS[nombre]["salidas"]:
+                if salida.startswith("processed/"):
+                    destino = ruta_absoluta(salida, RAW_DIR, args.processed_etl)
+                    os.makedirs(os.path.dirname(destino), exist_ok=True)
+                    shutil.copy2(ruta_absoluta(salida, RAW_DIR, processed_tmp), destino)
+        return resumen(tiempos)
+    return prueba
+
+
+PRUEBAS = {
+    "ocr": prueba_ocr,
+    "normalize": prueba_normalize,
+    "build_patterns": prueba_build_patterns,
+    "cargar_entity_ruler": prueba_cargar_entity_ruler,
+    "analizar_texto": prueba_analizar_texto,
+    "analizar_textos_lote": prueba_analizar_textos_lote,
+    **{f"etl_{etapa}": _prueba_etapa(etapa) for etapa in ("edlist", "echa", "cosing", "pesticidas", "merge", "lista_definitiva")},
+}
+
+
+def ejecutar(args):
+    """Ejecuta las pruebas elegidas y devuelve {"entorno", "parametros", "resultados"}."""
+    resultados = {}
+    with tempfile.TemporaryDirectory() as processed_etl:
+        # Copia de data/processed para encadenar las etapas del ETL sin tocar los archivos del proyecto
+        from src.etl.pipeline_etl import PROCESSED_DIR
+        if os.path.isdir(PROCESSED_DIR):
+            shutil.copytree(PROCESSED_DIR, processed_etl, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns("nlp_pipeline", "benchmarks", "ocr_cache*"))
+        args.processed_etl = processed_etl
+
+        for nombre in args.solo or PRUEBAS:
+            try:
+                resultados[nombre] = PRUEBAS[nombre](args)
+                print(f"[{nombre}] mediana {resultados[nombre]['mediana_s']:.4f} s")
+            except Omitida as e:
+                resultados[nombre] = {"omitida": str(e)}
+                print(f"[{nombre}] omitida ({e})")
+    parametros = {"repeticiones": args.repeticiones, "textos": args.textos, "imagenes": args.imagenes}
+    return {"entorno": entorno(), "parametros": parametros, "resultados": resultados}
+
+
+def comparar(referencia, actual, umbral=UMBRAL_REGRESION):
+    """
+    Compara la mediana de cada prueba con la de referencia. Devuelve un DataFrame con el cociente
+    actual / referencia y el estado: "regresión" si es mayor que 1 + umbral, "mejora" si es menor que 1 - umbral.
+    """
+    filas = []
+    for nombre in sorted(set(referencia["resultados"]) | set(actual["resultados"])):
+        ref = referencia["resultados"].get(nombre, {}).get("mediana_s")
+        act = actual["resultados"].get(nombre, {}).get("mediana_s")
+        if ref is None or act is None:
+            filas.append({"prueba": nombre, "referencia_s": ref, "actual_s": act, "cociente": None, "estado": "sin datos"})
+            continue
+        cociente = act / ref if ref else float("inf")
+        estado = "regresión" if cociente > 1 + umbral else "mejora" if cociente < 1 - umbral else "igual"
+        filas.append({"prueba": nombre, "referencia_s": ref, "actual_s": act, "cociente": round(cociente, 3), "estado": estado})
+    return pd.DataFrame(filas)
+
+
+def cargar_json(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suite de benchmarks del proyecto.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_ejecutar = sub.add_parser("ejecutar", help="Ejecuta las pruebas y guarda el JSON de resultados")
+    p_ejecutar.add_argument("--solo", nargs="+", choices=list(PRUEBAS), help="Pruebas a ejecutar (por defecto, todas)")
+    p_ejecutar.add_argument("-o", "--salida", default=None, help="JSON de salida (por defecto, en data/processed/benchmarks)")
+    p_ejecutar.add_argument("-r", "--repeticiones", type=int, default=5)
+    p_ejecutar.add_argument("--textos", type=int, default=2000, help="Nº de textos del corpus para las pruebas NLP")
+    p_ejecutar.add_argument("--imagenes", type=int, default=5, help="Nº de imágenes de etiquetas para el OCR")
+    p_ejecutar.add_argument("--referencia", default=None, help="JSON con el que comparar al terminar")
+    p_ejecutar.add_argument("--umbral", type=float, default=UMBRAL_REGRESION)
+
+    p_comparar = sub.add_parser("comparar", help="Compara dos JSON de resultados")
+    p_comparar.add_argument("referencia")
+    p_comparar.add_argument("actual")
+    p_comparar.add_argument("--umbral", type=float, default=UMBRAL_REGRESION,
+                            help="Empeoramiento relativo de la mediana a partir del cual hay regresión (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    if args.comando == "ejecutar":
+        datos = ejecutar(args)
+        salida = args.salida or os.path.join(DIR_RESULTADOS, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+        with open(salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados en {salida}")
+        if not args.referencia:
+            sys.exit(0)
+        referencia, actual = cargar_json(args.referencia), datos
+    else:
+        referencia, actual = cargar_json(args.referencia), cargar_json(args.actual)
+
+    # Las mediciones solo son comparables en el mismo entorno: avisamos de lo que cambió
+    for clave in ("python", "plataforma", "procesador", "nucleos", "paquetes"):
+        if referencia["entorno"].get(clave) != actual["entorno"].get(clave):
+            print(f"Aviso: el entorno difiere en '{clave}': {referencia['entorno'].get(clave)} -> {actual['entorno'].get(clave)}")
+
+    tabla = comparar(referencia, actual, args.umbral)
+    print(tabla.to_string(index=False))
+    regresiones = tabla[tabla["estado"] == "regresión"]
+    print(f"\nRegresiones (> {args.umbral:.0%} más lentas): {len(regresiones)}")
+    sys.exit(1 if len(regresiones) else 0)
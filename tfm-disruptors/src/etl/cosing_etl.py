@@ -1,44 +1,98 @@
 import os
+import glob
 import pandas as pd
 import numpy as np
-# from utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null    # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
-from src.etl.utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null
-
-def procesar_cosing(data_raw=None, data_processed=None):
-    """Procesa los anexos de la base de datos COSING y devuelve un DataFrame limpio."""
+from concurrent.futures import ProcessPoolExecutor
+# from utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null, emparejar_cas_ec    # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
+from src.etl.utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null, emparejar_cas_ec
+from src.utils_hash import hash_archivo
+
+# calamine (python-calamine) lee los xlsx mucho más rápido que openpyxl; si no está instalado se usa openpyxl
+try:
+    import python_calamine  # noqa: F401
+    MOTOR_EXCEL = "calamine"
+except ImportError:
+    MOTOR_EXCEL = "openpyxl"
+
+# Definimos los headers.
+header_2 = ['Reference Number', 'Chemical name','CAS Number', 'EC Number', 'Regulation', 'Other Directives/Regulations', 
+            'SCCS opinions', 'Chemical/IUPAC Name', 'Identified INGREDIENTS or substances e.g.', 'CMR', 'Update date']
+
+
+header = ['Reference Number', 'Chemical name', 'Name of Common Ingredients Glossary',
+          'CAS Number', 'EC Number', 'Product Type, body parts', 'Maximum concentration in ready for use preparation',
+          'Other Restrictions', 'Wording of conditions of use and warnings', 'Regulation',
+          'Other Directives/Regulations', 'SCCS opinions', 'Chemical/IUPAC Name',
+          'Identified INGREDIENTS or substances e.g.', 'CMR', 'Update date']
+
+header_4 = ['Reference Number', 'Chemical name', 'Name of Common Ingredients Glossary',
+            'CAS Number', 'EC Number', 'Color', 'Product Type, body parts', 'Maximum concentration in ready for use preparation',
+            'Other Restrictions', 'Wording of conditions of use and warnings', 'Regulation',
+            'Other Directives/Regulations', 'SCCS opinions', 'Chemical/IUPAC Name',
+            'Identified INGREDIENTS or substances e.g.', 'CMR', 'Update date']
+
+# Anexos: etiqueta -> (archivo, headers)
+ANEXOS = {
+    'Anexo_2': ("COSING_Annex_II_v2.xlsx", header_2),
+    'Anexo_3': ("COSING_Annex_III_v2.xlsx", header),
+    'Anexo_4': ("COSING_Annex_IV_v2.xlsx", header_4),
+    'Anexo_5': ("COSING_Annex_V_v2.xlsx", header),
+    'Anexo_6': ("COSING_Annex_VI_v2.xlsx", header),
+}
+
+# Columnas que se usan después: solo estas se leen del Excel
+COLUMNAS_COSING = ['Chemical name', 'Chemical/IUPAC Name', 'Identified INGREDIENTS or substances e.g.',
+                   'CAS Number', 'EC Number', 'Name of Common Ingredients Glossary', 'Product Type, body parts']
+
+
+def cargar_anexo(ruta, columnas, dir_cache=None):
+    """
+    Carga un anexo con solo las COLUMNAS_COSING que tiene (por posición; las 8 primeras filas son cabecera).
+    Si se da dir_cache guarda una copia en Parquet con el hash del libro en el nombre: mientras el Excel
+    no cambie, las siguientes ejecuciones leen el Parquet y no vuelven a parsear el Excel.
+    """
+    posiciones = [i for i, c in enumerate(columnas) if c in COLUMNAS_COSING]
+    nombres = [columnas[i] for i in posiciones]
+
+    snapshot = None
+    if dir_cache is not None:
+        base = os.path.splitext(os.path.basename(ruta))[0]
+        snapshot = os.path.join(dir_cache, f"{base}-{hash_archivo(ruta)[:16]}.parquet")
+        if os.path.isfile(snapshot):
+            df = pd.read_parquet(snapshot)
+            if list(df.columns) == nombres:
+                return df
+
+    # skiprows=8 + header=None equivale a skiprows=6 + header=[0,1] (que no admite usecols)
+    df = pd.read_excel(ruta, skiprows=8, header=None, usecols=posiciones, engine=MOTOR_EXCEL)
+    df.columns = nombres  # renombra las columnas con las listas creadas
+
+    if snapshot is not None:
+        os.makedirs(dir_cache, exist_ok=True)
+        df.to_parquet(snapshot + ".tmp", index=False)
+        os.replace(snapshot + ".tmp", snapshot)
+        # Borramos las copias de versiones anteriores de este anexo
+        for anterior in glob.glob(os.path.join(dir_cache, f"{base}-*.parquet")):
+            if anterior != snapshot:
+                os.remove(anterior)
+    return df
+
+
+def procesar_cosing(data_raw=None, data_processed=None, n_workers=None, usar_cache=True):
+    """Procesa los anexos de la base de datos COSING y devuelve un DataFrame limpio.
+    Los anexos se leen en paralelo (un proceso por libro) y, con usar_cache, desde su copia Parquet si no cambiaron."""
 
     # BASE_DIR apunta al directorio raíz del proyecto (dos niveles arriba desde este archivo)
     raw_dir, processed_dir = data_dirs(__file__, data_raw, data_processed)
+    dir_cache = os.path.join(processed_dir, "cosing_snapshots") if usar_cache else None
 
-    # Definimos los headers.
-    header_2 = ['Reference Number', 'Chemical name','CAS Number', 'EC Number', 'Regulation', 'Other Directives/Regulations', 
-                'SCCS opinions', 'Chemical/IUPAC Name', 'Identified INGREDIENTS or substances e.g.', 'CMR', 'Update date']
-
-
-    header = ['Reference Number', 'Chemical name', 'Name of Common Ingredients Glossary',
-              'CAS Number', 'EC Number', 'Product Type, body parts', 'Maximum concentration in ready for use preparation',
-              'Other Restrictions', 'Wording of conditions of use and warnings', 'Regulation',
-              'Other Directives/Regulations', 'SCCS opinions', 'Chemical/IUPAC Name',
-              'Identified INGREDIENTS or substances e.g.', 'CMR', 'Update date']
-
-    header_4 = ['Reference Number', 'Chemical name', 'Name of Common Ingredients Glossary',
-                'CAS Number', 'EC Number', 'Color', 'Product Type, body parts', 'Maximum concentration in ready for use preparation',
-                'Other Restrictions', 'Wording of conditions of use and warnings', 'Regulation',
-                'Other Directives/Regulations', 'SCCS opinions', 'Chemical/IUPAC Name',
-                'Identified INGREDIENTS or substances e.g.', 'CMR', 'Update date']
-
-    # Función para cargar los anexos
-    def cargar_anexo(ruta, columnas):
-        df = pd.read_excel(ruta, skiprows=6, header=[0,1])
-        df.columns = columnas  # renombra las columnas con las listas creadas
-        return df
-
-    # Cargamos los anexos
-    anexo_2 = cargar_anexo(os.path.join(raw_dir, "COSING_Annex_II_v2.xlsx"), header_2)
-    anexo_3 = cargar_anexo(os.path.join(raw_dir, "COSING_Annex_III_v2.xlsx"), header)
-    anexo_4 = cargar_anexo(os.path.join(raw_dir, "COSING_Annex_IV_v2.xlsx"), header_4)
-    anexo_5 = cargar_anexo(os.path.join(raw_dir, "COSING_Annex_V_v2.xlsx"), header)
-    anexo_6 = cargar_anexo(os.path.join(raw_dir, "COSING_Annex_VI_v2.xlsx"), header)
+    # Cargamos los anexos en paralelo
+    etiquetas = list(ANEXOS)
+    rutas = [os.path.join(raw_dir, ANEXOS[e][0]) for e in etiquetas]
+    columnas = [ANEXOS[e][1] for e in etiquetas]
+    with ProcessPoolExecutor(max_workers=min(len(etiquetas), n_workers or os.cpu_count() or 1)) as pool:
+        anexos = dict(zip(etiquetas, pool.map(cargar_anexo, rutas, columnas, [dir_cache] * len(rutas))))
+    anexo_2, anexo_3, anexo_4, anexo_5, anexo_6 = (anexos[e] for e in etiquetas)
 
 
     # Añadimos columna de anexo
@@ -57,16 +111,8 @@ def procesar_cosing(data_raw=None, data_processed=None):
     # Eliminamos los duplicados por 'Chemical name' y manteniendo el primero
     cosing_final = drop_duplicates_sort(cosing, subset='Chemical name')
 
-    # Tratamiento de CAS y EC Number múltiples
-    cosing_final['CAS Number_2'] = cosing_final['CAS Number'].str.split(r'[,;/]')
-    cosing_final['EC Number_2'] = cosing_final['EC Number'].str.split(r'[,;/]')
-    cosing_final = cosing_final.explode('CAS Number_2')
-    cosing_final = cosing_final.explode('EC Number_2')
-
-    # Eliminamos las columnas antiguas y renombramos
-    cosing_final.drop(columns='CAS Number', inplace=True)
-    cosing_final.drop(columns='EC Number', inplace=True)
-    cosing_final = cosing_final.rename(columns={'CAS Number_2': 'CAS Number', 'EC Number_2': 'EC Number'})
+    # Tratamiento de CAS y EC Number múltiples: emparejados por posición (sin producto cartesiano)
+    cosing_final = emparejar_cas_ec(cosing_final, 'CAS Number', 'EC Number')
     
     # Limpiamos valores extraños
     cosing_final = clean_cas_ec(cosing_final, 'CAS Number', 'EC Number')
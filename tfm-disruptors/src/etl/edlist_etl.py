@@ -1,8 +1,8 @@
 import os
 import pandas as pd
 import numpy as np
-# from utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null  # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
-from src.etl.utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null
+# from utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null, emparejar_cas_ec  # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
+from src.etl.utils_etl import data_dirs, drop_duplicates_sort, clean_cas_ec, not_both_null, emparejar_cas_ec
 
 def procesar_edlist(data_raw=None, data_processed=None):
     """Procesa las bases de datos EDlist y devuelve un DataFrame limpio."""
@@ -60,19 +60,11 @@ def procesar_edlist(data_raw=None, data_processed=None):
     edlist_final['Health effects'] = (edlist_final['Health effects'] == 'Yes').astype(int)
     edlist_final['Environmental effects'] = (edlist_final['Environmental effects'] == 'Yes').astype(int)
 
-    # Dividimos variables "CAS no." y "EC / List no."
-    edlist_final['cas_list'] = edlist_final['CAS no.'].str.split(r'[,;/]')
-    edlist_final['ec_list'] = edlist_final['EC / List no.'].str.split(r'[,;/]')
+    # Renombramos variables con el nombre del resto de fuentes
+    edlist_final = edlist_final.rename(columns={'CAS no.': 'CAS Number', 'EC / List no.': 'EC Number'})
 
-    # Descomponemos fila por cada CAS y EC individual
-    edlist_final = edlist_final.explode('cas_list')
-    edlist_final = edlist_final.explode('ec_list')
-
-    # Eliminamos 'CAS no.' y 'EC / List no.'
-    edlist_final.drop(columns=['CAS no.','EC / List no.'], inplace=True, errors='ignore')
-
-    # Renombramos variables con el nombre antiguo
-    edlist_final = edlist_final.rename(columns={'cas_list': 'CAS Number', 'ec_list': 'EC Number'})
+    # Dividimos CAS y EC múltiples y los emparejamos por posición (una fila por sustancia, sin producto cartesiano)
+    edlist_final = emparejar_cas_ec(edlist_final, 'CAS Number', 'EC Number')
 
     # Reemplazamos los valores '-' y ' ' por NaN
     edlist_final = clean_cas_ec(edlist_final, 'CAS Number', 'EC Number')
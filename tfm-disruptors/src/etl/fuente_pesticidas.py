@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import argparse
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# from utils_etl import data_dirs    # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
+from src.etl.utils_etl import data_dirs
+from src.utils_hash import hash_archivo
+
+# PARA EJECUTAR:  python -m src.etl.fuente_pesticidas              (actualiza la copia local desde la API)
+#                 python -m src.etl.fuente_pesticidas --servidor   (servidor local que sirve la copia, para pruebas)
+# Fuente de pesticidas de la API de la UE (SANTE) con backends intercambiables:
+#  - FuenteHTTP: API real con sesión reutilizada, timeouts, reintentos, petición condicional (ETag /
+#    Last-Modified) y paginación volcada página a página a Parquet
+#  - FuenteSnapshot: copia local (Parquet o JSON) sin red
+#  - servidor_local: servidor HTTP que imita la API a partir de una copia, para pruebas sin internet
+# La copia local (data/processed/pesticidas_snapshot.parquet, generada y fuera de git como el resto de data/processed)
+# es la que usa el ETL: se puede ejecutar sin conexión.
+
+URL_PESTICIDAS = "https://api.datalake.sante.service.ec.europa.eu/sante/pesticides/active_substances?format=json&api-version=v2.0"
+CABECERAS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
+    'Accept': 'application/json',
+    'Referer': 'https://api.datalake.sante.service.ec.europa.eu'
+}
+COLUMNAS = ['substance_name', 'as_cas_number']
+ESQUEMA = pa.schema([(c, pa.string()) for c in COLUMNAS])
+NOMBRE_SNAPSHOT = "pesticidas_snapshot.parquet"
+
+
+def ruta_snapshot(data_processed=None):
+    _, processed_dir = data_dirs(__file__, None, data_processed)
+    return os.path.join(processed_dir, NOMBRE_SNAPSHOT)
+
+
+def _tabla_pagina(registros):
+    """Tabla Arrow con las columnas que usa el ETL (como texto) a partir de los registros de una página."""
+    df = pd.json_normalize(registros) if registros else pd.DataFrame()
+    return pa.table({c: [None if pd.isna(v) else str(v) for v in df[c]] if c in df.columns else [None] * len(df)
+                     for c in COLUMNAS}, schema=ESQUEMA)
+
+
+def _leer_meta(ruta):
+    if not os.path.isfile(ruta + ".meta.json"):
+        return {}
+    with open(ruta + ".meta.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FuenteSnapshot:
+    """Backend sin red: lee la copia local (Parquet o JSON con la respuesta de la API)."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+
+    def leer(self):
+        if not os.path.isfile(self.ruta):
+            raise FileNotFoundError(f"No existe la copia local de pesticidas: {self.ruta}")
+        if self.ruta.endswith(".json"):
+            with open(self.ruta, encoding="utf-8") as f:
+                datos = json.load(f)
+            return _tabla_pagina(datos["value"] if isinstance(datos, dict) else datos).to_pandas()
+        return pd.read_parquet(self.ruta, columns=COLUMNAS)
+
+
+class FuenteHTTP:
+    """
+    Backend HTTP: descarga la API en una sesión reutilizada (keep-alive) con timeouts y reintentos con espera
+    exponencial. La primera página se pide de forma condicional con el ETag / Last-Modified de la última descarga:
+    si el servidor responde 304 la copia local sigue vigente y no se descarga nada.
+    Las páginas siguientes se encadenan con nextLink (o @odata.nextLink) y se escriben a Parquet según llegan.
+    """
+
+    def __init__(self, url=URL_PESTICIDAS, timeout=(5, 60), reintentos=3, cabeceras=CABECERAS):
+        self.url = url
+        self.timeout = timeout
+        self.sesion = requests.Session()
+        self.sesion.headers.update(cabeceras)
+        reintento = Retry(total=reintentos, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=["GET"])
+        self.sesion.mount("http://", HTTPAdapter(max_retries=reintento))
+        self.sesion.mount("https://", HTTPAdapter(max_retries=reintento))
+
+    def actualizar(self, ruta):
+        """
+        Actualiza la copia local en 'ruta'. Devuelve {"actualizado": bool, "filas", "paginas", "segundos"}.
+        La copia se escribe en un temporal y se renombra al terminar: si la descarga falla la anterior no se toca
+        y el temporal se borra.
+        """
+        inicio = time.perf_counter()
+        meta = _leer_meta(ruta) if os.path.isfile(ruta) else {}
+        condicional = {}
+        if meta.get("url") == self.url:
+            if meta.get("etag"):
+                condicional["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                condicional["If-Modified-Since"] = meta["last_modified"]
+
+        respuesta = self.sesion.get(self.url, headers=condicional, timeout=self.timeout)
+        if respuesta.status_code == 304:
+            return {"actualizado": False, "filas": meta.get("filas"), "paginas": 0,
+                    "segundos": round(time.perf_counter() - inicio, 2)}
+        respuesta.raise_for_status()
+        cabeceras_primera = respuesta.headers
+
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        temporal = ruta + ".tmp"
+        filas, paginas = 0, 0
+        try:
+            with pq.ParquetWriter(temporal, ESQUEMA) as writer:
+                while True:
+                    datos = respuesta.json()
+                    tabla = _tabla_pagina(datos.get("value", []))
+                    writer.write_table(tabla)
+                    filas += tabla.num_rows
+                    paginas += 1
+                    siguiente = datos.get("nextLink") or datos.get("@odata.nextLink")
+                    if not siguiente:
+                        break
+                    respuesta = self.sesion.get(siguiente, timeout=self.timeout)
+                    respuesta.raise_for_status()
+            os.replace(temporal, ruta)
+        except BaseException:
+            # Una página que falla a mitad deja un Parquet incompleto: no se queda en disco
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        meta = {"url": self.url, "etag": cabeceras_primera.get("ETag"), "last_modified": cabeceras_primera.get("Last-Modified"),
+                "fecha": time.strftime("%Y-%m-%d %H:%M:%S"), "filas": filas, "sha256": hash_archivo(ruta)}
+        with open(ruta + ".meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        return {"actualizado": True, "filas": filas, "paginas": paginas, "segundos": round(time.perf_counter() - inicio, 2)}
+
+
+def cargar_pesticidas(data_processed=None, actualizar=False, fuente_http=None):
+    """
+    Devuelve la tabla de pesticidas (substance_name, as_cas_number) desde la copia local.
+    Con actualizar=True (o si aún no hay copia) la refresca antes con el backend HTTP; si la API falla
+    y ya hay copia se avisa y se sigue sin conexión, y si no hay copia se lanza un error claro.
+    """
+    ruta = ruta_snapshot(data_processed)
+    if actualizar or not os.path.isfile(ruta):
+        try:
+            resumen = (fuente_http or FuenteHTTP()).actualizar(ruta)
+            print(f"Pesticidas: {'copia actualizada' if resumen['actualizado'] else 'sin cambios (304)'} {resumen}")
+        except requests.RequestException as e:
+            if not os.path.isfile(ruta):
+                raise RuntimeError(f"No se pudo descargar la lista de pesticidas y no hay copia local en {ruta}: {e}") from e
+            print(f"Pesticidas: la API no responde ({type(e).__name__}), se usa la copia local {ruta}")
+    return FuenteSnapshot(ruta).leer()
+
+
+def servidor_local(ruta, puerto=8001, tam_pagina=100, host="127.0.0.1"):
+    """
+    Servidor HTTP que imita la API de pesticidas a partir de una copia local, paginado con ?skip= y nextLink,
+    con ETag y respuestas 304. Para probar FuenteHTTP sin conexión. Devuelve el servidor (serve_forever / shutdown).
+    """
+    registros = FuenteSnapshot(ruta).leer().astype(object).where(lambda d: d.notna(), None).to_dict("records")
+    etag = '"' + hash_archivo(ruta)[:32] + '"'
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            skip = int(parse_qs(url.query).get("skip", ["0"])[0])
+            if skip == 0 and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            datos = {"value": registros[skip:skip + tam_pagina]}
+            if skip + tam_pagina < len(registros):
+                datos["nextLink"] = f"http://{host}:{self.server.server_port}{url.path}?skip={skip + tam_pagina}"
+            cuerpo = json.dumps(datos).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, puerto), Manejador)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copia local de la lista de pesticidas de la UE.")
+    parser.add_argument("--url", default=URL_PESTICIDAS)
+    parser.add_argument("--servidor", action="store_true", help="Sirve la copia local como si fuera la API")
+    parser.add_argument("--puerto", type=int, default=8001)
+    args = parser.parse_args()
+
+    if args.servidor:
+        servidor = servidor_local(ruta_snapshot(), args.puerto)
+        print(f"Sirviendo {ruta_snapshot()} en http://127.0.0.1:{args.puerto}/")
+        servidor.serve_forever()
+    else:
+        print(FuenteHTTP(args.url).actualizar(ruta_snapshot()))
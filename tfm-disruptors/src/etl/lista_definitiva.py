@@ -1,8 +1,8 @@
 import os
 import pandas as pd
 import numpy as np
-# from utils_etl import data_dirs   # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
-from src.etl.utils_etl import data_dirs
+# from utils_etl import data_dirs, dimension_sustancias, añadir_claves   # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
+from src.etl.utils_etl import data_dirs, dimension_sustancias, añadir_claves
 
 def lista_disruptores_definitiva(data_processed=None):
     """ Une las tablas de disruptores_clean con disruptores_etiqueta.
@@ -18,8 +18,13 @@ def lista_disruptores_definitiva(data_processed=None):
     disruptores_clean = pd.read_parquet(os.path.join(processed_dir,"disruptores_clean.parquet"))
     disruptores_etiqueta = pd.read_parquet(os.path.join(processed_dir,"disruptores_etiqueta.parquet"))
 
+    # Claves enteras de sustancia (CAS/EC canónicos) para el join
+    sustancias = dimension_sustancias([disruptores_clean, disruptores_etiqueta])
+    añadir_claves(disruptores_clean, sustancias)
+    añadir_claves(disruptores_etiqueta, sustancias)
+
     # Hacemos merge entre disrupores_clean y disrupores_etiqueta
-    disruptores_provisional = disruptores_clean.merge(disruptores_etiqueta[[ 'CAS Number', 'EC Number','Name_Chemical_Cosing', 'nombre_etiqueta',  'anexo_cosing']], on=['CAS Number', 'EC Number'], how='left' )
+    disruptores_provisional = disruptores_clean.merge(disruptores_etiqueta[['clave_cas', 'clave_ec', 'Name_Chemical_Cosing', 'nombre_etiqueta',  'anexo_cosing']], on=['clave_cas', 'clave_ec'], how='left' )
 
     # Eliminamos duplicados
     disruptores_provisional = disruptores_provisional.drop_duplicates(subset=['Name_Edlist_Echa'], keep='first')
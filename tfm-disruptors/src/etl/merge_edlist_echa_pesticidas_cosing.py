@@ -1,25 +1,27 @@
 import os
 import pandas as pd
 import numpy as np
-# from utils_etl import data_dirs   # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
-from src.etl.utils_etl import data_dirs
+# from utils_etl import data_dirs, dimension_sustancias, añadir_claves, ids_desde_claves   # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
+from src.etl.utils_etl import data_dirs, dimension_sustancias, añadir_claves, ids_desde_claves
 
 
 def nombre_mas_informativo_generico(df, col1, col2, nueva_col):
-    """Crea una nueva columna en el DataFrame que contiene el valor más informativo entre dos columnas dadas."""
-    def elegir_mas_informativo(row):
-        val1 = row[col1]
-        val2 = row[col2]
-
-        if pd.isna(val1):
-            return val2
-        if pd.isna(val2):
-            return val1
-        if val1 == val2:
-            return val1
-        return val1 if len(str(val1)) > len(str(val2)) else val2
-
-    df[nueva_col] = df.apply(elegir_mas_informativo, axis=1)
+    """Crea una nueva columna en el DataFrame que contiene el valor más informativo entre dos columnas dadas.
+    Versión vectorizada (por columnas, sin apply por fila) con las mismas reglas:
+    si uno es nulo se queda el otro, si son iguales el primero y si no el de texto más largo (empate: el segundo)."""
+    val1 = df[col1]
+    val2 = df[col2]
+
+    # Longitud del texto de cada valor (los nulos se descartan antes con las máscaras)
+    len1 = val1.astype(str).str.len().to_numpy()
+    len2 = val2.astype(str).str.len().to_numpy()
+    nulo1 = val1.isna().to_numpy()
+    nulo2 = val2.isna().to_numpy()
+    iguales = (val1 == val2).to_numpy()
+
+    elegir_1 = ~nulo1 & (nulo2 | iguales | (len1 > len2))
+    df[nueva_col] = pd.Series(np.where(elegir_1, val1.to_numpy(dtype=object), val2.to_numpy(dtype=object)),
+                              index=df.index)
     return df
 
 def merge_edlist_echa_pesticidas(data_processed=None):
@@ -38,11 +40,17 @@ def merge_edlist_echa_pesticidas(data_processed=None):
     cosing_clean= pd.read_parquet(os.path.join(processed_dir,"cosing_clean.parquet"))
     pesticidas= pd.read_parquet(os.path.join(processed_dir,"pesticidas.parquet"))
 
-    # Reemplazamos None por NaN
-    edlist_clean = edlist_clean.replace({None: np.nan})
+    # Dimensión de sustancias: clave entera por cada CAS y EC canónico (sin espacios, nulos unificados).
+    # Todos los joins se hacen sobre clave_cas / clave_ec en lugar de sobre el texto
+    sustancias = dimension_sustancias([edlist_clean, echa_clean, cosing_clean, pesticidas])
+    sustancias.to_parquet(os.path.join(processed_dir,"sustancias.parquet"), index=False)
+    for tabla in (edlist_clean, echa_clean, cosing_clean, pesticidas):
+        añadir_claves(tabla, sustancias)
 
     # PRIMER MERGE. Unión que se llevará a cabo es un full outer join, es decir queremos todo de ambas tablas, porque así ganamos registros 
-    edlist_echa = edlist_clean.merge( echa_clean, on=['CAS Number', 'EC Number'],  how='outer', suffixes=('', '_ECHA'))
+    edlist_echa = edlist_clean.drop(columns=['CAS Number', 'EC Number']).merge(
+        echa_clean.drop(columns=['CAS Number', 'EC Number']), on=['clave_cas', 'clave_ec'],  how='outer', suffixes=('', '_ECHA'))
+    ids_desde_claves(edlist_echa, sustancias)
 
     # Combinamos para que si "fuente_original" está vacío, se rellene con "fuente_original_ECHA"
     edlist_echa['fuente_original'] = edlist_echa['fuente_original'].combine_first(edlist_echa['fuente_original_ECHA'])
@@ -54,37 +62,30 @@ def merge_edlist_echa_pesticidas(data_processed=None):
     nombre_mas_informativo_generico(edlist_echa, 'Name and abbreviation', 'Substance name', 'Name_Edlist_Echa')
 
     # Elegimos las variables que queremos conservar en el dataframe final
-    edlist_echa =  edlist_echa[['Name_Edlist_Echa','fuente_original','Appears on lists', 'Health effects','CAS Number', 'EC Number'  ]]
+    edlist_echa =  edlist_echa[['Name_Edlist_Echa','fuente_original','Appears on lists', 'Health effects','CAS Number', 'EC Number', 'clave_cas', 'clave_ec']]
 
     # SEGUNDO MERGE. La unión se realizará con un left join por 'CAS Number'
-    edlist_echa_pesticidas = edlist_echa.merge(pesticidas, on=['CAS Number'], how='left' )
+    edlist_echa_pesticidas = edlist_echa.merge(pesticidas.drop(columns=['CAS Number']), on=['clave_cas'], how='left' )
  
     # Filtramos los disruptores sin pesticidas
     disruptores_clean = edlist_echa_pesticidas[edlist_echa_pesticidas['Name_Pesticida'].isna()]
     
     # Elegimos las variables que queremos conservar en el dataframe final
-    disruptores_clean = disruptores_clean[['Name_Edlist_Echa', 'fuente_original', 'Appears on lists', 'Health effects', 'CAS Number', 'EC Number']]
+    disruptores_clean = disruptores_clean[['Name_Edlist_Echa', 'fuente_original', 'Appears on lists', 'Health effects', 'CAS Number', 'EC Number', 'clave_cas', 'clave_ec']]
     
     # EXPORTACIÓN del Segundo Merge para otras fuentes de búsquedas del nombre INCI.
-    disruptores_clean.to_parquet(os.path.join(processed_dir,"disruptores_clean.parquet"), index=False)
-
-    # Reemplazamos None por NaN
-    cosing_clean = cosing_clean.replace({None: np.nan})
+    disruptores_clean.drop(columns=['clave_cas', 'clave_ec']).to_parquet(os.path.join(processed_dir,"disruptores_clean.parquet"), index=False)
 
     # TERCER MERGE - Unión final. La unión se realizará de la siguiente manera:  y depués un inner join por 'EC Number', luego se uniran ambas tablas.**
-    # Unión por CAS Number
-    union_inner_cas= disruptores_clean.merge(cosing_clean, on=['CAS Number'],  how='inner', suffixes=('', '_cosing'))
-
-    # Reemplazamos None por NaN
-    union_inner_cas = union_inner_cas.replace({None: np.nan})
+    # Los registros con CAS (o EC) nulo se descartan ANTES de unir: el resultado es el mismo y no se cruzan nulos con nulos
+    cosing_cas = cosing_clean[cosing_clean['clave_cas'] >= 0].drop(columns=['CAS Number', 'clave_ec'])
+    cosing_ec = cosing_clean[cosing_clean['clave_ec'] >= 0].drop(columns=['EC Number', 'clave_cas'])
 
-    # Procedemos a eliminar las variables donde CAS Number es nulo
-    union_inner_cas= union_inner_cas[~(union_inner_cas['CAS Number'].isna())]
+    # Unión por CAS Number
+    union_inner_cas= disruptores_clean[disruptores_clean['clave_cas'] >= 0].merge(cosing_cas, on=['clave_cas'],  how='inner', suffixes=('', '_cosing'))
 
     # Unión por EC Number
-    union_inner_ec= edlist_echa.merge( cosing_clean, on=['EC Number'],  how='inner', suffixes=('', '_cosing'))
- 
-    union_inner_ec= union_inner_ec[~(union_inner_ec['EC Number'].isna())]
+    union_inner_ec= edlist_echa[edlist_echa['clave_ec'] >= 0].merge(cosing_ec, on=['clave_ec'],  how='inner', suffixes=('', '_cosing'))
 
     # Unión de ambas tablas - Concatenamos
     union_completa = pd.concat([union_inner_cas,union_inner_ec], ignore_index=True)
@@ -1,37 +1,25 @@
 import os
-import requests
 import pandas as pd
-import ast
 # from utils_etl import data_dirs    # descomentar esta línea y comentar la de abajo si se quiere ejecutar solo este archivo
+# from fuente_pesticidas import cargar_pesticidas
 from src.etl.utils_etl import data_dirs
+from src.etl.fuente_pesticidas import cargar_pesticidas
 
-def procesar_pesticidas(data_raw=None, data_processed=None):
-    """Procesa la(s) tabla(s) de pesticidas y devuelve un DataFrame limpio."""
+def procesar_pesticidas(data_raw=None, data_processed=None, actualizar=False):
+    """Procesa la(s) tabla(s) de pesticidas y devuelve un DataFrame limpio.
+    Lee la copia local de la API de la UE (data/processed/pesticidas_snapshot.parquet), así el ETL funciona sin conexión.
+    Con actualizar=True (o si aún no hay copia) la refresca antes desde la API (ver fuente_pesticidas)."""
     # Rutas del proyecto (igual que en el resto de ETL)
-    raw_dir, processed_dir = data_dirs(__file__, data_raw, data_processed)
+    _, processed_dir = data_dirs(__file__, data_raw, data_processed)
 
-    # Extrción de datos de la API de la Unión Europea sobre pesticidas
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-        'Accept': 'application/json',
-        'Referer': 'https://api.datalake.sante.service.ec.europa.eu'
-    }
-
-    url = "https://api.datalake.sante.service.ec.europa.eu/sante/pesticides/active_substances?format=json&api-version=v2.0"
-
-    response = requests.get(url, headers=headers)
-
-    if response.status_code == 200:
-        data = response.json()
-        pesticidas = pd.json_normalize(data['value'])
-    else:
-        print("Error:", response.status_code, response.text[:200])
+    # Extracción de datos de la API de la Unión Europea sobre pesticidas (o de su copia local)
+    pesticidas = cargar_pesticidas(processed_dir, actualizar=actualizar)
 
     # Nos quedamos con las variables que nos interesan
     pesticidas = pesticidas[['substance_name', 'as_cas_number']]
 
     # Renombramos las columnas
-    pesticidas.rename(columns={'substance_name': 'Name_Pesticida', 'as_cas_number': 'CAS Number'}, inplace=True)
+    pesticidas = pesticidas.rename(columns={'substance_name': 'Name_Pesticida', 'as_cas_number': 'CAS Number'})
 
     # Exportamos el DataFrame
     pesticidas.to_parquet(os.path.join(processed_dir, "pesticidas.parquet"), index=False)
@@ -41,5 +29,5 @@ def procesar_pesticidas(data_raw=None, data_processed=None):
 
 
 if __name__ == "__main__":
-    df = procesar_pesticidas()
-    print(df.info())
\ No newline at end of file
+    df = procesar_pesticidas(actualizar=True)
+    print(df.info())
@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from src.etl.utils_etl import data_dirs, cas_invalidos
+from src.utils_hash import hash_archivo
+from src.instrumentacion import tramo, activar
+from src.etl.edlist_etl import procesar_edlist
+from src.etl.echa_etl import procesar_echa
+from src.etl.cosing_etl import procesar_cosing
+from src.etl.pesticidas_etl import procesar_pesticidas
+from src.etl.merge_edlist_echa_pesticidas_cosing import merge_edlist_echa_pesticidas
+from src.etl.lista_definitiva import lista_disruptores_definitiva
+
+# PARA EJECUTAR:  python -m src.etl.pipeline_etl            (solo lo que cambió)
+#                 python -m src.etl.pipeline_etl --forzar cosing
+#                 python -m src.etl.pipeline_etl --trazas etl_trazas.jsonl   (tiempo, CPU y memoria de cada etapa)
+# ETL incremental: cada etapa declara sus entradas, salidas y dependencias. Se guarda la huella
+# (mtime, tamaño y sha256) de cada entrada y solo se reconstruyen las etapas cuyas entradas cambiaron
+# o cuyas salidas faltan. Las etapas de fuentes (edlist, echa, cosing, pesticidas) se ejecutan en paralelo.
+#
+#   edlist ─┐
+#   echa ───┼─> merge ─> lista_definitiva ─> patrones
+#   cosing ─┤
+#   pesticidas ┘
+
+ARCHIVO_ESTADO = "etl_estado.json"
+
+RAW_DIR, PROCESSED_DIR = data_dirs(__file__)
+BASE_DIR = os.path.dirname(os.path.dirname(PROCESSED_DIR))
+
+
+def _compilar_patrones(data_processed=None):
+    """Última etapa: compila el pipeline NLP y exporta entity_ruler_patterns.jsonl (ver nlp_entityruler)."""
+    from src.nlp.nlp_entityruler import construir_pipeline
+    _, processed_dir = data_dirs(__file__, None, data_processed)
+    return construir_pipeline(os.path.join(processed_dir, "disruptores_final.parquet"))
+
+
+# Rutas relativas: "raw/..." a data/raw, "processed/..." a data/processed y "base/..." a la raíz del proyecto.
+# pesticidas lee la copia local de la API: si no existe la descarga; para refrescarla  python -m src.etl.fuente_pesticidas
+ETAPAS = {
+    "edlist": {
+        "funcion": procesar_edlist,
+        "depende": [],
+        "entradas": ["raw/list1.xlsx", "raw/list2.xlsx", "raw/list3.xlsx"],
+        "salidas": ["processed/edlist_clean.parquet"],
+    },
+    "echa": {
+        "funcion": procesar_echa,
+        "depende": [],
+        "entradas": ["raw/endocrine-disruptor-assessment-export.xlsx"],
+        "salidas": ["processed/echa_clean.parquet"],
+    },
+    "cosing": {
+        "funcion": procesar_cosing,
+        "depende": [],
+        "entradas": [f"raw/COSING_Annex_{anexo}_v2.xlsx" for anexo in ("II", "III", "IV", "V", "VI")],
+        "salidas": ["processed/cosing_clean.parquet"],
+    },
+    "pesticidas": {
+        "funcion": procesar_pesticidas,
+        "depende": [],
+        "entradas": ["processed/pesticidas_snapshot.parquet"],
+        "salidas": ["processed/pesticidas.parquet"],
+    },
+    "merge": {
+        "funcion": merge_edlist_echa_pesticidas,
+        "depende": ["edlist", "echa", "cosing", "pesticidas"],
+        "entradas": ["processed/edlist_clean.parquet", "processed/echa_clean.parquet",
+                     "processed/cosing_clean.parquet", "processed/pesticidas.parquet"],
+        "salidas": ["processed/disruptores_clean.parquet", "processed/disruptores_etiqueta.parquet",
+                    "processed/sustancias.parquet"],
+    },
+    "lista_definitiva": {
+        "funcion": lista_disruptores_definitiva,
+        "depende": ["merge"],
+        "entradas": ["processed/disruptores_clean.parquet", "processed/disruptores_etiqueta.parquet",
+                     "processed/notebooks/consultas_manuales/disruptores_sin_etiqueta_manual.xlsx",
+                     "processed/notebooks/consultas_manuales/disruptores_etiqueta_manual.xlsx"],
+        "salidas": ["processed/disruptores_final.parquet"],
+    },
+    "patrones": {
+        "funcion": _compilar_patrones,
+        "depende": ["lista_definitiva"],
+        "entradas": ["processed/disruptores_final.parquet"],
+        "salidas": ["base/entity_ruler_patterns.jsonl"],
+    },
+}
+
+
+def ruta_absoluta(ruta, raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR):
+    raiz, relativa = ruta.split("/", 1)
+    base = {"raw": raw_dir, "processed": processed_dir, "base": BASE_DIR}[raiz]
+    return os.path.join(base, *relativa.split("/"))
+
+
+def huella(ruta, conocida=None, bloque=1 << 20):
+    """
+    Huella de un archivo: {"mtime", "tamano", "sha256"} o None si no existe.
+    Si mtime y tamaño coinciden con la huella conocida se reutiliza su hash sin releer el archivo.
+    """
+    if not os.path.isfile(ruta):
+        return None
+    info = os.stat(ruta)
+    if conocida and conocida["mtime"] == info.st_mtime_ns and conocida["tamano"] == info.st_size:
+        return conocida
+    return {"mtime": info.st_mtime_ns, "tamano": info.st_size, "sha256": hash_archivo(ruta, bloque)}
+
+
+def cargar_estado(processed_dir=PROCESSED_DIR):
+    ruta = os.path.join(processed_dir, ARCHIVO_ESTADO)
+    if not os.path.isfile(ruta):
+        return {"archivos": {}, "etapas": {}}
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_estado(estado, processed_dir=PROCESSED_DIR):
+    ruta = os.path.join(processed_dir, ARCHIVO_ESTADO)
+    with open(ruta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2, ensure_ascii=False)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def motivo_reconstruir(nombre, estado, raw_dir=RAW_DIR, processed_dir=PROCESSED_DIR):
+    """Devuelve por qué hay que reconstruir la etapa (str) o None si está al día."""
+    etapa, registro = ETAPAS[nombre], estado["etapas"].get(nombre)
+    if registro is None:
+        return "nunca ejecutada"
+    for salida in etapa["salidas"]:
+        if not os.path.isfile(ruta_absoluta(salida, raw_dir, processed_dir)):
+            return f"falta {salida}"
+    for entrada in etapa["entradas"]:
+        actual = huella(ruta_absoluta(entrada, raw_dir, processed_dir), estado["archivos"].get(entrada))
+        if actual is None:
+            return f"falta la entrada {entrada}"
+        if registro["entradas"].get(entrada) != actual["sha256"]:
+            return f"cambió {entrada}"
+    return None
+
+
+def _ejecutar_etapa(nombre, data_raw, data_processed):
+    """
+    Tarea de un worker: ejecuta la función de la etapa.
+    Devuelve (segundos empleados, nº de CAS inválidos en la tabla resultante o None si no tiene CAS).
+    """
+    inicio = time.perf_counter()
+    funcion = ETAPAS[nombre]["funcion"]
+    with tramo(f"etl.{nombre}"):
+        if not ETAPAS[nombre]["depende"]:   # etapas de fuentes: leen data/raw
+            df = funcion(data_raw, data_processed)
+        else:
+            df = funcion(data_processed)
+    segundos = time.perf_counter() - inicio
+    n_invalidos = len(cas_invalidos(df["CAS Number"])) if "CAS Number" in getattr(df, "columns", ()) else None
+    return segundos, n_invalidos
+
+
+def ejecutar_etl(data_raw=None, data_processed=None, forzar=(), n_workers=4):
+    """
+    Ejecuta el DAG de etapas reconstruyendo solo las necesarias. Una etapa se reconstruye si se fuerza,
+    si nunca se ejecutó, si falta alguna salida o si cambió el contenido (sha256) de alguna entrada.
+    Como las entradas de una etapa son las salidas de sus dependencias, si una etapa reescribe sus salidas
+    sin cambios de contenido las siguientes no se reconstruyen.
+    Devuelve {etapa: "reconstruida" | "al día"}.
+    """
+    raw_dir, processed_dir = data_dirs(__file__, data_raw, data_processed)
+    os.makedirs(processed_dir, exist_ok=True)
+    estado = cargar_estado(processed_dir)
+    desconocidas = set(forzar) - set(ETAPAS)
+    if desconocidas:
+        raise ValueError(f"Etapas desconocidas: {sorted(desconocidas)}")
+
+    resultado, en_curso = {}, {}
+    pendientes = list(ETAPAS)
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        while pendientes or en_curso:
+            # Lanzamos todas las etapas cuyas dependencias ya terminaron
+            for nombre in [n for n in pendientes if all(d in resultado for d in ETAPAS[n]["depende"])]:
+                pendientes.remove(nombre)
+                motivo = "forzada" if nombre in forzar else motivo_reconstruir(nombre, estado, raw_dir, processed_dir)
+                if motivo is None:
+                    resultado[nombre] = "al día"
+                    print(f"[{nombre}] al día")
+                    continue
+                print(f"[{nombre}] reconstruyendo ({motivo})")
+                en_curso[pool.submit(_ejecutar_etapa, nombre, raw_dir, processed_dir)] = nombre
+
+            if not en_curso:
+                continue
+            hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                nombre = en_curso.pop(futuro)
+                segundos, n_invalidos = futuro.result()   # si una etapa falla se propaga el error (el estado queda guardado hasta ahí)
+
+                # Registramos las huellas de las entradas con las que se construyó y de las salidas nuevas
+                etapa = ETAPAS[nombre]
+                entradas = {}
+                for entrada in etapa["entradas"]:
+                    estado["archivos"][entrada] = huella(ruta_absoluta(entrada, raw_dir, processed_dir),
+                                                         estado["archivos"].get(entrada))
+                    entradas[entrada] = estado["archivos"][entrada]["sha256"]
+                for salida in etapa["salidas"]:
+                    estado["archivos"][salida] = huella(ruta_absoluta(salida, raw_dir, processed_dir))
+                estado["etapas"][nombre] = {"entradas": entradas, "segundos": round(segundos, 2),
+                                            "cas_invalidos": n_invalidos,
+                                            "fecha": time.strftime("%Y-%m-%d %H:%M:%S")}
+                guardar_estado(estado, processed_dir)
+                resultado[nombre] = "reconstruida"
+                aviso = f" ({n_invalidos} CAS con dígito de control inválido)" if n_invalidos else ""
+                print(f"[{nombre}] terminada en {segundos:.1f} s{aviso}")
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ETL incremental de disruptores (solo reconstruye lo que cambió).")
+    parser.add_argument("--forzar", nargs="*", default=[], choices=list(ETAPAS), help="Etapas a reconstruir siempre")
+    parser.add_argument("-w", "--workers", type=int, default=4)
+    parser.add_argument("--trazas", default=None, help="JSON lines donde guardar los tramos de cada etapa (ver instrumentacion)")
+    args = parser.parse_args()
+
+    if args.trazas:
+        activar(args.trazas)   # antes de crear el pool: los workers heredan la configuración
+
+    print(ejecutar_etl(forzar=args.forzar, n_workers=args.workers))
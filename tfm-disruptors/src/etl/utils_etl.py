@@ -1,5 +1,7 @@
 import os
+import re
 import numpy as np
+import pandas as pd
 
 def data_dirs(from_file: str, data_raw: str | None = None, data_processed: str | None = None):
     """Devuelve (raw_dir, processed_dir) basándose en la ruta del archivo que llama."""
@@ -25,3 +27,85 @@ def clean_cas_ec(df, cas_col="CAS Number", ec_col="EC Number"):
 def not_both_null(df, a: str, b: str):
     """Filtra filas donde no sean ambos nulos a la vez."""
     return df[~(df[a].isna() & df[b].isna())].copy()
+
+# CAS Registry Number: 2-7 dígitos, 2 dígitos y el dígito de control
+CAS_RE = re.compile(r"^(\d{2,7})-(\d{2})-(\d)$")
+
+def cas_valido(cas) -> bool:
+    """Comprueba formato y dígito de control de un CAS: suma de cada dígito por su posición desde la derecha, módulo 10."""
+    m = CAS_RE.match(cas) if isinstance(cas, str) else None
+    if not m:
+        return False
+    digitos = (m.group(1) + m.group(2))[::-1]
+    return sum(i * int(d) for i, d in enumerate(digitos, start=1)) % 10 == int(m.group(3))
+
+def separar_ids(serie, sep=r"[,;/]"):
+    """Divide una columna de identificadores múltiples en listas de valores limpios (sin espacios, '-' ni vacíos)."""
+    return serie.str.split(sep).map(
+        lambda valores: [v.strip() for v in valores if v.strip() not in ('', '-')] if isinstance(valores, list) else [])
+
+def emparejar_cas_ec(df, cas_col="CAS Number", ec_col="EC Number", sep=r"[,;/]"):
+    """
+    Sustituye el doble explode de CAS y EC múltiples por un emparejamiento por posición:
+    una fila con n CAS y m EC da max(n, m) filas (i-ésimo CAS con i-ésimo EC) en lugar de n x m.
+    Si uno de los dos tiene un solo valor se repite en todas las filas; si faltan valores quedan NaN.
+    Los valores quedan sin espacios. Los CAS con dígito de control inválido se conservan (ver cas_invalidos).
+    """
+    cas = separar_ids(df[cas_col].astype('string'), sep)
+    ec = separar_ids(df[ec_col].astype('string'), sep)
+
+    pares_cas, pares_ec, repeticiones = [], [], []
+    for lista_cas, lista_ec in zip(cas, ec):
+        n = max(len(lista_cas), len(lista_ec), 1)
+        pares_cas += lista_cas * n if len(lista_cas) == 1 else lista_cas + [np.nan] * (n - len(lista_cas))
+        pares_ec += lista_ec * n if len(lista_ec) == 1 else lista_ec + [np.nan] * (n - len(lista_ec))
+        repeticiones.append(n)
+
+    out = df.loc[df.index.repeat(repeticiones)].copy()
+    out[cas_col] = pares_cas
+    out[ec_col] = pares_ec
+    return out
+
+def cas_invalidos(serie):
+    """CAS distintos de la columna con formato o dígito de control inválido, ordenados (los nulos no cuentan)."""
+    return sorted({c for c in serie.dropna() if not cas_valido(c)})
+
+def normalizar_id(serie):
+    """Forma canónica de un CAS/EC: sin espacios y con guiones unicode unificados; '', '-' y nulos -> NaN."""
+    s = serie.astype('string').str.replace(r'\s+', '', regex=True).str.replace(r'[‐‑‒–—−]', '-', regex=True)
+    return pd.Series(s.mask(s.isin(['', '-'])).to_numpy(dtype=object, na_value=np.nan), index=serie.index)
+
+def dimension_sustancias(tablas, cas_col="CAS Number", ec_col="EC Number"):
+    """
+    Dimensión de identificadores de sustancia: una clave entera por cada CAS y EC canónico que aparece
+    en las tablas dadas. Columnas: tipo ('CAS' o 'EC'), id (valor canónico) y clave (= posición en la tabla).
+    """
+    partes = []
+    for tipo, col in (("CAS", cas_col), ("EC", ec_col)):
+        valores = pd.concat([normalizar_id(t[col]) for t in tablas if col in t.columns]).dropna().unique()
+        partes.append(pd.DataFrame({"tipo": tipo, "id": np.sort(valores.astype(object))}))
+    dimension = pd.concat(partes, ignore_index=True)
+    dimension["clave"] = np.arange(len(dimension), dtype="int32")
+    return dimension
+
+def añadir_claves(df, dimension, cas_col="CAS Number", ec_col="EC Number"):
+    """
+    Canonicaliza las columnas CAS/EC presentes y añade clave_cas / clave_ec (int32, -1 = nulo).
+    Los joins sobre estas claves enteras equivalen a los joins sobre texto (nulo con nulo incluido).
+    """
+    for tipo, col, clave in (("CAS", cas_col, "clave_cas"), ("EC", ec_col, "clave_ec")):
+        if col not in df.columns:
+            continue
+        ids = dimension[dimension["tipo"] == tipo]
+        df[col] = normalizar_id(df[col])
+        posiciones = pd.Index(ids["id"]).get_indexer(df[col])
+        df[clave] = np.where(posiciones >= 0, ids["clave"].to_numpy()[posiciones], -1).astype("int32")
+    return df
+
+def ids_desde_claves(df, dimension, cas_col="CAS Number", ec_col="EC Number"):
+    """Rellena las columnas CAS/EC de texto a partir de clave_cas / clave_ec (las claves -1 dan NaN)."""
+    ids = np.append(dimension["id"].to_numpy(dtype=object), np.nan)   # la clave -1 apunta al NaN final
+    for col, clave in ((cas_col, "clave_cas"), (ec_col, "clave_ec")):
+        if clave in df.columns:
+            df[col] = ids[df[clave].to_numpy()]
+    return df
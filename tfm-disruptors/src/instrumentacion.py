@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+import contextlib
+import functools
+import itertools
+from collections import deque
+
+import psutil
+
+# Instrumentación ligera por tramos (spans) del flujo OCR -> normalize -> NER -> fichas y del ETL.
+# Cada tramo mide tiempo real, tiempo de CPU del proceso y memoria: RSS al terminar, pico de RSS durante el tramo
+# (un hilo lo muestrea cada INTERVALO_MUESTREO segundos mientras hay tramos abiertos) y pico del proceso desde que arrancó.
+#
+#   with tramo("ocr.readtext", imagen="etiqueta_001.jpg"):
+#       ...
+#
+# Desactivada por defecto: tramo() devuelve entonces siempre el mismo contexto vacío (una comprobación
+# de dos variables por llamada, sin medir nada). Se activa con activar() o con la variable de entorno
+# TFM_TRAZAS=1 (la heredan los workers de los pools); con TFM_TRAZAS_JSONL=ruta cada tramo se añade a
+# ese JSON lines al terminar. recoger() activa la medición solo para un bloque y devuelve sus tramos
+# (así un worker puede devolver los tiempos de un análisis concreto).
+
+MAX_TRAZAS = 10_000
+INTERVALO_MUESTREO = 0.01   # segundos entre muestras de RSS para el pico de cada tramo
+
+_activa = os.environ.get("TFM_TRAZAS") == "1"
+_ruta_jsonl = os.environ.get("TFM_TRAZAS_JSONL") or None
+_archivo_jsonl = None                # abierto en modo append la primera vez que se escribe
+_recogiendo = 0                      # nº de bloques recoger() abiertos en el proceso
+_trazas = deque(maxlen=MAX_TRAZAS)   # últimos tramos terminados
+_totales = {}                        # tramo -> {"llamadas", "errores", "wall_s", "cpu_s", "rss_pico_bytes"}
+_lock = threading.Lock()
+_abiertos = set()                    # tramos en curso, cuyo pico actualiza el muestreador
+_lock_abiertos = threading.Lock()
+_hay_abiertos = threading.Event()
+_muestreador_pid = None              # pid del proceso en el que se arrancó el hilo (no sobrevive a un fork)
+_proceso = psutil.Process()
+_NULO = contextlib.nullcontext()
+
+_padre = contextvars.ContextVar("tramo_padre", default=None)
+_recolector = contextvars.ContextVar("tramo_recolector", default=None)
+
+
+def _cerrar_jsonl():
+    global _archivo_jsonl
+    if _archivo_jsonl is not None:
+        _archivo_jsonl.close()
+        _archivo_jsonl = None
+
+
+def activar(ruta_jsonl=None):
+    """Activa la instrumentación en este proceso y en los que se creen después (por variable de entorno)."""
+    global _activa, _ruta_jsonl
+    _cerrar_jsonl()
+    _activa = True
+    os.environ["TFM_TRAZAS"] = "1"
+    if ruta_jsonl:
+        _ruta_jsonl = os.path.abspath(ruta_jsonl)
+        os.environ["TFM_TRAZAS_JSONL"] = _ruta_jsonl
+
+
+def desactivar():
+    global _activa, _ruta_jsonl
+    _cerrar_jsonl()
+    _activa, _ruta_jsonl = False, None
+    os.environ.pop("TFM_TRAZAS", None)
+    os.environ.pop("TFM_TRAZAS_JSONL", None)
+
+
+def activa():
+    return _activa
+
+
+if os.name == "nt":
+    def rss_pico():
+        """Pico de memoria residente del proceso en bytes (máximo desde que arrancó)."""
+        return _proceso.memory_info().peak_wset
+else:
+    import resource
+
+    def rss_pico():
+        """Pico de memoria residente del proceso en bytes (máximo desde que arrancó)."""
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == "darwin" else pico * 1024   # macOS en bytes, Linux en KB
+
+
+def _muestrear():
+    """Hilo muestreador: mientras haya tramos abiertos, sube su pico de RSS con la RSS actual."""
+    while True:
+        _hay_abiertos.wait()
+        time.sleep(INTERVALO_MUESTREO)
+        rss = _proceso.memory_info().rss
+        with _lock_abiertos:
+            for abierto in _abiertos:
+                if rss > abierto.pico:
+                    abierto.pico = rss
+
+
+def _arrancar_muestreador():
+    global _muestreador_pid
+    with _lock_abiertos:
+        if _muestreador_pid != os.getpid():
+            _muestreador_pid = os.getpid()
+            threading.Thread(target=_muestrear, name="tramos-rss", daemon=True).start()
+
+
+class _Tramo:
+    __slots__ = ("nombre", "atributos", "id", "pico", "_inicio", "_cpu", "_rss", "_token")
+
+    _ids = itertools.count(1)
+
+    def __init__(self, nombre, atributos):
+        self.nombre = nombre
+        self.atributos = atributos
+
+    def __enter__(self):
+        self.id = f"{os.getpid()}-{next(_Tramo._ids)}"
+        self._token = _padre.set(self)
+        self._rss = self.pico = _proceso.memory_info().rss
+        if _muestreador_pid != os.getpid():
+            _arrancar_muestreador()
+        with _lock_abiertos:
+            _abiertos.add(self)
+            _hay_abiertos.set()
+        self._cpu = time.process_time()
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        wall = time.perf_counter() - self._inicio
+        cpu = time.process_time() - self._cpu
+        rss = _proceso.memory_info().rss
+        with _lock_abiertos:
+            _abiertos.discard(self)
+            if not _abiertos:
+                _hay_abiertos.clear()
+        _padre.reset(self._token)
+        padre = _padre.get()
+        registro = {
+            "tramo": self.nombre,
+            "id": self.id,
+            "padre": padre.id if padre is not None else None,
+            "pid": os.getpid(),
+            "inicio": round(time.time() - wall, 6),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rss_mb": round(rss / 2**20, 1),
+            "rss_delta_mb": round((rss - self._rss) / 2**20, 1),
+            "rss_pico_mb": round(max(self.pico, rss) / 2**20, 1),
+            "rss_pico_proceso_mb": round(rss_pico() / 2**20, 1),
+            "error": tipo.__name__ if tipo is not None else None,
+            **self.atributos,
+        }
+        _registrar(registro)
+        return False
+
+
+def _registrar(registro):
+    global _archivo_jsonl
+    recolector = _recolector.get()
+    if recolector is not None:
+        recolector.append(registro)
+    with _lock:
+        _trazas.append(registro)
+        total = _totales.setdefault(registro["tramo"], {"llamadas": 0, "errores": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                                        "rss_pico_bytes": 0})
+        total["llamadas"] += 1
+        total["errores"] += registro["error"] is not None
+        total["wall_s"] += registro["wall_s"]
+        total["cpu_s"] += registro["cpu_s"]
+        total["rss_pico_bytes"] = max(total["rss_pico_bytes"], int(registro["rss_pico_mb"] * 2**20))
+        if _ruta_jsonl:
+            # Una línea por write en modo append: varios procesos pueden escribir en el mismo archivo
+            if _archivo_jsonl is None:
+                _archivo_jsonl = open(_ruta_jsonl, "a", encoding="utf-8", buffering=1)
+            _archivo_jsonl.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+def tramo(nombre, **atributos):
+    """Context manager que mide el bloque como un tramo 'nombre' (no hace nada si la instrumentación está desactivada)."""
+    if not (_activa or _recogiendo):
+        return _NULO
+    return _Tramo(nombre, atributos)
+
+
+def instrumentar(nombre=None):
+    """Decorador: cada llamada a la función es un tramo (por defecto con el nombre módulo.función)."""
+    def decorador(funcion):
+        nombre_tramo = nombre or f"{funcion.__module__}.{funcion.__qualname__}"
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not (_activa or _recogiendo):
+                return funcion(*args, **kwargs)
+            with _Tramo(nombre_tramo, {}):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+@contextlib.contextmanager
+def recoger():
+    """
+    Mide todos los tramos del bloque (aunque la instrumentación esté desactivada) y los devuelve en la lista:
+        with recoger() as tramos:
+            analizar_imagen(...)
+    """
+    global _recogiendo
+    tramos = []
+    token = _recolector.set(tramos)
+    with _lock:
+        _recogiendo += 1
+    try:
+        yield tramos
+    finally:
+        with _lock:
+            _recogiendo -= 1
+        _recolector.reset(token)
+
+
+def trazas():
+    """Copia de los últimos tramos registrados en el proceso (como mucho MAX_TRAZAS)."""
+    with _lock:
+        return list(_trazas)
+
+
+def exportar_jsonl(ruta, registros=None):
+    """Añade los tramos (por defecto, los registrados en el proceso) a un archivo JSON lines."""
+    registros = trazas() if registros is None else registros
+    with open(ruta, "a", encoding="utf-8") as f:
+        for registro in registros:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    return len(registros)
+
+
+def prometheus(prefijo="tfm"):
+    """Totales por tramo en el formato de texto de Prometheus (contadores de llamadas, errores y segundos)."""
+    with _lock:
+        totales = {nombre: dict(t) for nombre, t in _totales.items()}
+    metricas = [
+        ("tramo_llamadas_total", "counter", "Llamadas por tramo", "llamadas"),
+        ("tramo_errores_total", "counter", "Tramos terminados con excepción", "errores"),
+        ("tramo_segundos_total", "counter", "Tiempo real acumulado por tramo", "wall_s"),
+        ("tramo_cpu_segundos_total", "counter", "Tiempo de CPU del proceso acumulado por tramo", "cpu_s"),
+        ("tramo_rss_pico_bytes", "gauge", "Mayor pico de RSS medido durante el tramo", "rss_pico_bytes"),
+    ]
+    lineas = []
+    for metrica, tipo, ayuda, campo in metricas:
+        lineas += [f"# HELP {prefijo}_{metrica} {ayuda}", f"# TYPE {prefijo}_{metrica} {tipo}"]
+        for nombre, total in sorted(totales.items()):
+            valor = total[campo]
+            lineas.append(f'{prefijo}_{metrica}{{tramo="{nombre}"}} {round(valor, 6) if isinstance(valor, float) else valor}')
+    return "\n".join(lineas) + "\n"
+
+
+def reiniciar():
+    """Borra los tramos y totales registrados en el proceso."""
+    with _lock:
+        _trazas.clear()
+        _totales.clear()
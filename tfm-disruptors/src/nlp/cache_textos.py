@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+# Base del proyecto: dos niveles arriba desde este archivo
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+RUTA_CACHE = os.path.join(BASE_DIR, "data", "processed", "textos_cache.sqlite")
+
+# Cachés con SQLite abierto: al salir del proceso se escribe lo pendiente. Referencias débiles para no
+# mantener vivas las instancias que ya nadie usa (esas escriben lo suyo con guardar_en_disco o cerrar)
+_abiertas = weakref.WeakSet()
+_cache = None
+_lock_cache = threading.Lock()
+
+
+def _cerrar_abiertas():
+    for cache in list(_abiertas):
+        cache.cerrar()
+
+
+atexit.register(_cerrar_abiertas)
+
+
+def version_modelo(nlp_model):
+    """
+    Versión del conjunto de patrones de un pipeline: el hash del parquet con el que se compiló
+    (nlp.meta, ver construir_pipeline) o, si no lo tiene, el hash de los patrones del entity_ruler.
+    """
+    version = nlp_model.meta.get("disruptores_sha256")
+    if version:
+        return version
+    patrones = nlp_model.get_pipe("entity_ruler").patterns
+    return hashlib.sha256(json.dumps(patrones, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CacheTextos:
+    """
+    Memoización de detecciones por texto normalizado + versión de patrones.
+    En memoria con expulsión LRU (max_entradas) y, si se da una ruta, persistente en SQLite:
+    los fallos en memoria se buscan en disco y los resultados nuevos se escriben por lotes (cada
+    escrituras_por_lote entradas o, como mucho, segundos_por_lote después de la primera pendiente; lo que quede
+    se escribe con guardar_en_disco(), cerrar() o al salir del proceso).
+    Muchos productos comparten la lista de ingredientes, así que los repetidos cuestan solo una búsqueda.
+    """
+
+    def __init__(self, version, max_entradas=100_000, ruta=None, escrituras_por_lote=1000, segundos_por_lote=5.0):
+        self.version = version
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        self._memoria = OrderedDict()   # clave -> [(span_text, ent_id, label), ...]
+        self._pendientes = []           # escrituras a disco aún no confirmadas
+        self._escrituras_por_lote = escrituras_por_lote
+        self._segundos_por_lote = segundos_por_lote
+        self._primera_pendiente = None  # instante de la escritura pendiente más antigua
+        self._lock = threading.Lock()
+        self._con = None
+        if ruta:
+            os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+            self._con = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute("CREATE TABLE IF NOT EXISTS textos (clave TEXT PRIMARY KEY, entidades TEXT NOT NULL)")
+            self._con.commit()
+            # Con analizar_texto de uno en uno (Streamlit, servicio HTTP) nadie llama a guardar_en_disco
+            _abiertas.add(self)
+
+    def _clave(self, texto_normalizado):
+        return hashlib.blake2b(f"{self.version}\0{texto_normalizado}".encode("utf-8"), digest_size=16).hexdigest()
+
+    def _recordar(self, clave, entidades):
+        self._memoria[clave] = entidades
+        self._memoria.move_to_end(clave)
+        if len(self._memoria) > self.max_entradas:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, texto_normalizado):
+        """Entidades guardadas para el texto normalizado o None si no está en caché."""
+        clave = self._clave(texto_normalizado)
+        with self._lock:
+            entidades = self._memoria.get(clave)
+            if entidades is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return list(entidades)
+
+            if self._con is not None:
+                fila = self._con.execute("SELECT entidades FROM textos WHERE clave = ?", (clave,)).fetchone()
+                if fila is not None:
+                    entidades = [tuple(e) for e in json.loads(fila[0])]
+                    self._recordar(clave, entidades)
+                    self.aciertos_disco += 1
+                    return list(entidades)
+
+            self.fallos += 1
+            return None
+
+    def guardar(self, texto_normalizado, entidades):
+        """Guarda las entidades de un texto normalizado (en memoria y, si hay ruta, en disco por lotes)."""
+        clave = self._clave(texto_normalizado)
+        entidades = [tuple(e) for e in entidades]
+        with self._lock:
+            self._recordar(clave, entidades)
+            if self._con is not None:
+                self._pendientes.append((clave, json.dumps(entidades, ensure_ascii=False)))
+                ahora = time.monotonic()
+                if self._primera_pendiente is None:
+                    self._primera_pendiente = ahora
+                if len(self._pendientes) >= self._escrituras_por_lote or \
+                        ahora - self._primera_pendiente >= self._segundos_por_lote:
+                    self._volcar()
+
+    def _volcar(self):
+        self._con.executemany("INSERT OR REPLACE INTO textos (clave, entidades) VALUES (?, ?)", self._pendientes)
+        self._con.commit()
+        self._pendientes = []
+        self._primera_pendiente = None
+
+    def guardar_en_disco(self):
+        """Confirma en disco las escrituras pendientes (llamar al terminar un lote grande)."""
+        with self._lock:
+            if self._con is not None and self._pendientes:
+                self._volcar()
+
+    def cerrar(self):
+        """Escribe lo pendiente y cierra la conexión a SQLite (se llama también al salir del proceso)."""
+        with self._lock:
+            if self._con is not None:
+                if self._pendientes:
+                    self._volcar()
+                self._con.close()
+                self._con = None
+        _abiertas.discard(self)
+
+    def estadisticas(self):
+        """Aciertos (memoria y disco), fallos, ratio de aciertos y entradas en memoria."""
+        consultas = self.aciertos + self.aciertos_disco + self.fallos
+        return {"aciertos": self.aciertos, "aciertos_disco": self.aciertos_disco, "fallos": self.fallos,
+                "ratio_aciertos": (self.aciertos + self.aciertos_disco) / consultas if consultas else 0.0,
+                "entradas_memoria": len(self._memoria)}
+
+
+def obtener_cache(nlp_model, ruta=RUTA_CACHE, max_entradas=100_000):
+    """
+    Caché de textos compartido por todo el proceso para la versión de patrones de nlp_model (se abre la primera
+    vez que se pide). Si el pipeline cambia de versión se cierra el anterior y se abre uno nuevo sobre el mismo
+    SQLite: las claves llevan la versión, así que las entradas antiguas simplemente dejan de encontrarse.
+    """
+    global _cache
+    version = version_modelo(nlp_model)
+    with _lock_cache:
+        if _cache is None or _cache.version != version:
+            if _cache is not None:
+                _cache.cerrar()
+            _cache = CacheTextos(version, max_entradas, ruta)
+        return _cache
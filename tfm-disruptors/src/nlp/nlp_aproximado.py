@@ -0,0 +1,220 @@
+import time
+import threading
+from itertools import combinations
+
+import pandas as pd
+from rapidfuzz.distance import OSA
+
+from src.nlp.nlp_functions import normalize, normalize_for_pattern, aliases_by_ent_id
+from src.nlp.nlp_entityruler import RUTA_DISRUPTORES, hash_parquet
+
+# PARA EJECUTAR:  python -m src.nlp.nlp_aproximado            (recall con errores de OCR simulados y latencia)
+# Búsqueda aproximada de disruptores tolerante a errores de OCR ("parabcn", "triclosari").
+# Índice de borrado simétrico (SymSpell): para cada alias se guardan todas sus variantes con hasta
+# max_distancia caracteres borrados (solo sobre los primeros 'prefijo' caracteres). En la búsqueda se generan
+# los borrados del término y cada variante común da un candidato, que se verifica con la distancia
+# OSA (Levenshtein + transposiciones). El coste depende del término y no del nº de alias.
+# Los alias se comparan en forma compacta (tokens de normalize_for_pattern pegados, sin espacios ni guiones),
+# igual que los patrones B del EntityRuler.
+
+ETIQUETA = "DISRUPTOR"
+MAX_DISTANCIA = 2
+# Longitud mínima del alias para admitir 1 y 2 errores: en alias cortos un error ya cambia de palabra
+LONGITUD_MINIMA = (5, 9)
+PREFIJO = 7
+
+_indices = {}   # hash del parquet -> IndiceAproximado
+_lock_indices = threading.Lock()
+
+
+def compacta(tokens):
+    """Forma compacta de una secuencia de tokens: pegados y sin guiones."""
+    return "".join(tokens).replace("-", "")
+
+
+def _borrados(termino, max_distancia):
+    """Todas las variantes de 'termino' con 0..max_distancia caracteres borrados."""
+    variantes = {termino}
+    for n in range(1, min(max_distancia, len(termino)) + 1):
+        for posiciones in combinations(range(len(termino)), n):
+            variantes.add("".join(c for i, c in enumerate(termino) if i not in posiciones))
+    return variantes
+
+
+class IndiceAproximado:
+    """
+    Índice de borrado simétrico sobre los alias de disruptores. Cada coincidencia lleva el ent_id exacto
+    (mismo formato que los patrones del EntityRuler) y una confianza 1 - distancia / longitud del alias.
+    """
+
+    def __init__(self, max_distancia=MAX_DISTANCIA, longitud_minima=LONGITUD_MINIMA, prefijo=PREFIJO):
+        self.max_distancia = max_distancia
+        self.longitud_minima = longitud_minima
+        self.prefijo = prefijo
+        self._alias = {}       # forma compacta -> [ent_id]
+        self._borrados = {}    # variante del prefijo -> {formas compactas}
+        self.max_tokens = 1
+        self.longitud_min = None
+        self.longitud_max = 0
+
+    def distancia_permitida(self, longitud):
+        """Errores admitidos para un alias de esa longitud (0 = solo coincidencia exacta)."""
+        return min(self.max_distancia, sum(longitud >= m for m in self.longitud_minima))
+
+    def añadir_alias(self, nombre, ent_id):
+        tokens = normalize_for_pattern(nombre)
+        clave = compacta(tokens)
+        if not clave:
+            return
+        if clave not in self._alias:
+            self._alias[clave] = []
+            for variante in _borrados(clave[:self.prefijo], self.distancia_permitida(len(clave))):
+                self._borrados.setdefault(variante, set()).add(clave)
+        if ent_id not in self._alias[clave]:
+            self._alias[clave].append(ent_id)
+        self.max_tokens = max(self.max_tokens, len(tokens))
+        self.longitud_min = min(self.longitud_min or len(clave), len(clave))
+        self.longitud_max = max(self.longitud_max, len(clave))
+
+    def buscar(self, termino, max_distancia=None):
+        """
+        Alias a distancia <= max_distancia (y <= la permitida por su longitud) del término.
+        Devuelve [(alias, ent_id, distancia, confianza)] de mejor a peor.
+        """
+        max_distancia = self.max_distancia if max_distancia is None else min(max_distancia, self.max_distancia)
+        return self._buscar_compacta(compacta(normalize_for_pattern(termino)), max_distancia)
+
+    def _buscar_compacta(self, termino, max_distancia):
+        if not termino:
+            return []
+        candidatos = set()
+        for variante in _borrados(termino[:self.prefijo], max_distancia):
+            candidatos.update(self._borrados.get(variante, ()))
+
+        resultado = []
+        for alias in candidatos:
+            limite = min(max_distancia, self.distancia_permitida(len(alias)))
+            if abs(len(alias) - len(termino)) > limite:
+                continue
+            distancia = OSA.distance(termino, alias, score_cutoff=limite)
+            if distancia <= limite:
+                confianza = round(1 - distancia / len(alias), 3)
+                resultado.extend((alias, ent_id, distancia, confianza) for ent_id in self._alias[alias])
+        resultado.sort(key=lambda r: (r[2], -len(r[0]), r[0]))
+        return resultado
+
+    def entidades(self, texto_normalizado, max_distancia=None):
+        """
+        Entidades aproximadas sobre un texto ya normalizado: se prueban las ventanas de 1..max_tokens tokens
+        (en forma compacta) y se eligen sin solapes, primero la de mayor confianza y luego la más larga.
+        Devuelve [(span_text, ent_id, label, confianza)] en orden de aparición.
+        """
+        max_distancia = self.max_distancia if max_distancia is None else min(max_distancia, self.max_distancia)
+        tokens = texto_normalizado.split()
+        encontradas = []
+        if not self._alias:
+            return []
+        for i in range(len(tokens)):
+            ventana = ""
+            for j in range(i, min(i + self.max_tokens, len(tokens))):
+                ventana += tokens[j].replace("-", "")
+                if len(ventana) > self.longitud_max + max_distancia:
+                    break
+                if len(ventana) < self.longitud_min - max_distancia:
+                    continue
+                mejores = self._buscar_compacta(ventana, max_distancia)
+                if mejores:
+                    alias, ent_id, distancia, confianza = mejores[0]
+                    encontradas.append((confianza, j + 1 - i, i, j + 1, ent_id))
+
+        vistos, elegidas = set(), []
+        for confianza, _, inicio, fin, ent_id in sorted(encontradas, key=lambda e: (-e[0], -e[1], e[2])):
+            if vistos.isdisjoint(range(inicio, fin)):
+                elegidas.append((inicio, fin, ent_id, confianza))
+                vistos.update(range(inicio, fin))
+        elegidas.sort()
+        return [(" ".join(tokens[inicio:fin]), ent_id, ETIQUETA, confianza) for inicio, fin, ent_id, confianza in elegidas]
+
+    def __call__(self, texto, max_distancia=None):
+        """Normaliza el texto (igual que analizar_texto) y devuelve las entidades aproximadas."""
+        return self.entidades(normalize(texto), max_distancia)
+
+    def __len__(self):
+        return len(self._alias)
+
+
+def crear_indice(disruptores_final, **kwargs):
+    """
+    Índice aproximado con los alias y ent_id de la lista de disruptores. Parte de aliases_by_ent_id, igual que
+    los patrones del EntityRuler, así los dos dan los mismos ent_id (p. ej. las filas sin CAS no entran en ninguno).
+    """
+    indice = IndiceAproximado(**kwargs)
+    for ent_id, nombres in aliases_by_ent_id(disruptores_final).items():
+        for nombre in nombres:
+            indice.añadir_alias(nombre, ent_id)
+    return indice
+
+
+def entidades_no_exactas(texto_normalizado, exactas, indice=None):
+    """
+    Respaldo tras el matching exacto: entidades aproximadas del texto cuyo ent_id no ha encontrado ya el EntityRuler
+    (exactas = [(span_text, ent_id, label), ...]). Devuelve [(span_text, ent_id, label, confianza)].
+    """
+    indice = indice or cargar_indice()
+    encontrados = {ent_id for _, ent_id, _ in exactas}
+    return [e for e in indice.entidades(texto_normalizado) if e[1] not in encontrados]
+
+
+def cargar_indice(ruta_parquet=RUTA_DISRUPTORES):
+    """Índice de la versión actual del parquet; se construye una vez por proceso y versión."""
+    sha256 = hash_parquet(ruta_parquet)
+    with _lock_indices:
+        if sha256 not in _indices:
+            _indices.clear()
+            _indices[sha256] = crear_indice(pd.read_parquet(ruta_parquet))
+        return _indices[sha256]
+
+
+def errores_ocr(texto, n_errores, rnd):
+    """Simula errores de OCR: sustituye letras por otras parecidas (c<->e, n->ri, l->1, o->0...)."""
+    confusiones = {"e": "c", "c": "e", "n": "ri", "m": "rn", "l": "1", "i": "l", "o": "0", "a": "o", "s": "5", "b": "h"}
+    texto = list(texto)
+    posiciones = [i for i, c in enumerate(texto) if c in confusiones]
+    for i in rnd.sample(posiciones, min(n_errores, len(posiciones))):
+        texto[i] = confusiones[texto[i]]
+    return "".join(texto)
+
+
+if __name__ == "__main__":
+    import random
+    from src.nlp.nlp_entityruler import cargar_entity_ruler, analizar_texto
+
+    inicio = time.perf_counter()
+    indice = cargar_indice()
+    print(f"Índice: {len(indice)} alias, {len(indice._borrados)} variantes en {time.perf_counter() - inicio:.2f} s")
+
+    # Recall de cada alias con 1 y 2 errores de OCR: EntityRuler exacto frente al índice aproximado
+    nlp_model = cargar_entity_ruler()
+    disruptores = pd.read_parquet(RUTA_DISRUPTORES)
+    ids = {nombre: ent_id for ent_id, nombres in aliases_by_ent_id(disruptores).items() for nombre in nombres}
+    rnd = random.Random(0)
+    for n_errores in (1, 2):
+        casos = [(errores_ocr(nombre, n_errores, rnd), ent_id) for nombre, ent_id in ids.items() if isinstance(nombre, str)]
+        exacto = sum(any(e[1] == ent_id for e in analizar_texto(t, nlp_model)) for t, ent_id in casos)
+        aproximado = sum(any(e[1] == ent_id for e in indice(t)) for t, ent_id in casos)
+        print(f"{n_errores} error(es): {len(casos)} alias | exacto: {exacto} | aproximado: {aproximado}")
+
+    for termino in ("propylparabcn", "triclosari", "rnethylparaben", "butylated hydroxy toluenc"):
+        print(f"  {termino!r:28} -> {indice.buscar(termino)[:2]}")
+
+    # Latencia por búsqueda (término suelto) y por texto completo
+    terminos = [errores_ocr(n, 1, rnd) for n in ids if isinstance(n, str)] * 20
+    inicio = time.perf_counter()
+    for termino in terminos:
+        indice.buscar(termino)
+    print(f"Búsqueda: {(time.perf_counter() - inicio) / len(terminos) * 1e6:.0f} µs por término")
+    textos = disruptores["texto"].dropna().tolist()
+    inicio = time.perf_counter()
+    for texto in textos:
+        indice(texto)
+    print(f"Texto completo: {(time.perf_counter() - inicio) / len(textos) * 1e3:.2f} ms por texto ({len(textos)} textos)")
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.nlp.nlp_entityruler import BASE_DIR, RUTA_DISRUPTORES, cargar_pipeline
+from src.nlp.nlp_functions import normalize
+from src.nlp.cache_textos import obtener_cache
+from src.nlp.nlp_matcher import MatcherDisruptores
+
+# PARA EJECUTAR:  python -m src.nlp.nlp_batch data/raw/beauty.parquet -o data/processed/beauty_disruptores.parquet -w 4
+# Puntuación masiva de corpus de ingredientes (Parquet o JSONL) en streaming:
+#  - lee la entrada por lotes (row groups con pyarrow / bloques de líneas en JSONL), nunca el archivo entero
+#  - detecta disruptores con el matcher de trie (misma salida que el EntityRuler, ver nlp_matcher)
+#  - reparte los lotes entre procesos y escribe cada lote en el Parquet de salida según termina, en orden
+#  - los textos repetidos (muchos productos comparten ingredientes) salen del caché de textos (ver cache_textos)
+# La memoria es la de unos pocos lotes en vuelo, independientemente del tamaño del corpus.
+
+COLUMNA_TEXTO = "ingredients_text"
+FILAS_POR_LOTE = 10_000
+ETIQUETA = "DISRUPTOR"
+
+_matcher = None   # matcher del proceso (uno por worker)
+_cache = None     # caché de textos del proceso (None = sin caché)
+
+
+def texto_ingredientes(valor):
+    """
+    Texto de una celda de ingredientes: la propia cadena o, en Open Beauty Facts, el 'text' del primer
+    elemento que lo tenga de la lista [{"lang", "text"}, ...] (igual que extract_text del notebook).
+    """
+    if isinstance(valor, list):
+        for it in valor:
+            if isinstance(it, dict) and "text" in it:
+                return it.get("text") or None
+        return None
+    return valor if isinstance(valor, str) and valor else None
+
+
+def lotes_parquet(ruta, columnas=None, filas_por_lote=FILAS_POR_LOTE):
+    """Lotes (pa.RecordBatch) de un Parquet leído row group a row group."""
+    archivo = pq.ParquetFile(ruta)
+    yield from archivo.iter_batches(batch_size=filas_por_lote, columns=columnas)
+
+
+def lotes_jsonl(ruta, columnas, columna_texto=COLUMNA_TEXTO, filas_por_lote=FILAS_POR_LOTE):
+    """
+    Lotes (pa.RecordBatch) de un JSONL leído por bloques de líneas. Solo se conservan 'columnas'; todas se
+    guardan como cadena (los valores que no lo son, como JSON) para que el esquema sea estable entre lotes.
+    La columna de texto se guarda ya extraída con texto_ingredientes.
+    """
+    def lote(filas):
+        datos = {c: [texto_ingredientes(f.get(c)) if c == columna_texto else texto_o_json(f.get(c)) for f in filas]
+                 for c in columnas}
+        return pa.RecordBatch.from_pydict(datos, schema=pa.schema([(c, pa.string()) for c in columnas]))
+
+    def texto_o_json(valor):
+        if valor is None or isinstance(valor, str):
+            return valor
+        return json.dumps(valor, ensure_ascii=False)
+
+    filas = []
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                filas.append(json.loads(linea))
+            if len(filas) >= filas_por_lote:
+                yield lote(filas)
+                filas = []
+    if filas:
+        yield lote(filas)
+
+
+def _iniciar_worker(ruta_disruptores, usar_cache=True):
+    """
+    Inicializador de cada proceso: construye SU matcher una sola vez a partir del pipeline ya compilado por el padre
+    y abre el caché de textos (el matcher da las mismas entidades que el EntityRuler, así que comparten caché).
+    """
+    global _matcher, _cache
+    nlp = cargar_pipeline(ruta_disruptores)
+    _matcher = MatcherDisruptores(nlp.get_pipe("entity_ruler").patterns)
+    _cache = obtener_cache(nlp) if usar_cache else None
+
+
+def _puntuar_textos(textos):
+    """Tarea de un worker: (detected_entities, detected_ids) de cada texto, solo entidades DISRUPTOR."""
+    entidades, ids = [], []
+    try:
+        for texto in textos:
+            encontradas = [(nombre, ent_id) for nombre, ent_id, label in _detectar(texto) if label == ETIQUETA] if texto else []
+            entidades.append([nombre for nombre, _ in encontradas])
+            ids.append([ent_id or "" for _, ent_id in encontradas])
+    finally:
+        # Los workers del pool no pasan por atexit al terminar: lo pendiente se escribe al final de cada lote
+        if _cache is not None:
+            _cache.guardar_en_disco()
+    return entidades, ids
+
+
+def _detectar(texto):
+    """Entidades de un texto con el matcher del proceso, pasando antes por el caché de textos si lo hay."""
+    if _cache is None:
+        return _matcher(texto)
+    texto_norm = normalize(texto)
+    encontradas = _cache.obtener(texto_norm)
+    if encontradas is None:
+        encontradas = _matcher.entidades(texto_norm)
+        _cache.guardar(texto_norm, encontradas)
+    return encontradas
+
+
+def _textos_lote(lote, columna_texto):
+    """Textos de ingredientes de un lote (la columna puede ser texto o la lista [{"lang", "text"}] de OBF)."""
+    return [texto_ingredientes(v) for v in lote.column(columna_texto).to_pylist()]
+
+
+def puntuar_corpus(entrada, ruta_salida, columna_texto=COLUMNA_TEXTO, conservar=None, n_workers=None,
+                   filas_por_lote=FILAS_POR_LOTE, ruta_disruptores=RUTA_DISRUPTORES, usar_cache=True):
+    """
+    Detecta disruptores en cada fila de un corpus Parquet o JSONL y escribe un Parquet con las columnas
+    conservadas más detected_entities, detected_ids y n_detected, lote a lote.
+      - conservar: columnas de entrada que se copian a la salida (None = todas en Parquet, solo el texto en JSONL)
+      - n_workers: procesos (None = nº de núcleos); el orden de las filas se mantiene
+      - usar_cache: reutiliza las entidades de los textos ya analizados (también entre ejecuciones, en SQLite)
+    Devuelve un resumen con los contadores.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    es_jsonl = entrada.lower().endswith((".jsonl", ".json"))
+    if es_jsonl:
+        columnas = list(dict.fromkeys([columna_texto] + list(conservar or [])))
+        lotes = lotes_jsonl(entrada, columnas, columna_texto, filas_por_lote)
+    else:
+        columnas = list(dict.fromkeys([columna_texto] + list(conservar))) if conservar else None
+        lotes = lotes_parquet(entrada, columnas, filas_por_lote)
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_salida)), exist_ok=True)
+    ruta_tmp = ruta_salida + ".tmp"
+    inicio = time.perf_counter()
+    filas, detectadas, writer = 0, 0, None
+
+    def escribir(lote, resultado):
+        nonlocal writer, filas, detectadas
+        entidades, ids = resultado
+        if conservar is not None and columna_texto not in conservar:
+            lote = lote.drop_columns([columna_texto])
+        tabla = pa.Table.from_batches([lote])
+        tabla = tabla.append_column("detected_entities", pa.array(entidades, type=pa.list_(pa.string())))
+        tabla = tabla.append_column("detected_ids", pa.array(ids, type=pa.list_(pa.string())))
+        tabla = tabla.append_column("n_detected", pa.array([len(e) for e in entidades], type=pa.int32()))
+        if writer is None:
+            writer = pq.ParquetWriter(ruta_tmp, tabla.schema)
+        writer.write_table(tabla)
+        filas += tabla.num_rows
+        detectadas += sum(1 for e in entidades if e)
+
+    # El pipeline se compila (si falta) aquí, una vez: los workers solo lo cargan desde disco
+    cargar_pipeline(ruta_disruptores)
+
+    try:
+        # Ventana de lotes en vuelo acotada: como mucho 2 por worker esperan en memoria
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_iniciar_worker,
+                                 initargs=(ruta_disruptores, usar_cache)) as pool:
+            en_vuelo = deque()
+            for lote in lotes:
+                en_vuelo.append((lote, pool.submit(_puntuar_textos, _textos_lote(lote, columna_texto))))
+                if len(en_vuelo) >= 2 * n_workers:
+                    lote_listo, futuro = en_vuelo.popleft()
+                    escribir(lote_listo, futuro.result())
+            while en_vuelo:
+                lote_listo, futuro = en_vuelo.popleft()
+                escribir(lote_listo, futuro.result())
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        raise ValueError(f"La entrada {entrada} no tiene filas")
+    os.replace(ruta_tmp, ruta_salida)
+    segundos = time.perf_counter() - inicio
+    return {"filas": filas, "filas_con_disruptores": detectadas, "segundos": round(segundos, 2),
+            "filas_por_segundo": round(filas / segundos, 1) if segundos else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detección masiva de disruptores en un corpus Parquet o JSONL.")
+    parser.add_argument("entrada", help="Archivo .parquet o .jsonl")
+    parser.add_argument("-o", "--salida", default=os.path.join(BASE_DIR, "data", "processed", "corpus_disruptores.parquet"))
+    parser.add_argument("-c", "--columna", default=COLUMNA_TEXTO, help="Columna con el texto de ingredientes")
+    parser.add_argument("--conservar", nargs="*", default=None, help="Columnas de entrada que se copian a la salida")
+    parser.add_argument("-w", "--workers", type=int, default=None)
+    parser.add_argument("--filas-por-lote", type=int, default=FILAS_POR_LOTE)
+    parser.add_argument("--sin-cache", action="store_true", help="No usar el caché de textos ya analizados")
+    args = parser.parse_args()
+
+    resumen = puntuar_corpus(args.entrada, args.salida, args.columna, args.conservar, args.workers, args.filas_por_lote,
+                             usar_cache=not args.sin_cache)
+    print(f"Filas: {resumen['filas']} | Con disruptores: {resumen['filas_con_disruptores']} | "
+          f"{resumen['segundos']} s ({resumen['filas_por_segundo']} filas/s) -> {args.salida}")
@@ -1,49 +1,331 @@
 import os
+import shutil
+import tempfile
+import threading
+import contextlib
+from collections import deque
 import spacy
 import pandas as pd
-from spacy.pipeline import EntityRuler
 import re
 
-from src.nlp.nlp_functions import normalize, build_patterns_from_df
+from src.nlp.nlp_functions import normalize, aliases_by_ent_id, build_patterns_for_ent_id
+from src.nlp.nlp_optimizador import optimizar_patrones
+from src.nlp.nlp_incremental import CLAVE_META, manifiesto_patrones, refrescar_pipeline
+from src.instrumentacion import tramo, instrumentar
+from src.utils_hash import hash_archivo
 
+# Base del proyecto: dos niveles arriba desde este archivo
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+RUTA_DISRUPTORES = os.path.join(BASE_DIR, "data", "processed", "disruptores_final.parquet")
+# Pipelines compilados: una carpeta por modo y versión del parquet (disruptores-<modo>-<hash>).
+# spaCy no tiene un cargador con memoria mapeada o sin copia: from_disk deserializa vocabulario, tokenizador y
+# patrones (msgpack/JSON) a objetos Python, que no se pueden compartir entre procesos. Por eso la carpeta se carga
+# una vez por proceso (_pipelines) y cada worker de un pool tiene su copia.
+DIR_PIPELINES = os.path.join(BASE_DIR, "data", "processed", "nlp_pipeline")
 
-def cargar_entity_ruler():
+# Modos de pipeline:
+#  - "matching": spacy.blank("en") + entity_ruler. Los patrones solo usan LOWER/ORTH, así que basta con el tokenizador
+#  - "completo": en_core_web_md (tok2vec, tagger, parser, lemmatizer y vectores) + entity_ruler, como en los notebooks
+MODOS = ("matching", "completo")
+MODO_POR_DEFECTO = "matching"
+
+# Pipelines ya cargados en este proceso: ruta de la carpeta -> nlp
+_pipelines = {}
+_lock_pipelines = threading.Lock()
+# Hash del parquet por (ruta, mtime, tamaño): cargar_pipeline lo consulta en cada llamada (cada rerun de Streamlit)
+_hashes_parquet = {}
+
+if os.name == "nt":
+    import msvcrt
+
+    def _bloquear(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # reintenta 10 s y después lanza OSError
+                return
+            except OSError:
+                pass
+
+    def _desbloquear(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _bloquear(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _desbloquear(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def hash_parquet(ruta_parquet=RUTA_DISRUPTORES):
     """
-    Función que crea un modelo de NER para detectar disruptores hormonales en productos cosméticos.
-    Utiliza un EntityRuler de spaCy para añadir patrones de entidades basados en una lista de ingredientes comunes.
+    SHA-256 del parquet de disruptores: identifica la versión de los patrones.
+    Solo se relee el archivo (por bloques) si cambió su fecha de modificación o su tamaño.
+    """
+    info = os.stat(ruta_parquet)
+    clave = (os.path.abspath(ruta_parquet), info.st_mtime_ns, info.st_size)
+    sha256 = _hashes_parquet.get(clave)
+    if sha256 is None:
+        sha256 = _hashes_parquet[clave] = hash_archivo(ruta_parquet)
+    return sha256
+
+
+def ruta_pipeline(ruta_parquet=RUTA_DISRUPTORES, modo=MODO_POR_DEFECTO):
+    """Carpeta del pipeline compilado para el modo y la versión actual del parquet."""
+    return os.path.join(DIR_PIPELINES, f"disruptores-{modo}-{hash_parquet(ruta_parquet)[:16]}")
+
+
+def crear_entity_ruler(disruptores_final, modo=MODO_POR_DEFECTO):
+    """Crea el pipeline spaCy con el EntityRuler y los patrones de la lista de disruptores."""
+    if modo not in MODOS:
+        raise ValueError(f"modo debe ser uno de {MODOS}, no {modo!r}")
+
+    if modo == "matching":
+        # Solo tokenizador: mismas reglas de tokenización en inglés que en_core_web_md, sin componentes estadísticos
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler", config={"overwrite_ents": True, "validate": True,
+                                                      "phrase_matcher_attr": "LOWER"})
+    else:
+        # Cargamos modelo
+        nlp = spacy.load("en_core_web_md", disable = ["ner"])  # Deshabilitamos el componente NER predefinido
+
+        # Añadimos el EntityRuler al pipeline. Sobreescribo las entidades existentes
+        # tambien añado validación para detectar patrones mal formados
+        # phrase_matcher_attr="LOWER": los alias de un solo token van al PhraseMatcher (ver nlp_optimizador)
+        ruler = nlp.add_pipe("entity_ruler", config={"overwrite_ents": True, "validate": True,
+                                                      "phrase_matcher_attr": "LOWER"}, before="ner")
+
+    # Generamos la lista de patrones (igual que build_patterns_from_df, por ent_id) y el manifiesto
+    # con el que después se pueden aplicar solo los cambios (ver nlp_incremental)
+    aliases = aliases_by_ent_id(disruptores_final)
+    patrones = [p for ent_id, names in aliases.items() for p in build_patterns_for_ent_id(ent_id, names)]
+    # Quitamos las variantes redundantes (mismas coincidencias con menos patrones, ver nlp_optimizador)
+    optimizados = optimizar_patrones(patrones, nlp)
+    nlp.meta["n_patrones"] = {"generados": len(patrones), "optimizados": len(optimizados)}
+    ruler.add_patterns(optimizados)
+    nlp.meta[CLAVE_META] = manifiesto_patrones(aliases)
+    return nlp
+
+
+@contextlib.contextmanager
+def bloqueo_pipelines(modo=MODO_POR_DEFECTO):
+    """
+    Bloqueo entre procesos (archivo .bloqueo-<modo> en DIR_PIPELINES) para compilar y guardar el pipeline de un modo:
+    si varios procesos arrancan a la vez sin pipeline compilado, solo uno lo compila y los demás lo cargan.
+    El sistema lo libera aunque el proceso muera.
     """
-    # Base del proyecto: dos niveles arriba desde este archivo
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    processed_dir = os.path.join(base_dir, "data", "processed")
+    os.makedirs(DIR_PIPELINES, exist_ok=True)
+    with open(os.path.join(DIR_PIPELINES, f".bloqueo-{modo}"), "a+b") as f:
+        _bloquear(f)
+        try:
+            yield
+        finally:
+            _desbloquear(f)
 
-    # Leemos los datos de la lista de disruptores_final
-    disruptores_final = pd.read_parquet(os.path.join(processed_dir, "disruptores_final.parquet"))
 
-    # Cargamos modelo 
-    nlp = spacy.load("en_core_web_md", disable = ["ner"])  # Deshabilitamos el componente NER predefinido
+def construir_pipeline(ruta_parquet=RUTA_DISRUPTORES, modo=MODO_POR_DEFECTO):
+    """
+    Paso de compilación: crea el pipeline (tokenizador + EntityRuler con los patrones) y lo guarda con
+    nlp.to_disk en una carpeta versionada por el hash del parquet. Exporta también los patrones a
+    entity_ruler_patterns.jsonl y borra las versiones anteriores. Devuelve la carpeta del pipeline.
+    Si la carpeta ya existe (la compiló otro proceso mientras esperábamos el bloqueo) no se compila de nuevo.
+    """
+    sha256 = hash_parquet(ruta_parquet)
+    destino = os.path.join(DIR_PIPELINES, f"disruptores-{modo}-{sha256[:16]}")
 
-    # Añadimos el EntityRuler al pipeline. Sobreescribo las entidades existentes
-    # tambien añado validación para detectar patrones mal formados
-    ruler = nlp.add_pipe("entity_ruler", config={"overwrite_ents": True, "validate": True}, before="ner") 
-    
-    # Generamos la lista de patrones
-    patrones = build_patterns_from_df(disruptores_final)
-    print(f"Patrones generados: {len(patrones)}")
-    ruler.add_patterns(patrones)
+    with bloqueo_pipelines(modo):
+        if os.path.isdir(destino):
+            return destino
+        nlp = crear_entity_ruler(pd.read_parquet(ruta_parquet), modo)
+        nlp.meta["disruptores_sha256"] = sha256
+        guardar_pipeline(nlp, destino, modo)
+    return destino
+
+
+def guardar_pipeline(nlp, destino, modo=MODO_POR_DEFECTO):
+    """
+    Guarda el pipeline en 'destino', exporta entity_ruler_patterns.jsonl y borra las versiones anteriores del modo.
+    Se llama con bloqueo_pipelines(modo) tomado. Una carpeta 'destino' que ya existe no se toca (otro proceso
+    la guardó con el mismo parquet y puede estar cargándose). Devuelve True si lo guardó.
+    """
+    if os.path.isdir(destino):
+        return False
+
+    # Escribimos en una carpeta temporal propia y la renombramos ya completa: nunca se carga un pipeline a medio escribir
+    os.makedirs(DIR_PIPELINES, exist_ok=True)
+    temporal = tempfile.mkdtemp(prefix=f".tmp-disruptores-{modo}-", dir=DIR_PIPELINES)
+    try:
+        nlp.to_disk(temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
 
     # Guardamos patrones
-    ruler.to_disk("./entity_ruler_patterns.jsonl")
+    nlp.get_pipe("entity_ruler").to_disk(os.path.join(BASE_DIR, "entity_ruler_patterns.jsonl"))
 
-    return nlp  
+    # Eliminamos solo versiones antiguas ya terminadas del modo (disruptores-<modo>-<16 hex>) y temporales
+    # abandonadas: con el bloqueo tomado ningún otro proceso está escribiendo
+    version = re.compile(rf"disruptores-{re.escape(modo)}-[0-9a-f]{{16}}")
+    for nombre in os.listdir(DIR_PIPELINES):
+        ruta = os.path.join(DIR_PIPELINES, nombre)
+        if ruta != destino and (version.fullmatch(nombre) or nombre.startswith(f".tmp-disruptores-{modo}-")):
+            shutil.rmtree(ruta, ignore_errors=True)
+    return True
 
 
-def analizar_texto(texto: str, nlp_model):
+def cargar_pipeline(ruta_parquet=RUTA_DISRUPTORES, modo=MODO_POR_DEFECTO):
+    """
+    Devuelve el pipeline compilado para la versión actual del parquet.
+    Solo lo compila si no existe su carpeta (el parquet cambió) y solo lo carga una vez por proceso:
+    las siguientes llamadas (p. ej. cada petición de Streamlit) reutilizan el mismo objeto.
+    Si el parquet cambia con un pipeline ya cargado, la nueva versión se obtiene cargando de nuevo la anterior
+    y aplicando solo los patrones de las entidades que cambiaron (ver nlp_incremental), y se guarda en disco.
+    El objeto anterior no se modifica (otros hilos pueden estar usándolo): se sustituye por el nuevo.
+    """
+    destino = ruta_pipeline(ruta_parquet, modo)
+    nlp = _pipelines.get(destino)
+    if nlp is not None:
+        return nlp
+
+    with _lock_pipelines, tramo("nlp.cargar_pipeline", modo=modo):
+        if destino in _pipelines:
+            return _pipelines[destino]
+        anteriores = [r for r in _pipelines if os.path.basename(r).startswith(f"disruptores-{modo}-")]
+        if anteriores and not os.path.isdir(destino):
+            # Versión anterior en memoria: refresco incremental en lugar de compilar. Con el bloqueo solo un
+            # proceso la refresca y la guarda; los demás encuentran 'destino' ya guardado y lo cargan
+            with bloqueo_pipelines(modo):
+                if not os.path.isdir(destino) and os.path.isdir(anteriores[-1]):
+                    with tramo("nlp.refrescar_pipeline"):
+                        nlp = spacy.load(anteriores[-1])
+                        resumen = refrescar_pipeline(nlp, pd.read_parquet(ruta_parquet))
+                    nlp.meta["disruptores_sha256"] = hash_parquet(ruta_parquet)
+                    nlp.meta["refresco"] = resumen   # qué entidades se añadieron, quitaron o cambiaron
+                    nlp.meta.pop("n_patrones", None)    # era de la versión anterior; el total está en el resumen
+                    guardar_pipeline(nlp, destino, modo)
+                    _pipelines[destino] = nlp
+        if destino not in _pipelines:
+            if not os.path.isdir(destino):
+                with tramo("nlp.construir_pipeline"):
+                    construir_pipeline(ruta_parquet, modo)
+            _pipelines[destino] = spacy.load(destino)
+        # Las versiones anteriores dejan de servirse (quien aún las use sigue teniendo su objeto)
+        for anterior in anteriores:
+            del _pipelines[anterior]
+        return _pipelines[destino]
+
+
+@instrumentar("nlp.cargar_entity_ruler")
+def cargar_entity_ruler(modo=MODO_POR_DEFECTO):
+    """
+    Función que crea un modelo de NER para detectar disruptores hormonales en productos cosméticos.
+    Utiliza un EntityRuler de spaCy para añadir patrones de entidades basados en una lista de ingredientes comunes.
+    El modelo se compila una vez por versión de disruptores_final.parquet (ver construir_pipeline).
+    Por defecto es el pipeline "matching" (solo tokenizador + ruler); modo="completo" usa en_core_web_md.
+    """
+    return cargar_pipeline(modo=modo)
+
+
+def _entidades(doc):
+    """Entidades de un Doc como [(span_text, ent_id, label), ...]."""
+    return [(ent.text, ent.ent_id_, ent.label_) for ent in doc.ents]
+
+
+def analizar_texto(texto: str, nlp_model, cache=None):
     """
     Devuelve solo las entidades detectadas como:
       [(span_text, ent_id, label), ...]
+    cache: CacheTextos opcional (ver cache_textos); un texto ya analizado no vuelve a pasar por spaCy.
     """
-    norm_out = normalize(texto)
+    with tramo("nlp.normalize"):
+        norm_out = normalize(texto)
     texto_proc = " ".join(map(str, norm_out)) if isinstance(norm_out, (list, tuple)) else str(norm_out)
-    doc = nlp_model(texto_proc)
-    return [(ent.text, ent.ent_id_, ent.label_) for ent in doc.ents]
+    return analizar_normalizado(texto_proc, nlp_model, cache)
+
+
+def analizar_normalizado(texto_proc, nlp_model, cache=None):
+    """Como analizar_texto sobre un texto ya normalizado (para quien también necesita el normalizado)."""
+    if cache is not None:
+        entidades = cache.obtener(texto_proc)
+        if entidades is not None:
+            return entidades
+    with tramo("nlp.entity_ruler", tokens_aprox=texto_proc.count(" ") + 1):
+        doc = nlp_model(texto_proc)
+        entidades = _entidades(doc)
+    if cache is not None:
+        cache.guardar(texto_proc, entidades)
+    return entidades
+
+
+def analizar_textos(textos, nlp_model, batch_size=256, n_process=1, as_tuples=False, cache=None):
+    """
+    Versión por lotes de analizar_texto sobre nlp.pipe. Es un generador: normaliza y procesa en streaming
+    y solo guarda en memoria el lote en curso, nunca todos los Doc.
+      - textos: iterable de strings, o de (texto, contexto) si as_tuples=True (p. ej. el id del producto)
+      - n_process: procesos de spaCy para repartir los lotes entre núcleos
+      - cache: CacheTextos opcional; solo los textos que no están en caché pasan por spaCy
+    Devuelve por cada texto [(span_text, ent_id, label), ...] o, con as_tuples, (entidades, contexto).
+    """
+    pares = textos if as_tuples else ((texto, None) for texto in textos)
+
+    if cache is None:
+        normalizados = ((normalize(texto), contexto) for texto, contexto in pares)
+        for doc, contexto in nlp_model.pipe(normalizados, batch_size=batch_size, n_process=n_process, as_tuples=True):
+            yield (_entidades(doc), contexto) if as_tuples else _entidades(doc)
+        return
+
+    # Con caché: a spaCy solo le llegan los fallos. 'pendientes' guarda, en orden de entrada, los textos
+    # que nlp.pipe ya ha leído; los aciertos se emiten en cuanto les toca y los fallos cuando llega su Doc
+    pendientes = deque()   # [texto_normalizado, contexto, entidades o None]
+
+    def fallos():
+        for texto, contexto in pares:
+            texto_norm = normalize(texto)
+            entidades = cache.obtener(texto_norm)
+            pendientes.append([texto_norm, contexto, entidades])
+            if entidades is None:
+                yield texto_norm
+
+    try:
+        for doc in nlp_model.pipe(fallos(), batch_size=batch_size, n_process=n_process):
+            while pendientes[0][2] is not None:
+                _, contexto, entidades = pendientes.popleft()
+                yield (entidades, contexto) if as_tuples else entidades
+            texto_norm, contexto, _ = pendientes.popleft()
+            entidades = _entidades(doc)
+            cache.guardar(texto_norm, entidades)
+            yield (entidades, contexto) if as_tuples else entidades
+
+        # Lo que queda son aciertos posteriores al último fallo
+        while pendientes:
+            _, contexto, entidades = pendientes.popleft()
+            yield (entidades, contexto) if as_tuples else entidades
+    finally:
+        # También si quien consume el generador para antes (break, excepción o close())
+        cache.guardar_en_disco()
+
+
+def comparar_tokenizacion(nlp_a, nlp_b, textos):
+    """
+    Compara la tokenización de dos pipelines sobre textos normalizados.
+    Devuelve la lista de (texto, tokens_a, tokens_b) donde difieren (vacía = misma tokenización).
+    """
+    diferencias = []
+    for texto in textos:
+        texto_norm = normalize(texto)
+        tokens_a = [t.text for t in nlp_a.make_doc(texto_norm)]
+        tokens_b = [t.text for t in nlp_b.make_doc(texto_norm)]
+        if tokens_a != tokens_b:
+            diferencias.append((texto_norm, tokens_a, tokens_b))
+    return diferencias
+
 
+if __name__ == "__main__":
+    # Compila el pipeline a partir del parquet actual: python -m src.nlp.nlp_entityruler [matching|completo]
+    import sys
+    modo = sys.argv[1] if len(sys.argv) > 1 else MODO_POR_DEFECTO
+    print(f"Pipeline compilado en: {construir_pipeline(modo=modo)}")
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from src.nlp.nlp_functions import make_ent_ids
+from src.instrumentacion import instrumentar
+
+# Columnas de la ficha que se muestran de cada disruptor detectado
+COLUMNAS_FICHA = ["Fuente_original", "Anexo_cosIng", "Health_effects", "uso"]
+
+
+def construir_indice_fichas(disruptores_final):
+    """
+    Precalcula las fichas de disruptores: {ent_id: (posición, {columna: valor})} con la PRIMERA fila
+    de cada ent_id en el orden del parquet. Se construye una vez y cada consulta es O(1) por entidad.
+    """
+    df = disruptores_final[["CAS Number", "EC Number"] + COLUMNAS_FICHA].copy()
+    df["ent_id"] = make_ent_ids(df["CAS Number"], df["EC Number"])
+    df = df.drop_duplicates(subset="ent_id", keep="first")
+
+    indice = {}
+    for posicion, ent_id, *valores in zip(df.index, df["ent_id"], *(df[c] for c in COLUMNAS_FICHA)):
+        indice[ent_id] = (posicion, dict(zip(COLUMNAS_FICHA, valores)))
+    return indice
+
+
+@instrumentar("fichas.busqueda")
+def fichas_detectadas(indice, entidades):
+    """
+    Tabla de fichas para las entidades detectadas [(nombre, ent_id, label), ...] con O(k) búsquedas.
+    Mismo resultado que filtrar el parquet por ID: una fila por nombre detectado, en el orden del parquet.
+    """
+    # Nombre detectado por ID (si un ID aparece varias veces se queda el último, como antes)
+    id_a_nombre = {ent[1]: ent[0] for ent in (entidades or []) if isinstance(ent, (list, tuple)) and len(ent) >= 2}
+
+    filas = sorted((indice[ent_id][0], nombre, indice[ent_id][1])
+                   for ent_id, nombre in id_a_nombre.items() if ent_id in indice)
+
+    # Elimina duplicados por nombre para que solo muestre los nombres detectados no otros con el mismo CAS/EC Number
+    vistos, posiciones, registros = set(), [], []
+    for posicion, nombre, ficha in filas:
+        if nombre not in vistos:
+            vistos.add(nombre)
+            posiciones.append(posicion)
+            registros.append({"nombre_etiqueta": nombre, **ficha})
+    return pd.DataFrame(registros, index=posiciones, columns=["nombre_etiqueta"] + COLUMNAS_FICHA)
@@ -1,4 +1,5 @@
 import json
+import string
 import spacy
 import pandas as pd
 from spacy.pipeline import EntityRuler
@@ -40,6 +41,14 @@ def no_symbols(words):
     """
     return [re.sub(r"[^a-zA-Z0-9,\-]", "", word) for word in words if word]
 
+# Tabla para normalize: guiones "raros" -> '-' y mayúsculas ASCII -> minúsculas en una sola pasada.
+# Solo se bajan las ASCII: str.lower() de algunos caracteres no ASCII (p. ej. 'İ' o el signo Kelvin) produce
+# letras ASCII que el tokenizador original no habría cogido
+_tabla_normalize = str.maketrans({"‐": "-", "–": "-", "—": "-", "−": "-",
+                                  **{c: c.lower() for c in string.ascii_uppercase}})
+# Mismo patrón que _token_re pero ya en minúsculas
+_token_lower_re = re.compile(r"[a-z0-9]+(?:[-,][a-z0-9]+)*")
+
 def normalize(text: str) -> str:
     """
     Normalización que:
@@ -47,11 +56,21 @@ def normalize(text: str) -> str:
     - Tokeniza sin `nlp`
     - Minúsculas
     - Elimina símbolos restantes
+    Se hace en una sola pasada (translate + una regex) con el mismo resultado que
+    get_tokens -> to_lowercase -> no_symbols: los tokens de la regex ya no contienen símbolos.
     """
-    words = get_tokens(text)
-    words = to_lowercase(words)
-    words = no_symbols(words)
-    return " ".join(words)
+    return " ".join(_token_lower_re.findall(str(text).translate(_tabla_normalize)))
+
+def normalize_series(textos):
+    """
+    Versión vectorizada de normalize para una pd.Series o un array de Arrow (pyarrow.Array/ChunkedArray).
+    Mismo resultado que aplicar normalize a cada valor, salvo los nulos, que se mantienen nulos.
+    """
+    if hasattr(textos, "to_pandas"):  # array de Arrow
+        textos = textos.to_pandas()
+    serie = pd.Series(textos) if not isinstance(textos, pd.Series) else textos
+    serie = serie.where(serie.isna(), serie.astype(str))
+    return serie.str.translate(_tabla_normalize).str.findall(_token_lower_re).str.join(" ")
 
 
 def normalize_for_pattern(s: str):
@@ -70,6 +89,17 @@ def make_ent_id(cas: str, ec: str) -> str:
     if ec:         return f"EC:{ec}"
     return "" # sin CAS ni EC para no poner None 
 
+def make_ent_ids(cas, ec):
+    """
+    Versión vectorizada de make_ent_id para dos columnas (Series) alineadas: mismo formato de ID.
+    Los nulos cuentan como vacíos.
+    """
+    cas = pd.Series(cas).astype("string").str.strip().fillna("")
+    ec = pd.Series(ec, index=cas.index).astype("string").str.strip().fillna("")
+    ids = ("CAS:" + cas + "|EC:" + ec)
+    ids = ids.mask(ec == "", "CAS:" + cas).mask(cas == "", "EC:" + ec).mask((cas == "") & (ec == ""), "")
+    return ids.astype(object)
+
 
 def regex_compact_phrase(tokens):
     """
@@ -98,6 +128,70 @@ def sequence_with_optional_dashes_between_tokens(tokens):
 
 
 # Construcción de patrones
+def aliases_by_ent_id(df):
+    """
+    Alias (nombre_etiqueta) de cada ent_id a partir de un DataFrame con ['CAS Number','EC Number','nombre_etiqueta'].
+    Devuelve {ent_id: [alias, ...]} sin repetidos, en el mismo orden en que build_patterns_from_df los recorre
+    (grupos por CAS y EC ordenados y filas en su orden dentro de cada grupo; sin CAS no hay grupo).
+    """
+    base = df[["CAS Number", "EC Number", "nombre_etiqueta"]].copy()
+    base["EC Number"] = base["EC Number"].fillna("")
+    base = base[base["CAS Number"].notna()].sort_values(["CAS Number", "EC Number"], kind="stable")
+    base["ent_id"] = make_ent_ids(base["CAS Number"], base["EC Number"])
+
+    aliases = {}
+    for ent_id, name in zip(base["ent_id"], base["nombre_etiqueta"]):
+        names = aliases.setdefault(ent_id, [])
+        if isinstance(name, str) and name not in names: # no hay valores nulos pero por si acaso lo pongo
+            names.append(name)
+    return aliases
+
+
+def build_patterns_for_ent_id(ent_id, names):
+    """
+    Patrones A, B y C (ver build_patterns_from_df) de los alias de un solo ent_id.
+    Solo dependen de (ent_id, alias): así se pueden regenerar únicamente las entidades que cambian.
+    """
+    pats = []
+    seen = set()  # para evitar duplicados exactos los vamos guardando aquí, lo que meta aquí tiene que ser tupla porque es hashable
+
+    for name in names:
+        toks = normalize_for_pattern(name) # normalización ligera
+        if not toks:
+            continue
+
+        # (A) Multi-token exacto
+        signatureA = ("A", tuple("LOWER:" + t for t in toks))
+        if signatureA not in seen:
+            patternA = [{"LOWER": t} for t in toks]
+            pats.append({"label":"DISRUPTOR","pattern":patternA,"id":ent_id})
+            seen.add(signatureA)
+
+        # B) REGEX de un solo token con -? entre todos
+        if len(toks) >= 2:
+            regex = regex_compact_phrase(toks)
+            signatureB = ("B", regex)
+            if signatureB not in seen and regex:
+                patternB = [{"LOWER": {"REGEX": regex}}]
+                pats.append({"label":"DISRUPTOR","pattern":patternB,"id":ent_id})
+                seen.add(signatureB)
+
+        # C) multi-token con guion opcional ENTRE tokens
+        if len(toks) >= 2:
+            patternC = sequence_with_optional_dashes_between_tokens(toks)
+            sig_elems = []
+            for i, t in enumerate(toks):
+                sig_elems.append(f"LOWER:{t}")
+                if i < len(toks) - 1:
+                    sig_elems.append("ORTH:-?")
+            signatureC = ("C", tuple(sig_elems))
+            if signatureC not in seen:
+                pats.append({"label":"DISRUPTOR","pattern":patternC,"id":ent_id})
+                seen.add(signatureC)
+
+    return pats
+
+
 def build_patterns_from_df(df):
     """
     Construye patrones para el EntityRuler a partir de un DataFrame con columnas:
@@ -108,54 +202,9 @@ def build_patterns_from_df(df):
       B) REGEX de UN SOLO token, cubre tokens separados por: espacios/sin espacios/guiones
       C) Multi-token con guion opcional entre subpartes, cubre casos como '4-methyl…' y 'p-methoxy…'
          cuando spaCy tokeniza como ["4","-","methyl…"] o ["p","-","methoxy…"]).
+    Los patrones se generan por ent_id (ver build_patterns_for_ent_id y nlp_incremental).
     """
-
-    pats = []
-    seen = set()  # para evitar duplicados exactos los vamos guardando aquí, lo que meta aquí tiene que ser tupla porque es hashable
-
-    # Trabajamos con las 3 columnas necesarias
-    base = df[["CAS Number", "EC Number", "nombre_etiqueta"]].copy()
-    base["EC Number"] = base["EC Number"].fillna("")
-
-
-    for (cas, ec), group in base.groupby(["CAS Number", "EC Number"]):
-        ent_id = make_ent_id(cas, ec)
-        for name in group["nombre_etiqueta"].dropna().unique(): # no hay valores nulos pero por si acaso lo pongo
-            toks = normalize_for_pattern(name) # normalización ligera
-            if not toks:
-                continue
-
-            # (A) Multi-token exacto
-            signatureA = ("A", ent_id, tuple("LOWER:" + t for t in toks))
-            if signatureA not in seen:
-                patternA = [{"LOWER": t} for t in toks]
-                pats.append({"label":"DISRUPTOR","pattern":patternA,"id":ent_id})
-                seen.add(signatureA)
-
-            # B) REGEX de un solo token con -? entre todos
-            if len(toks) >= 2:
-                regex = regex_compact_phrase(toks)
-                signatureB = ("B", ent_id, regex)
-                if signatureB not in seen and regex:
-                    patternB = [{"LOWER": {"REGEX": regex}}]
-                    pats.append({"label":"DISRUPTOR","pattern":patternB,"id":ent_id})
-                    seen.add(signatureB)
-            
-            # C) multi-token con guion opcional ENTRE tokens
-            if len(toks) >= 2:
-                patternC = sequence_with_optional_dashes_between_tokens(toks)
-                sig_elems = []
-                for i, t in enumerate(toks):
-                    sig_elems.append(f"LOWER:{t}")
-                    if i < len(toks) - 1:
-                        sig_elems.append("ORTH:-?")
-                signatureC = ("C", ent_id, tuple(sig_elems))
-                if signatureC not in seen:
-                    pats.append({"label":"DISRUPTOR","pattern":patternC,"id":ent_id})
-                    seen.add(signatureC)
-
-
-    return pats
+    return [p for ent_id, names in aliases_by_ent_id(df).items() for p in build_patterns_for_ent_id(ent_id, names)]
 
 
 ### 3. Funciones para evaluación de algoritmo
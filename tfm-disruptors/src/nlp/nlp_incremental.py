@@ -0,0 +1,175 @@
+import json
+import hashlib
+
+from src.nlp.nlp_functions import aliases_by_ent_id, build_patterns_for_ent_id
+from src.nlp.nlp_optimizador import optimizar_patrones, ids_compartidos_alias
+
+# PARA EJECUTAR:  python -m src.nlp.nlp_incremental     (refresco incremental vs reconstrucción completa)
+# Compilación incremental de patrones. Los patrones de un ent_id solo dependen de sus alias
+# (build_patterns_for_ent_id), así que el manifiesto guarda un hash de los alias de cada ent_id.
+# Al refrescar se compara con el manifiesto anterior y solo se tocan las entidades añadidas, eliminadas
+# o cambiadas: EntityRuler.remove(ent_id) + add_patterns de sus patrones nuevos, sin recompilar el resto.
+# En el EntityRuler los patrones nuevos pasan por optimizar_patrones, igual que en crear_entity_ruler.
+
+# Cambiar si cambia la forma de generar patrones: invalida los manifiestos guardados
+VERSION_PATRONES = 2
+CLAVE_META = "manifiesto_patrones"   # el manifiesto se guarda en nlp.meta (viaja con nlp.to_disk)
+
+
+def hash_alias(names):
+    return hashlib.sha256(json.dumps(names, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def manifiesto_patrones(aliases):
+    """
+    Manifiesto {"version", "entidades": {ent_id: hash de sus alias}} de un {ent_id: [alias]}.
+    Los ent_id que comparten forma con otro llevan "*" tras el hash: sus patrones no se optimizan
+    (ver nlp_optimizador), así que si una entidad pasa a compartir forma o deja de hacerlo cuenta como cambiada.
+    """
+    compartidos = ids_compartidos_alias(aliases)
+    return {"version": VERSION_PATRONES,
+            "entidades": {ent_id: hash_alias(names) + ("*" if ent_id in compartidos else "") for ent_id, names in aliases.items()}}
+
+
+def diferencia_manifiestos(anterior, nuevo):
+    """Entidades añadidas, eliminadas y cambiadas entre dos manifiestos. Con otra versión cambia todo."""
+    previas = anterior["entidades"] if anterior and anterior.get("version") == VERSION_PATRONES else {}
+    actuales = nuevo["entidades"]
+    return {
+        "añadidas": [e for e in actuales if e not in previas],
+        "eliminadas": [e for e in previas if e not in actuales],
+        "cambiadas": [e for e in actuales if e in previas and previas[e] != actuales[e]],
+        "completa": not previas,
+    }
+
+
+def _a_quitar_y_poner(diferencia):
+    return diferencia["eliminadas"] + diferencia["cambiadas"], diferencia["añadidas"] + diferencia["cambiadas"]
+
+
+def admite_borrado_parcial(ruler):
+    """
+    _quitar_del_ruler usa atributos internos del EntityRuler de spaCy 3 (_ent_ids, _create_label). Si una versión
+    de spaCy no los tiene, refrescar_pipeline vacía el ruler y añade todos los patrones en lugar de aplicar la diferencia.
+    """
+    return hasattr(ruler, "_ent_ids") and hasattr(ruler, "_create_label") and hasattr(ruler, "matcher")
+
+
+def _quitar_del_ruler(ruler, ent_id):
+    """
+    EntityRuler.remove(ent_id). remove() solo quita del PhraseMatcher las etiquetas que están en él, así que si
+    el ent_id tiene patrones de texto y de tokens (ver nlp_optimizador) los de tokens se quitan aquí del Matcher.
+    Requiere admite_borrado_parcial(ruler).
+    """
+    etiquetas = [ruler._create_label(label, e) for label, e in ruler._ent_ids.values() if e == ent_id]
+    ruler.remove(ent_id)
+    for etiqueta in etiquetas:
+        if etiqueta in ruler.matcher:
+            ruler.matcher.remove(etiqueta)
+
+
+def aplicar_diferencia_ruler(ruler, diferencia, aliases):
+    """
+    Aplica la diferencia a un EntityRuler en uso: quita los patrones de las entidades eliminadas o cambiadas
+    y añade los de las nuevas o cambiadas. 'aliases' son los de todas las entidades (para saber cuáles comparten
+    forma con otra). Devuelve (patrones quitados, patrones añadidos).
+    """
+    quitar, poner = _a_quitar_y_poner(diferencia)
+    antes = len(ruler)
+    for ent_id in quitar:
+        try:
+            _quitar_del_ruler(ruler, ent_id)
+        except ValueError:   # el ent_id no tenía patrones (alias sin tokens)
+            pass
+    quitados = antes - len(ruler)
+    patrones = [p for ent_id in poner for p in build_patterns_for_ent_id(ent_id, aliases[ent_id])]
+    # Sin phrase_matcher_attr="LOWER" (pipelines antiguos) no se generan patrones de texto
+    patrones = optimizar_patrones(patrones, ruler.nlp, frases=ruler.phrase_matcher_attr == "LOWER",
+                                  compartidos=ids_compartidos_alias(aliases))
+    if patrones:
+        ruler.add_patterns(patrones)
+    return quitados, len(patrones)
+
+
+def aplicar_diferencia_matcher(matcher, diferencia, aliases):
+    """Igual que aplicar_diferencia_ruler sobre un MatcherDisruptores (ver nlp_matcher)."""
+    quitar, poner = _a_quitar_y_poner(diferencia)
+    quitados = sum(matcher.eliminar_id(ent_id) for ent_id in quitar)
+    patrones = [p for ent_id in poner for p in build_patterns_for_ent_id(ent_id, aliases[ent_id])]
+    for patron in patrones:
+        matcher.añadir_patron(patron)
+    return quitados, len(patrones)
+
+
+def refrescar_pipeline(nlp, disruptores_final):
+    """
+    Actualiza en el sitio el EntityRuler de un pipeline con la nueva lista de disruptores aplicando solo
+    la diferencia con el manifiesto que guarda nlp.meta. Si el pipeline no tiene manifiesto (compilado
+    con una versión anterior) o la diferencia toca entidades que comparten forma con otra, se sustituyen
+    todos los patrones. Devuelve un resumen de lo aplicado.
+    """
+    ruler = nlp.get_pipe("entity_ruler")
+    aliases = aliases_by_ent_id(disruptores_final)
+    nuevo = manifiesto_patrones(aliases)
+    diferencia = diferencia_manifiestos(nlp.meta.get(CLAVE_META), nuevo)
+    # Entre ent_ids que comparten forma el EntityRuler desempata por el orden de inserción de sus patrones: si la
+    # diferencia toca alguno, se añaden todos de nuevo en el mismo orden que crear_entity_ruler
+    quitar, poner = _a_quitar_y_poner(diferencia)
+    if not admite_borrado_parcial(ruler) or not ids_compartidos_alias(aliases).isdisjoint(quitar + poner):
+        diferencia = diferencia_manifiestos(None, nuevo)
+    if diferencia["completa"]:
+        ruler.clear()
+    quitados, añadidos = aplicar_diferencia_ruler(ruler, diferencia, aliases)
+    nlp.meta[CLAVE_META] = nuevo
+    return {"añadidas": len(diferencia["añadidas"]), "eliminadas": len(diferencia["eliminadas"]),
+            "cambiadas": len(diferencia["cambiadas"]), "completa": diferencia["completa"],
+            "patrones_quitados": quitados, "patrones_añadidos": añadidos, "patrones_total": len(ruler)}
+
+
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    from src.nlp.nlp_entityruler import RUTA_DISRUPTORES, crear_entity_ruler, _entidades
+    from src.nlp.nlp_matcher import MatcherDisruptores
+    from src.nlp.nlp_functions import normalize, build_patterns_from_df
+    from src.nlp.nlp_optimizador import textos_control
+    from benchmarks.corpus import textos_corpus
+
+    disruptores = pd.read_parquet(RUTA_DISRUPTORES)
+    textos = [normalize(t) for t in textos_corpus(n=5000)]
+
+    # Cambio típico de un curador: un alias nuevo, un alias corregido y una sustancia dada de baja
+    nueva = disruptores.iloc[[0]].copy()
+    nueva["CAS Number"], nueva["EC Number"] = "0000-00-0", "000-000-0"   # CAS/EC que no está en la lista
+    nueva["nombre_etiqueta"] = "triclocarban sodium"
+    cambiada = disruptores.copy()
+    cambiada.loc[cambiada.index[1], "nombre_etiqueta"] = str(cambiada["nombre_etiqueta"].iat[1]) + " acid"
+    cambiada = pd.concat([cambiada[cambiada["CAS Number"] != disruptores["CAS Number"].iat[2]], nueva], ignore_index=True)
+
+    # Corpus más textos con cada forma de cada alias de la lista nueva (incluido el de la entidad añadida)
+    textos += [normalize(t) for t in textos_control(build_patterns_from_df(cambiada))]
+
+    nlp = crear_entity_ruler(disruptores)
+    inicio = time.perf_counter()
+    resumen = refrescar_pipeline(nlp, cambiada)
+    t_incremental = time.perf_counter() - inicio
+    print("Refresco incremental:", resumen, f"{t_incremental * 1000:.1f} ms")
+
+    inicio = time.perf_counter()
+    nlp_completo = crear_entity_ruler(cambiada)
+    t_completo = time.perf_counter() - inicio
+    print(f"Reconstrucción completa: {t_completo * 1000:.1f} ms   (x{t_completo / t_incremental:.0f})")
+
+    # Paridad: mismas entidades con el pipeline refrescado que con el reconstruido, y mismos patrones
+    iguales = all(_entidades(a) == _entidades(b) for a, b in zip(nlp.pipe(textos), nlp_completo.pipe(textos)))
+    claves = lambda patrones: sorted(json.dumps(p, sort_keys=True) for p in patrones)
+    mismos = claves(nlp.get_pipe("entity_ruler").patterns) == claves(optimizar_patrones(build_patterns_from_df(cambiada), nlp))
+    print(f"Entidades idénticas en {len(textos)} textos: {iguales} | Mismo conjunto de patrones: {mismos}")
+
+    # Lo mismo sobre el matcher de trie
+    matcher = MatcherDisruptores(build_patterns_from_df(disruptores))
+    aliases = aliases_by_ent_id(cambiada)
+    diferencia = diferencia_manifiestos(manifiesto_patrones(aliases_by_ent_id(disruptores)), manifiesto_patrones(aliases))
+    aplicar_diferencia_matcher(matcher, diferencia, aliases)
+    matcher_completo = MatcherDisruptores(build_patterns_from_df(cambiada))
+    print(f"Matcher refrescado idéntico: {all(matcher.entidades(t) == matcher_completo.entidades(t) for t in textos)}")
@@ -0,0 +1,164 @@
+import re
+import spacy
+
+from src.nlp.nlp_functions import normalize
+
+# Backend alternativo al EntityRuler para los patrones de build_patterns_from_df.
+# En lugar de evaluar una REGEX por token y patrón, precompila todos los alias en:
+#  - un trie de tokens para los patrones multi-token (A: exacto, C: con guion opcional entre tokens)
+#  - un diccionario por forma compacta (sin guiones) para los patrones REGEX de un solo token (B)
+# También acepta los patrones de nlp_optimizador (de texto y {"LOWER": {"IN": [...]}}), que van al trie.
+# Así cada posición del texto cuesta una búsqueda en diccionario y el matching es lineal en nº de tokens.
+
+_GUION_OPCIONAL = {"ORTH": "-", "OP": "?"}
+
+
+def _piezas_regex_compacta(regex):
+    """Deshace regex_compact_phrase: '^t1-?t2-?t3$' -> ['t1', 't2', 't3'] (sin escapes)."""
+    if not (regex.startswith("^") and regex.endswith("$")):
+        return None
+    return [re.sub(r"\\(.)", r"\1", p) for p in regex[1:-1].split("-?")]
+
+
+class MatcherDisruptores:
+    """
+    Matcher de disruptores con trie de tokens. Devuelve las mismas tuplas (texto, ent_id, label)
+    que analizar_texto con el EntityRuler, usando el mismo tokenizador de spaCy (solo tokenizador).
+    La paridad con el EntityRuler se comprueba en tests/test_nlp_matcher.py.
+    """
+
+    def __init__(self, patrones, nlp=None):
+        # Solo se usa el tokenizador; spacy.blank("en") tokeniza igual que el pipeline del EntityRuler
+        self.nlp = nlp or spacy.blank("en")
+        self._raiz = {}         # (token, admite_guion_antes) -> nodo; nodo = [hijos, [(ent_id, label, orden)]]
+        self._compactos = {}    # forma compacta -> [(regex compilada, ent_id, label, orden)]
+        self.n_patrones = 0
+        for patron in patrones:
+            self.añadir_patron(patron)
+
+    def añadir_patron(self, patron):
+        """Añade un patrón en formato EntityRuler ({"label", "pattern", "id"}) generado por build_patterns_from_df."""
+        label, ent_id, orden = patron["label"], patron.get("id", ""), self.n_patrones
+        pasos = patron["pattern"]
+
+        # Patrones de nlp_optimizador: texto (PhraseMatcher sobre LOWER) = secuencia exacta de sus tokens,
+        # y {"LOWER": {"IN": [...]}} = un patrón exacto de un token por cada forma
+        if isinstance(pasos, str):
+            pasos = [{"LOWER": t.lower_} for t in self.nlp.make_doc(pasos)]
+        elif len(pasos) == 1 and set(pasos[0]) == {"LOWER"} and isinstance(pasos[0]["LOWER"], dict) \
+                and set(pasos[0]["LOWER"]) == {"IN"}:
+            for forma in pasos[0]["LOWER"]["IN"]:
+                self._raiz.setdefault((forma, False), [{}, []])[1].append((ent_id, label, orden))
+            self.n_patrones += 1
+            return
+
+        # B) REGEX de un solo token
+        if len(pasos) == 1 and isinstance(pasos[0].get("LOWER"), dict):
+            regex = pasos[0]["LOWER"].get("REGEX")
+            piezas = _piezas_regex_compacta(regex) if regex else None
+            if not piezas:
+                raise ValueError(f"Patrón REGEX no soportado: {patron}")
+            self._compactos.setdefault("".join(piezas), []).append((re.compile(regex), ent_id, label, orden))
+
+        # A) y C) secuencias de LOWER, opcionalmente con {"ORTH": "-", "OP": "?"} entre tokens
+        else:
+            nodo_hijos, nodo, guion = self._raiz, None, False
+            for paso in pasos:
+                if paso == _GUION_OPCIONAL and nodo is not None:
+                    guion = True
+                    continue
+                if set(paso) != {"LOWER"} or not isinstance(paso["LOWER"], str):
+                    raise ValueError(f"Patrón no soportado: {patron}")
+                nodo = nodo_hijos.setdefault((paso["LOWER"], guion), [{}, []])
+                nodo_hijos, guion = nodo[0], False
+            if nodo is None:
+                raise ValueError(f"Patrón vacío: {patron}")
+            nodo[1].append((ent_id, label, orden))
+
+        self.n_patrones += 1
+
+    def eliminar_id(self, ent_id):
+        """Quita todos los patrones de un ent_id (para aplicar cambios sin reconstruir). Devuelve cuántos quitó."""
+        quitados = 0
+        for forma in list(self._compactos):
+            restantes = [c for c in self._compactos[forma] if c[1] != ent_id]
+            quitados += len(self._compactos[forma]) - len(restantes)
+            if restantes:
+                self._compactos[forma] = restantes
+            else:
+                del self._compactos[forma]
+
+        def podar(hijos):
+            nonlocal quitados
+            for clave in list(hijos):
+                nodo = hijos[clave]
+                finales = [f for f in nodo[1] if f[0] != ent_id]
+                quitados += len(nodo[1]) - len(finales)
+                nodo[1] = finales
+                podar(nodo[0])
+                if not nodo[0] and not nodo[1]:
+                    del hijos[clave]
+        podar(self._raiz)
+        return quitados
+
+    def _coincidencias(self, tokens):
+        """Todas las coincidencias (inicio, fin, ent_id, label, orden) sobre la lista de tokens en minúsculas."""
+        encontrados = []
+        n = len(tokens)
+        for i, token in enumerate(tokens):
+            # B) un solo token: candidatos por forma compacta y verificación con su regex
+            for regex, ent_id, label, orden in self._compactos.get(token.replace("-", ""), ()):
+                if regex.search(token):
+                    encontrados.append((i, i + 1, ent_id, label, orden))
+
+            # A) y C) recorrido del trie desde el token i (pocos estados activos a la vez)
+            nodo = self._raiz.get((token, False))
+            estados = [(nodo, i + 1)] if nodo else []
+            while estados:
+                siguientes = []
+                for (hijos, finales), j in estados:
+                    for ent_id, label, orden in finales:
+                        encontrados.append((i, j, ent_id, label, orden))
+                    if j >= n:
+                        continue
+                    t = tokens[j]
+                    for admite_guion in (False, True):  # sin guion en medio vale para A y para C
+                        sig = hijos.get((t, admite_guion))
+                        if sig:
+                            siguientes.append((sig, j + 1))
+                    if t == "-" and j + 1 < n:  # guion opcional entre tokens: solo patrones C
+                        sig = hijos.get((tokens[j + 1], True))
+                        if sig:
+                            siguientes.append((sig, j + 2))
+                estados = siguientes
+        return encontrados
+
+    def entidades(self, texto_normalizado):
+        """
+        Entidades sobre un texto ya normalizado, con la misma resolución de solapes que el EntityRuler:
+        primero las más largas, a igual longitud la que empieza antes, y sin pisar tokens ya usados.
+        """
+        doc = self.nlp.make_doc(texto_normalizado)
+        tokens = [t.lower_ for t in doc]
+
+        # Una coincidencia por (inicio, fin, label, ent_id): el EntityRuler deduplica igual
+        unicas = {}
+        for inicio, fin, ent_id, label, orden in self._coincidencias(tokens):
+            clave = (inicio, fin, label, ent_id)
+            if clave not in unicas or orden < unicas[clave]:
+                unicas[clave] = orden
+        ordenadas = sorted(unicas.items(), key=lambda x: (-(x[0][1] - x[0][0]), x[0][0], x[1]))
+
+        vistos, elegidas = set(), []
+        for (inicio, fin, label, ent_id), _ in ordenadas:
+            if inicio not in vistos and fin - 1 not in vistos:
+                elegidas.append((inicio, fin, label, ent_id))
+                vistos.update(range(inicio, fin))
+
+        elegidas.sort()
+        return [(doc[inicio:fin].text, ent_id, label) for inicio, fin, label, ent_id in elegidas]
+
+    def __call__(self, texto):
+        """Igual que analizar_texto(texto, nlp_model): normaliza y devuelve [(span_text, ent_id, label), ...]."""
+        return self.entidades(normalize(texto))
+
@@ -0,0 +1,233 @@
+import json
+from itertools import product
+
+import spacy
+
+from src.nlp.nlp_functions import regex_compact_phrase, normalize_for_pattern
+from src.nlp.nlp_matcher import _piezas_regex_compacta, _GUION_OPCIONAL
+
+# PARA EJECUTAR:  python -m src.nlp.nlp_optimizador     (nº de patrones antes/después y velocidad en el corpus)
+#                 python -m pytest tests/test_nlp_optimizador.py   (paridad)
+# Optimizador del conjunto de patrones de build_patterns_from_df. Dentro de cada ent_id:
+#  - A (secuencia exacta de LOWER) sobra si hay un C con los mismos tokens: C con el guion opcional ya la cubre.
+#  - B (REGEX ^t1-?t2$ sobre un token) se sustituye por {"LOWER": {"IN": [...]}} con todas sus variantes
+#    (t1t2, t1-t2): una búsqueda en un set por token en lugar de evaluar una regex. Todas las variantes de un
+#    ent_id van en un único patrón IN.
+#  - Los A que quedan (alias de un solo token) pasan al PhraseMatcher (patrón de texto, phrase_matcher_attr="LOWER")
+#    si el tokenizador los deja igual; si no, se añaden al IN del ent_id (un token con ese LOWER).
+# Las coincidencias (label, ent_id, inicio, fin) son las mismas, así que el EntityRuler da las mismas entidades.
+# Excepción: si dos ent_id pueden coincidir en el mismo tramo (comparten una forma compacta, p. ej. el mismo alias
+# con dos CAS), el EntityRuler desempata por el orden en que le llegan las coincidencias del Matcher y del
+# PhraseMatcher, y ese orden cambia al mover patrones entre ellos. Los patrones de esos ent_id se dejan sin tocar.
+
+# Máximo de variantes por REGEX (2^(piezas-1)); por encima se deja la REGEX
+MAX_VARIANTES = 64
+
+
+def _es_exacto(pasos):
+    """Patrón A: lista de {"LOWER": str}."""
+    return isinstance(pasos, list) and all(set(p) == {"LOWER"} and isinstance(p["LOWER"], str) for p in pasos)
+
+
+def _tokens_c(pasos):
+    """Tokens de un patrón C (LOWER con {"ORTH": "-", "OP": "?"} entre ellos) o None si no lo es."""
+    if not isinstance(pasos, list) or len(pasos) < 3 or len(pasos) % 2 == 0:
+        return None
+    if any(p != _GUION_OPCIONAL for p in pasos[1::2]) or not _es_exacto(pasos[::2]):
+        return None
+    return tuple(p["LOWER"] for p in pasos[::2])
+
+
+def variantes_regex(regex, max_variantes=MAX_VARIANTES):
+    """Todas las formas de un token que acepta '^t1-?t2-?t3$' (con y sin cada guion), o None si no es de ese tipo."""
+    piezas = _piezas_regex_compacta(regex) if isinstance(regex, str) else None
+    # Solo si la regex es exactamente la que genera regex_compact_phrase con esas piezas
+    if not piezas or regex_compact_phrase(piezas) != regex or 2 ** (len(piezas) - 1) > max_variantes:
+        return None
+    variantes = set()
+    for guiones in product(("", "-"), repeat=len(piezas) - 1):
+        variantes.add(piezas[0] + "".join(g + p for g, p in zip(guiones, piezas[1:])))
+    return variantes
+
+
+def _formas_compactas(pasos):
+    """Formas compactas (tokens pegados y sin guiones) de los tramos que puede cubrir un patrón A, B, C, IN o de texto."""
+    if isinstance(pasos, str):
+        return {"".join(normalize_for_pattern(pasos.lower()))}
+    if _es_exacto(pasos):
+        return {"".join(p["LOWER"] for p in pasos).replace("-", "")}
+    tokens = _tokens_c(pasos)
+    if tokens:
+        return {"".join(tokens).replace("-", "")}
+    if len(pasos) == 1 and isinstance(pasos[0].get("LOWER"), dict):
+        if "IN" in pasos[0]["LOWER"]:
+            return {v.replace("-", "") for v in pasos[0]["LOWER"]["IN"]}
+        piezas = _piezas_regex_compacta(pasos[0]["LOWER"].get("REGEX") or "")
+        if piezas:
+            return {"".join(piezas)}
+    return set()
+
+
+def ids_compartidos(formas_por_id):
+    """ent_ids que comparten alguna forma compacta con otro ent_id ({ent_id: {formas}} -> {ent_id})."""
+    ids_por_forma = {}
+    for ent_id, formas in formas_por_id.items():
+        for forma in formas:
+            ids_por_forma.setdefault(forma, set()).add(ent_id)
+    return {ent_id for ids in ids_por_forma.values() if len(ids) > 1 for ent_id in ids}
+
+
+def ids_compartidos_patrones(patrones):
+    """ids_compartidos a partir de una lista completa de patrones."""
+    formas = {}
+    for patron in patrones:
+        formas.setdefault(patron.get("id"), set()).update(_formas_compactas(patron["pattern"]))
+    return ids_compartidos(formas)
+
+
+def ids_compartidos_alias(aliases):
+    """ids_compartidos a partir de {ent_id: [alias]} (ver aliases_by_ent_id), sin generar los patrones."""
+    return ids_compartidos({ent_id: {"".join(normalize_for_pattern(n)) for n in names} - {""}
+                            for ent_id, names in aliases.items()})
+
+
+def _es_frase(tokens, nlp):
+    """El tokenizador deja el texto del alias en exactamente esos tokens (condición para pasarlo al PhraseMatcher)."""
+    return [t.text for t in nlp.make_doc(" ".join(tokens))] == list(tokens)
+
+
+def optimizar_patrones(patrones, nlp=None, frases=True, max_variantes=MAX_VARIANTES, compartidos=None):
+    """
+    Versión mínima y canónica de una lista de patrones del EntityRuler (ver cabecera) con las mismas coincidencias.
+    Trabaja por (label, id), así que optimizar todo o entidad a entidad da el mismo resultado.
+      - nlp: pipeline cuyo tokenizador se usa para decidir qué alias pueden ser patrones de texto
+      - frases: False si el EntityRuler no tiene phrase_matcher_attr="LOWER" (entonces no hay patrones de texto)
+      - compartidos: ent_ids que se dejan sin optimizar. Por defecto los que comparten forma con otro ent_id
+        dentro de 'patrones'; al optimizar solo algunas entidades hay que pasarlos (ver ids_compartidos_alias)
+    Devuelve los patrones optimizados; los que no reconoce se dejan tal cual.
+    """
+    nlp = nlp or spacy.blank("en")
+    compartidos = ids_compartidos_patrones(patrones) if compartidos is None else compartidos
+    grupos = {}
+    for patron in patrones:
+        grupos.setdefault((patron["label"], patron.get("id")), []).append(patron)
+
+    optimizados = []
+    for (label, ent_id), grupo in grupos.items():
+        if ent_id in compartidos:
+            optimizados += grupo
+            continue
+
+        # Mismo orden de claves que build_patterns_from_df: label, pattern, id
+        def nuevo(pasos):
+            return {"label": label, "pattern": pasos, **({"id": ent_id} if ent_id is not None else {})}
+
+        secuencias_c = {_tokens_c(p["pattern"]) for p in grupo} - {None}
+        exactos, en_token, resto = [], set(), []
+        for patron in grupo:
+            pasos = patron["pattern"]
+            regex = pasos[0]["LOWER"].get("REGEX") if (isinstance(pasos, list) and len(pasos) == 1
+                                                        and isinstance(pasos[0].get("LOWER"), dict)) else None
+            variantes = variantes_regex(regex, max_variantes) if regex else None
+            if _es_exacto(pasos):
+                tokens = tuple(p["LOWER"] for p in pasos)
+                if tokens not in secuencias_c and tokens not in exactos:
+                    exactos.append(tokens)
+            elif variantes:
+                en_token |= variantes
+            elif isinstance(pasos, list) and len(pasos) == 1 and set(pasos[0]) == {"LOWER"} \
+                    and set(pasos[0]["LOWER"]) == {"IN"}:
+                en_token |= set(pasos[0]["LOWER"]["IN"])
+            elif isinstance(pasos, str) and frases:
+                exactos.append(tuple(t.text.lower() for t in nlp.make_doc(pasos)))
+            elif patron not in resto:
+                resto.append(patron)
+
+        # Patrones de texto para los A de tokens sin mayúsculas que el tokenizador no parte; el resto de A de un
+        # token va al IN. Una variante del IN que ya es un patrón de texto de un token sobra
+        textos, secuencias = [], []
+        for tokens in exactos:
+            if frases and all(t == t.lower() for t in tokens) and _es_frase(tokens, nlp):
+                textos.append(" ".join(tokens))
+            elif len(tokens) == 1:
+                en_token.add(tokens[0])
+            else:
+                secuencias.append(tokens)
+        en_token -= {t for t in textos if " " not in t}
+
+        optimizados += [nuevo(texto) for texto in textos]
+        if en_token:
+            optimizados.append(nuevo([{"LOWER": {"IN": sorted(en_token)}}]))
+        optimizados += [nuevo([{"LOWER": t} for t in tokens]) for tokens in secuencias]
+        optimizados += [nuevo(p["pattern"]) for p in resto]
+    return optimizados
+
+
+def resumen_patrones(patrones):
+    """Nº de patrones por tipo: texto (PhraseMatcher), IN, REGEX, exacto (A) y con guion opcional (C)."""
+    tipos = {"texto": 0, "in": 0, "regex": 0, "exacto": 0, "guion_opcional": 0, "otros": 0}
+    for patron in patrones:
+        pasos = patron["pattern"]
+        if isinstance(pasos, str):
+            tipos["texto"] += 1
+        elif _es_exacto(pasos):
+            tipos["exacto"] += 1
+        elif _tokens_c(pasos):
+            tipos["guion_opcional"] += 1
+        elif len(pasos) == 1 and isinstance(pasos[0].get("LOWER"), dict):
+            tipos["in" if "IN" in pasos[0]["LOWER"] else "regex"] += 1
+        else:
+            tipos["otros"] += 1
+    return {"total": len(patrones), **tipos}
+
+
+def textos_control(patrones):
+    """
+    Textos que ejercitan cada forma de cada alias (separado, con guiones, compacto y pegado a puntuación),
+    para comprobar la paridad también en formas que el corpus no trae.
+    """
+    textos = []
+    for patron in patrones:
+        pasos = patron["pattern"]
+        tokens = _tokens_c(pasos) or (tuple(p["LOWER"] for p in pasos) if _es_exacto(pasos) else None)
+        if tokens:
+            for forma in {" ".join(tokens), "-".join(tokens), "".join(tokens), " - ".join(tokens)}:
+                textos.append(f"aqua, {forma}, parfum ({forma}) {forma}-free")
+    return textos
+
+
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    from src.nlp.nlp_entityruler import RUTA_DISRUPTORES
+    from src.nlp.nlp_functions import normalize, build_patterns_from_df
+    from benchmarks.corpus import textos_corpus
+
+    patrones = build_patterns_from_df(pd.read_parquet(RUTA_DISRUPTORES))
+
+    def ruler_con(patrones_ruler, config):
+        nlp = spacy.blank("en")
+        nlp.add_pipe("entity_ruler", config={"overwrite_ents": True, "validate": True, **config}).add_patterns(patrones_ruler)
+        return nlp
+
+    nlp_opt = spacy.blank("en")
+    inicio = time.perf_counter()
+    optimizados = optimizar_patrones(patrones, nlp_opt)
+    t_optimizar = time.perf_counter() - inicio
+    nlp_orig = ruler_con(patrones, {})
+    nlp_opt = ruler_con(optimizados, {"phrase_matcher_attr": "LOWER"})
+    print(f"Antes:   {resumen_patrones(patrones)}")
+    print(f"Después: {resumen_patrones(optimizados)}   ({t_optimizar * 1000:.0f} ms)")
+    print(f"ent_ids que comparten forma con otro (sin optimizar): {len(ids_compartidos_patrones(patrones))}")
+    print(f"JSONL: {sum(len(json.dumps(p)) + 1 for p in patrones)} -> {sum(len(json.dumps(p)) + 1 for p in optimizados)} bytes")
+
+    # Velocidad del matching (solo el EntityRuler, sobre Doc ya tokenizados; el corpus se repite hasta 500 textos)
+    textos = [normalize(t) for t in textos_corpus()]
+    docs = [nlp_orig.make_doc(t) for t in textos] * max(1, 500 // len(textos))
+    for nombre, nlp in (("original", nlp_orig), ("optimizado", nlp_opt)):
+        ruler = nlp.get_pipe("entity_ruler")
+        inicio = time.perf_counter()
+        for doc in docs:
+            ruler(doc)
+        tiempo = time.perf_counter() - inicio
+        print(f"EntityRuler {nombre:10}: {tiempo:.2f} s, {len(docs) / tiempo:,.0f} textos/s")
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+
+from src.ocr.ocr_reader import IDIOMAS_POR_DEFECTO
+from src.ocr.ocr_process import leer_resultados
+from src.utils_hash import hash_bytes
+
+# Base del proyecto: dos niveles arriba desde este archivo
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+RUTA_CACHE = os.path.join(BASE_DIR, "data", "processed", "ocr_cache.sqlite")
+
+
+def bytes_imagen(imagen):
+    """Contenido binario de la imagen (ruta, bytes, archivo abierto o array) para calcular su hash."""
+    if isinstance(imagen, np.ndarray):
+        # Forma y dtype en la cabecera: los mismos bytes con otro dtype son otra imagen
+        return f"{imagen.shape}{imagen.dtype.str}".encode() + imagen.tobytes()
+    if isinstance(imagen, (bytes, bytearray, memoryview)):
+        return bytes(imagen)
+    if hasattr(imagen, "read"):
+        return imagen.read()
+    with open(imagen, "rb") as f:
+        return f.read()
+
+
+def clave_ocr(sha256, idiomas, preprocesado):
+    """Clave del caché: hash del contenido + idiomas + parámetros de preprocesado."""
+    ajustes = json.dumps({"idiomas": list(idiomas), "preprocesado": preprocesado}, sort_keys=True)
+    return f"{sha256}:{ajustes}"
+
+
+class CacheOCR:
+    """
+    Caché persistente en SQLite de resultados OCR (texto y cajas) direccionado por contenido.
+    Expulsa las entradas usadas hace más tiempo (LRU) cuando supera max_entradas y cuenta aciertos/fallos.
+    Se puede compartir entre hilos (Streamlit) y entre procesos (SQLite en modo WAL).
+    """
+
+    def __init__(self, ruta=RUTA_CACHE, max_entradas=5000):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._con = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("""CREATE TABLE IF NOT EXISTS ocr (
+            clave TEXT PRIMARY KEY, texto TEXT NOT NULL, cajas TEXT NOT NULL, accedido REAL NOT NULL)""")
+        self._con.execute("CREATE INDEX IF NOT EXISTS idx_ocr_accedido ON ocr (accedido)")
+        self._con.commit()
+
+    def obtener(self, clave):
+        """Devuelve {"texto", "cajas"} si la clave está en caché (y la marca como recién usada) o None."""
+        with self._lock:
+            fila = self._con.execute("SELECT texto, cajas FROM ocr WHERE clave = ?", (clave,)).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            self._con.execute("UPDATE ocr SET accedido = ? WHERE clave = ?", (time.time(), clave))
+            self._con.commit()
+            self.aciertos += 1
+        return {"texto": fila[0], "cajas": json.loads(fila[1])}
+
+    def guardar(self, clave, texto, cajas):
+        """Guarda un resultado y expulsa las entradas menos usadas si se supera max_entradas."""
+        with self._lock:
+            self._con.execute("INSERT OR REPLACE INTO ocr (clave, texto, cajas, accedido) VALUES (?, ?, ?, ?)",
+                              (clave, texto, json.dumps(cajas, ensure_ascii=False), time.time()))
+            sobrantes = self._con.execute("SELECT COUNT(*) FROM ocr").fetchone()[0] - self.max_entradas
+            if sobrantes > 0:
+                self._con.execute("DELETE FROM ocr WHERE clave IN "
+                                  "(SELECT clave FROM ocr ORDER BY accedido ASC LIMIT ?)", (sobrantes,))
+            self._con.commit()
+
+    def ocr(self, imagen, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, preprocesado=None):
+        """
+        OCR con caché: si la imagen (por contenido) ya se leyó con los mismos idiomas y preprocesado
+        devuelve lo guardado, si no lee con easyocr y lo guarda. Devuelve {"texto", "cajas", "cache": bool}.
+        """
+        datos = bytes_imagen(imagen)
+        clave = clave_ocr(hash_bytes(datos), idiomas, preprocesado)
+
+        guardado = self.obtener(clave)
+        if guardado is not None:
+            return {**guardado, "cache": True}
+
+        # Si era un array se lee el propio array; en el resto de casos los bytes ya leídos
+        resultados = leer_resultados(imagen if isinstance(imagen, np.ndarray) else datos, idiomas, gpu, preprocesado)
+        texto = ' '.join(r["texto"] for r in resultados)
+        self.guardar(clave, texto, resultados)
+        return {"texto": texto, "cajas": resultados, "cache": False}
+
+    def estadisticas(self):
+        """Aciertos, fallos, ratio de aciertos y nº de entradas guardadas."""
+        with self._lock:
+            entradas = self._con.execute("SELECT COUNT(*) FROM ocr").fetchone()[0]
+        consultas = self.aciertos + self.fallos
+        return {"aciertos": self.aciertos, "fallos": self.fallos,
+                "ratio_aciertos": self.aciertos / consultas if consultas else 0.0, "entradas": entradas}
+
+
+_cache = None
+_lock_cache = threading.Lock()
+
+
+def obtener_cache(ruta=RUTA_CACHE, max_entradas=5000):
+    """Caché OCR compartido por todo el proceso (se abre la primera vez que se pide)."""
+    global _cache
+    with _lock_cache:
+        if _cache is None:
+            _cache = CacheOCR(ruta, max_entradas)
+        return _cache
@@ -0,0 +1,125 @@
+import os
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.ocr.ocr_reader import IDIOMAS_POR_DEFECTO, precargar_reader
+from src.ocr.ocr_process import leer_texto
+from src.utils_hash import hash_archivo
+
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+
+def listar_imagenes(entrada):
+    """Devuelve las imágenes de un directorio (jpg/jpeg/png) o las que casan con un patrón glob, ordenadas."""
+    if os.path.isdir(entrada):
+        rutas = [os.path.join(entrada, f) for f in os.listdir(entrada)]
+    else:
+        rutas = glob.glob(entrada)
+    return sorted(r for r in rutas if os.path.isfile(r) and r.lower().endswith(EXTENSIONES))
+
+
+def hashes_procesados(ruta_salida):
+    """Lee el JSONL de salida (si existe) y devuelve los sha256 que ya tienen un registro sin error."""
+    hechos = set()
+    if not os.path.isfile(ruta_salida):
+        return hechos
+    with open(ruta_salida, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                continue  # línea cortada si la ejecución anterior se interrumpió
+            if registro.get("sha256") and not registro.get("error"):
+                hechos.add(registro["sha256"])
+    return hechos
+
+
+def _iniciar_worker(idiomas, gpu, hilos):
+    """Inicializador de cada proceso del pool: limita hilos de torch y carga SU lector una sola vez."""
+    if hilos:
+        import torch
+        torch.set_num_threads(hilos)
+    precargar_reader(idiomas, gpu)
+
+
+def _ocr_imagen(ruta, sha256, idiomas, gpu, preprocesado):
+    """Tarea de un worker: OCR de una imagen. Nunca lanza excepción, el error va en el registro."""
+    inicio = time.perf_counter()
+    texto, error = None, None
+    try:
+        texto = leer_texto(ruta, idiomas, gpu, preprocesado)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {"image": os.path.basename(ruta), "sha256": sha256, "text": texto,
+            "seconds": round(time.perf_counter() - inicio, 3), "error": error}
+
+
+def procesar_ocr_masivo(entrada, ruta_salida, n_workers=None, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, hilos_por_worker=1,
+                        preprocesado=None):
+    """
+    OCR masivo de un directorio o patrón glob con un pool de procesos (cada worker con su lector).
+    Los resultados se añaden al JSONL en orden de finalización con: image, sha256, text, seconds, error.
+    Las imágenes cuyo contenido (sha256) ya tiene un registro sin error en la salida se saltan,
+    así una ejecución interrumpida se puede relanzar sin repetir trabajo.
+    preprocesado: dict con los parámetros de preprocesar_imagen, o None para leer la imagen original.
+    Devuelve un resumen con los contadores.
+    """
+    rutas = listar_imagenes(entrada)
+    hechos = hashes_procesados(ruta_salida)
+
+    # Solo encolamos imágenes con contenido nuevo (también evita repetir duplicados dentro del lote)
+    pendientes = []
+    for ruta in rutas:
+        sha256 = hash_archivo(ruta)
+        if sha256 not in hechos:
+            hechos.add(sha256)
+            pendientes.append((ruta, sha256))
+
+    resumen = {"total": len(rutas), "saltadas": len(rutas) - len(pendientes), "ok": 0, "errores": 0}
+    print(f"Imágenes: {resumen['total']} | ya procesadas: {resumen['saltadas']} | pendientes: {len(pendientes)}")
+    if not pendientes:
+        return resumen
+
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_salida)), exist_ok=True)
+    inicio = time.perf_counter()
+    with open(ruta_salida, "a", encoding="utf-8") as f, ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_iniciar_worker, initargs=(tuple(idiomas), gpu, hilos_por_worker)
+    ) as pool:
+        futuros = [pool.submit(_ocr_imagen, ruta, sha256, tuple(idiomas), gpu, preprocesado) for ruta, sha256 in pendientes]
+        for futuro in as_completed(futuros):
+            registro = futuro.result()
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()  # cada línea queda en disco al momento, para poder reanudar
+            if registro["error"]:
+                resumen["errores"] += 1
+                print(f"Error: {registro['image']} -> {registro['error']}")
+            else:
+                resumen["ok"] += 1
+                print(f"Procesado: {registro['image']} ({registro['seconds']} s)")
+
+    resumen["segundos"] = round(time.perf_counter() - inicio, 2)
+    print(f"\n--- Terminado ---\nProcesadas: {resumen['ok']}\nErrores: {resumen['errores']}\n"
+          f"Saltadas: {resumen['saltadas']}\nSalida: {ruta_salida}")
+    return resumen
+
+
+if __name__ == "__main__":
+    # Ejemplo: python -m src.ocr.ocr_batch data/raw/etiquetas -o data/processed/ocr_output.jsonl -w 4
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    parser = argparse.ArgumentParser(description="OCR masivo de etiquetas con salida JSONL reanudable.")
+    parser.add_argument("entrada", nargs="?", default=os.path.join(base_dir, "data", "raw", "etiquetas"),
+                        help="Directorio de imágenes o patrón glob (entre comillas)")
+    parser.add_argument("-o", "--salida", default=os.path.join(base_dir, "data", "processed", "ocr_output.jsonl"))
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos del pool (por defecto, nº de CPUs)")
+    parser.add_argument("-l", "--idiomas", nargs="+", default=list(IDIOMAS_POR_DEFECTO))
+    parser.add_argument("--sin-gpu", dest="gpu", action="store_false", help="Leer en CPU aunque haya GPU")
+    parser.add_argument("--hilos", type=int, default=1, help="Hilos de torch por worker (0 = sin límite)")
+    parser.add_argument("--lado-max", type=int, default=None,
+                        help="Preprocesa cada imagen reduciendo su lado largo a este tamaño (gris)")
+    args = parser.parse_args()
+
+    preprocesado = {"lado_max": args.lado_max, "gris": True, "recortar": False} if args.lado_max else None
+    procesar_ocr_masivo(args.entrada, args.salida, args.workers, args.idiomas, args.gpu, args.hilos, preprocesado)
@@ -1,37 +1,68 @@
 import os
-import easyocr
+from src.ocr.ocr_reader import IDIOMAS_POR_DEFECTO, obtener_reader, lock_reader
+from src.ocr.preprocesado import preprocesar_imagen
+from src.instrumentacion import tramo
 
-def procesar_ocr (archivo = "etiqueta_01.jpg") :
-    """
-    Realiza OCR sobre una imagen de etiqueta y guarda el texto extraído en un archivo.
-    Exporta el texto como string.
-    """
-    
+
+def resolver_ruta(archivo):
+    """Devuelve la ruta completa de la imagen: la propia ruta si existe o la carpeta data/raw/etiquetas."""
     # Base del proyecto: dos niveles arriba desde este archivo
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    # ruta_img = os.path.join(base_dir, "data", "raw", "etiquetas")
-    # processed_dir = os.path.join(base_dir, "data", "processed")
 
     # Detectar si archivo es ya una ruta completa
     if os.path.isfile(archivo):
-        ruta_completa = archivo
-    else:
-        ruta_img = os.path.join(base_dir, "data", "raw", "etiquetas")
-        ruta_completa = os.path.join(ruta_img, archivo)
+        return archivo
+    ruta_img = os.path.join(base_dir, "data", "raw", "etiquetas")
+    return os.path.join(ruta_img, archivo)
+
+
+def leer_resultados(imagen, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, preprocesado=None):
+    """
+    OCR de una imagen con el lector cacheado del proceso. Solo paga el coste de reconocimiento:
+    el modelo se carga una vez por proceso.
+    imagen puede ser una ruta, bytes, un archivo abierto o un array; preprocesado es un dict con los
+    parámetros de preprocesar_imagen (None = se lee la imagen tal cual).
+    Devuelve [{"caja": [[x, y] x4], "texto": str, "confianza": float}, ...] con tipos nativos (serializables).
+    """
+    if preprocesado is not None:
+        with tramo("ocr.preprocesado"):
+            imagen = preprocesar_imagen(imagen, **preprocesado)
+    elif hasattr(imagen, "read"):
+        imagen = imagen.read()  # easyocr acepta bytes pero no archivos abiertos
+
+    reader = obtener_reader(idiomas, gpu)
+    with lock_reader(idiomas, gpu), tramo("ocr.readtext"):
+        results = reader.readtext(imagen, detail=1)
+
+    return [{"caja": [[int(x), int(y)] for x, y in caja], "texto": texto, "confianza": float(conf)}
+            for caja, texto, conf in results]
 
-    # OCR
-    reader = easyocr.Reader(['es', 'en']) 
-    results = reader.readtext(ruta_completa, detail=0)
 
+def leer_texto(imagen, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, preprocesado=None):
+    """OCR de una imagen (ver leer_resultados). Devuelve el texto unido por espacios."""
     # Une el texto
-    texto_extraido = ' '.join(results)
+    return ' '.join(r["texto"] for r in leer_resultados(imagen, idiomas, gpu, preprocesado))
+
+
+def procesar_ocr (archivo = "etiqueta_01.jpg", idiomas=IDIOMAS_POR_DEFECTO, gpu=True, preprocesado=None, cache=None) :
+    """
+    Realiza OCR sobre una imagen de etiqueta y devuelve el texto extraído como string.
+    archivo puede ser un nombre/ruta o la imagen en memoria (bytes, archivo abierto o array),
+    así la app no necesita escribirla en disco.
+    cache: CacheOCR opcional (ver cache_ocr); si la misma imagen ya se leyó con los mismos ajustes
+    se devuelve el texto guardado sin pasar por easyocr.
+    """
+    imagen = resolver_ruta(archivo) if isinstance(archivo, (str, os.PathLike)) else archivo
+
+    # OCR (el lector easyocr se reutiliza entre llamadas, ver ocr_reader)
+    with tramo("ocr.procesar_ocr", cache=cache is not None):
+        if cache is not None:
+            texto_extraido = cache.ocr(imagen, idiomas, gpu, preprocesado)["texto"]
+        else:
+            texto_extraido = leer_texto(imagen, idiomas, gpu, preprocesado)
 
-    print("Texto extraído:\n", texto_extraido)
-    
     return texto_extraido
 
 if __name__ == "__main__":
     texto_extraido= procesar_ocr("etiqueta_075.jpg")
-    texto_extraido
-
-
+    print("Texto extraído:\n", texto_extraido)
@@ -0,0 +1,65 @@
+import threading
+import time
+import easyocr
+
+from src.instrumentacion import tramo
+
+# Idiomas por defecto de las etiquetas (mismo orden que se usaba en procesar_ocr)
+IDIOMAS_POR_DEFECTO = ("es", "en")
+
+# Registro de lectores del proceso: (idiomas, gpu) -> easyocr.Reader
+# Cada proceso (app, worker de un pool...) tiene su propio registro, así cada worker tiene su lector.
+_readers = {}
+_tiempos_carga = {}   # (idiomas, gpu) -> segundos que tardó en cargar el modelo
+_locks_uso = {}       # (idiomas, gpu) -> Lock que serializa readtext sobre el mismo lector
+_lock_registro = threading.Lock()
+
+
+def _clave(idiomas, gpu):
+    """Clave del registro: idiomas sin duplicados en su orden original + dispositivo."""
+    return tuple(dict.fromkeys(idiomas)), bool(gpu)
+
+
+def obtener_reader(idiomas=IDIOMAS_POR_DEFECTO, gpu=True):
+    """
+    Devuelve el easyocr.Reader para (idiomas, gpu), cargándolo solo la primera vez en el proceso.
+    La carga está protegida con un lock para que dos hilos no carguen el mismo modelo a la vez.
+    """
+    clave = _clave(idiomas, gpu)
+    reader = _readers.get(clave)
+    if reader is not None:
+        return reader
+
+    with _lock_registro:
+        # Otro hilo pudo cargarlo mientras esperábamos el lock
+        if clave not in _readers:
+            inicio = time.perf_counter()
+            with tramo("ocr.cargar_reader", idiomas=list(clave[0]), gpu=clave[1]):
+                _readers[clave] = easyocr.Reader(list(clave[0]), gpu=clave[1])
+            _tiempos_carga[clave] = time.perf_counter() - inicio
+            _locks_uso[clave] = threading.Lock()
+            print(f"Lector OCR {clave} cargado en {_tiempos_carga[clave]:.2f} s")
+        return _readers[clave]
+
+
+def lock_reader(idiomas=IDIOMAS_POR_DEFECTO, gpu=True):
+    """
+    Lock asociado al lector (idiomas, gpu). easyocr no garantiza que readtext sea seguro entre hilos,
+    así que los hilos que comparten lector deben leer dentro de este lock.
+    """
+    obtener_reader(idiomas, gpu)
+    return _locks_uso[_clave(idiomas, gpu)]
+
+
+def precargar_reader(idiomas=IDIOMAS_POR_DEFECTO, gpu=True):
+    """
+    Calentamiento explícito: carga el lector antes de la primera imagen (arranque de la app o del worker).
+    Devuelve los segundos que tardó la carga.
+    """
+    obtener_reader(idiomas, gpu)
+    return _tiempos_carga[_clave(idiomas, gpu)]
+
+
+def tiempos_carga():
+    """Devuelve {(idiomas, gpu): segundos} de los lectores cargados en este proceso."""
+    return dict(_tiempos_carga)
@@ -0,0 +1,69 @@
+import io
+import numpy as np
+from PIL import Image, ImageOps
+
+# Configuración del preprocesado antes del OCR cuando se activa (opt-in: por defecto se lee la imagen original).
+# lado_max: lado largo objetivo en píxeles (None = no reescalar). La detección de easyocr crece con el nº de píxeles
+# gris: pasa a escala de grises (easyocr reconoce sobre gris igualmente)
+# recortar: recorta a la zona con texto antes de leer
+PREPROCESADO_POR_DEFECTO = {"lado_max": 1600, "gris": True, "recortar": False}
+
+
+def cargar_imagen(imagen):
+    """
+    Devuelve una PIL.Image a partir de una ruta, bytes, un archivo abierto (p. ej. el upload de Streamlit),
+    un array de numpy o una PIL.Image. Aplica la rotación EXIF para que la foto del móvil quede derecha.
+    """
+    if isinstance(imagen, np.ndarray):
+        return Image.fromarray(imagen)  # un array ya viene decodificado, no tiene EXIF
+    if isinstance(imagen, (bytes, bytearray, memoryview)):
+        imagen = io.BytesIO(imagen)
+    if not isinstance(imagen, Image.Image):
+        imagen = Image.open(imagen)
+    return ImageOps.exif_transpose(imagen)
+
+
+def reescalar(img, lado_max):
+    """Reduce la imagen para que su lado largo sea lado_max. Nunca amplía."""
+    if not lado_max or max(img.size) <= lado_max:
+        return img
+    escala = lado_max / max(img.size)
+    nuevo = (max(1, round(img.width * escala)), max(1, round(img.height * escala)))
+    return img.resize(nuevo, Image.Resampling.LANCZOS)
+
+
+def caja_texto(gris, umbral=40, densidad_min=0.01, margen=0.02):
+    """
+    Devuelve la caja (y0, y1, x0, x1) que contiene el texto en un array en gris, o None si no encuentra nada.
+    El texto produce muchos bordes: nos quedamos con las filas/columnas cuya proporción de píxeles
+    con gradiente > umbral supera densidad_min, y añadimos un margen relativo.
+    """
+    g = gris.astype(np.int16)
+    bordes = (np.abs(np.diff(g, axis=1))[:-1, :] + np.abs(np.diff(g, axis=0))[:, :-1]) > umbral
+    filas = np.flatnonzero(bordes.mean(axis=1) > densidad_min)
+    cols = np.flatnonzero(bordes.mean(axis=0) > densidad_min)
+    if filas.size == 0 or cols.size == 0:
+        return None
+
+    alto, ancho = gris.shape[:2]
+    my, mx = int(alto * margen), int(ancho * margen)
+    return (max(0, filas[0] - my), min(alto, filas[-1] + 2 + my),
+            max(0, cols[0] - mx), min(ancho, cols[-1] + 2 + mx))
+
+
+def preprocesar_imagen(imagen, lado_max=PREPROCESADO_POR_DEFECTO["lado_max"],
+                       gris=PREPROCESADO_POR_DEFECTO["gris"], recortar=PREPROCESADO_POR_DEFECTO["recortar"]):
+    """
+    Preprocesado en memoria antes del OCR: rotación EXIF, reescalado al lado largo, gris y recorte opcional.
+    Devuelve un array de numpy listo para reader.readtext (2D si es gris, BGR si es color como espera easyocr).
+    """
+    img = reescalar(cargar_imagen(imagen), lado_max)
+    arr_gris = np.asarray(img.convert("L")) if (gris or recortar) else None
+    arr = arr_gris if gris else np.asarray(img.convert("RGB"))[:, :, ::-1]  # RGB -> BGR
+
+    if recortar:
+        caja = caja_texto(arr_gris)
+        if caja is not None:
+            y0, y1, x0, x1 = caja
+            arr = arr[y0:y1, x0:x1]
+    return np.ascontiguousarray(arr)
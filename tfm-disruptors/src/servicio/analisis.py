@@ -0,0 +1,71 @@
+import time
+import threading
+import contextlib
+
+from src.ocr.ocr_reader import IDIOMAS_POR_DEFECTO, precargar_reader
+from src.ocr.ocr_process import leer_texto
+from src.ocr.cache_ocr import obtener_cache
+from src.nlp.nlp_entityruler import cargar_pipeline, analizar_normalizado, analizar_textos
+from src.nlp.cache_textos import obtener_cache as obtener_cache_textos
+from src.nlp.nlp_functions import normalize
+from src.nlp.nlp_aproximado import entidades_no_exactas
+from src.instrumentacion import tramo, recoger
+
+# Flujo completo OCR -> normalización -> NER sobre una imagen en memoria.
+# Lo usan los workers de la cola de trabajos y el servicio HTTP, que cargan los modelos una vez por proceso.
+
+# El tokenizador de spaCy tiene cachés internas: en el servicio HTTP (varios hilos) el NER se serializa
+_lock_nlp = threading.Lock()
+
+
+def iniciar_modelos(idiomas=IDIOMAS_POR_DEFECTO, gpu=True):
+    """Carga (calienta) el lector OCR y el pipeline NLP del proceso. Devuelve los segundos de cada carga."""
+    inicio = time.perf_counter()
+    cargar_pipeline()
+    return {"ocr_s": round(precargar_reader(idiomas, gpu), 2), "nlp_s": round(time.perf_counter() - inicio, 2)}
+
+
+def analizar_imagen(imagen, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, preprocesado=None, usar_cache=True,
+                    aproximado=False, trazas=False):
+    """
+    OCR + NER de una imagen (bytes, array o ruta) sin escribirla en disco.
+    Devuelve {"texto", "texto_normalizado", "entidades": [(nombre, ent_id, label), ...], "segundos"}.
+    preprocesado: None lee la imagen original; un dict (p. ej. PREPROCESADO_POR_DEFECTO) la reduce antes del OCR.
+    usar_cache: reutiliza el OCR de la misma imagen y las entidades del mismo texto (ver cache_ocr y cache_textos).
+    Con aproximado=True añade "aproximadas": [(nombre, ent_id, label, confianza), ...], los disruptores que solo
+    aparecen con errores de OCR (ver nlp_aproximado), como respaldo tras el matching exacto.
+    Con trazas=True añade "tramos": los tiempos, CPU y memoria de cada paso (ver instrumentacion).
+    """
+    inicio = time.perf_counter()
+    with recoger() if trazas else contextlib.nullcontext() as tramos, tramo("analisis.imagen"):
+        with tramo("analisis.ocr", cache=usar_cache):
+            if usar_cache:
+                texto = obtener_cache().ocr(imagen, idiomas, gpu, preprocesado)["texto"]
+            else:
+                texto = leer_texto(imagen, idiomas, gpu, preprocesado)
+        with tramo("nlp.normalize"):
+            texto_normalizado = normalize(texto)
+        with _lock_nlp:
+            nlp = cargar_pipeline()
+            entidades = analizar_normalizado(texto_normalizado, nlp, cache=obtener_cache_textos(nlp) if usar_cache else None)
+        if aproximado:
+            with tramo("nlp.aproximado"):
+                aproximadas = entidades_no_exactas(texto_normalizado, entidades)
+    resultado = {"texto": texto, "texto_normalizado": texto_normalizado, "entidades": entidades,
+                 "segundos": round(time.perf_counter() - inicio, 3)}
+    if aproximado:
+        resultado["aproximadas"] = aproximadas
+    if trazas:
+        resultado["tramos"] = tramos
+    return resultado
+
+
+def analizar_textos_lote(textos, batch_size=256, usar_cache=True):
+    """
+    NER de varios textos de ingredientes en un solo nlp.pipe. Devuelve [[(nombre, ent_id, label), ...], ...].
+    Con usar_cache, los textos ya analizados (muchos productos comparten ingredientes) no pasan por spaCy.
+    """
+    with _lock_nlp:
+        nlp = cargar_pipeline()
+        cache = obtener_cache_textos(nlp) if usar_cache else None
+        return list(analizar_textos(textos, nlp, batch_size=batch_size, cache=cache))
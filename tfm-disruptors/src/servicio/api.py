@@ -0,0 +1,226 @@
+import io
+import json
+import time
+import base64
+import argparse
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from PIL import Image, UnidentifiedImageError
+
+from src.ocr.ocr_reader import IDIOMAS_POR_DEFECTO
+from src.nlp.nlp_entityruler import cargar_pipeline
+from src.servicio.analisis import iniciar_modelos, analizar_imagen, analizar_textos_lote
+from src.instrumentacion import activar, prometheus
+
+# PARA EJECUTAR:  python -m src.servicio.api --port 8000
+# Servicio HTTP sin interfaz para puntuar etiquetas (imagen) y listas de ingredientes (texto).
+# Los modelos OCR y NLP se cargan al arrancar; cada petición solo paga el análisis.
+#
+#   POST /score-image    cuerpo: bytes de la imagen          -> {"entidades": [[nombre, ent_id, label], ...], "ms"}
+#   POST /score-images   {"imagenes": [base64, ...]}         -> {"resultados": [{"entidades": [...]}, ...], "ms"}
+#   POST /score-text     {"texto": "..."}                    -> {"entidades": [...], "ms"}
+#   POST /score-texts    {"textos": ["...", ...]}            -> {"resultados": [[...], ...], "ms"}
+#   GET  /salud                                              -> {"ok": true, "carga_s": {...}}
+#   GET  /metricas                                           -> totales por tramo en formato Prometheus (con --trazas)
+# En las rutas de imagen, ?texto=1 añade el texto OCR y el normalizado a la respuesta y ?aproximado=1 añade
+# "aproximadas": los disruptores que solo se encuentran con errores de OCR, con su confianza (ver nlp_aproximado).
+# Con --sin-ocr solo se carga el NLP y las rutas de imagen responden 503 (despliegue solo texto).
+# Errores: 400 (JSON o imagen no válidos), 411 (sin Content-Length, p. ej. chunked), 413 (cuerpo > MAX_BYTES).
+
+MAX_BYTES = 20 * 1024 * 1024   # tamaño máximo del cuerpo de una petición
+MAX_LOTE = 1000                # nº máximo de textos o imágenes por petición
+
+
+class ErrorPeticion(Exception):
+    """Petición mal formada: se responde con 400 y el mensaje."""
+
+
+class CuerpoDemasiadoGrande(ErrorPeticion):
+    """Cuerpo mayor que MAX_BYTES: se responde con 413 y se cierra la conexión sin leerlo."""
+
+
+class LongitudRequerida(ErrorPeticion):
+    """Cuerpo sin Content-Length (p. ej. Transfer-Encoding: chunked): se responde con 411 y se cierra la conexión."""
+
+
+class ServicioNoDisponible(Exception):
+    """Ruta no disponible con la configuración del servicio: se responde con 503."""
+
+
+def _campo_json(cuerpo, campo):
+    try:
+        return json.loads(cuerpo)[campo]
+    except (ValueError, KeyError, TypeError):
+        raise ErrorPeticion(f'Se esperaba un JSON con el campo "{campo}"')
+
+
+def _cadena(cuerpo, campo):
+    valor = _campo_json(cuerpo, campo)
+    if not isinstance(valor, str):
+        raise ErrorPeticion(f'"{campo}" debe ser una cadena')
+    return valor
+
+
+def _lista_de_cadenas(cuerpo, campo):
+    valores = _campo_json(cuerpo, campo)
+    if not isinstance(valores, list) or not all(isinstance(v, str) for v in valores):
+        raise ErrorPeticion(f'"{campo}" debe ser una lista de cadenas')
+    if len(valores) > MAX_LOTE:
+        raise ErrorPeticion(f"Como máximo {MAX_LOTE} elementos por petición")
+    return valores
+
+
+def _respuesta_imagen(resultado, con_texto):
+    respuesta = {"entidades": resultado["entidades"]}
+    if "aproximadas" in resultado:
+        respuesta["aproximadas"] = resultado["aproximadas"]
+    if con_texto:
+        respuesta["texto"] = resultado["texto"]
+        respuesta["texto_normalizado"] = resultado["texto_normalizado"]
+    return respuesta
+
+
+class ManejadorPuntuacion(BaseHTTPRequestHandler):
+    """Manejador de las rutas del servicio. La configuración (idiomas, gpu) está en self.server."""
+
+    protocol_version = "HTTP/1.1"   # conexiones persistentes: el cliente no reabre el socket en cada petición
+
+    def _responder(self, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _leer_cuerpo(self):
+        # Si el cuerpo no se lee entero, sus bytes se tomarían como la siguiente petición de la conexión
+        # persistente: en esos casos se responde y se cierra la conexión
+        if self.headers.get("Transfer-Encoding", "identity").lower() != "identity":
+            self.close_connection = True
+            raise LongitudRequerida("Se requiere Content-Length (no se admite Transfer-Encoding: chunked)")
+        try:
+            longitud = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.close_connection = True
+            raise ErrorPeticion("Content-Length no válido")
+        if longitud < 0:
+            self.close_connection = True
+            raise ErrorPeticion("Content-Length no válido")
+        if longitud == 0:
+            raise ErrorPeticion("Cuerpo vacío")
+        if longitud > MAX_BYTES:
+            self.close_connection = True
+            raise CuerpoDemasiadoGrande(f"Cuerpo demasiado grande (máximo {MAX_BYTES} bytes)")
+        return self.rfile.read(longitud)
+
+    def _imagen(self, datos, aproximado=False):
+        if not self.server.ocr:
+            raise ServicioNoDisponible("OCR desactivado en este servicio (--sin-ocr)")
+        # Comprobamos que es una imagen antes del OCR: si no, el error de decodificación saldría como 500
+        try:
+            with Image.open(io.BytesIO(datos)) as img:
+                img.verify()
+        except (UnidentifiedImageError, OSError, ValueError, SyntaxError):
+            raise ErrorPeticion("No se pudo decodificar la imagen (formatos admitidos: jpg, png...)")
+        return analizar_imagen(datos, self.server.idiomas, self.server.gpu, aproximado=aproximado)
+
+    def do_GET(self):
+        ruta = urlparse(self.path).path
+        if ruta == "/salud":
+            self._responder(200, {"ok": True, "carga_s": self.server.tiempos_carga})
+        elif ruta == "/metricas":
+            cuerpo = prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+        else:
+            self._responder(404, {"error": "Ruta no encontrada"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        parametros = parse_qs(url.query)
+        con_texto = parametros.get("texto", ["0"])[0] in ("1", "true")
+        aproximado = parametros.get("aproximado", ["0"])[0] in ("1", "true")
+        inicio = time.perf_counter()
+        try:
+            cuerpo = self._leer_cuerpo()
+            if url.path == "/score-image":
+                respuesta = _respuesta_imagen(self._imagen(cuerpo, aproximado), con_texto)
+            elif url.path == "/score-images":
+                try:
+                    imagenes = [base64.b64decode(i, validate=True) for i in _lista_de_cadenas(cuerpo, "imagenes")]
+                except ValueError:
+                    raise ErrorPeticion("Las imágenes deben ir en base64")
+                respuesta = {"resultados": [_respuesta_imagen(self._imagen(i, aproximado), con_texto) for i in imagenes]}
+            elif url.path == "/score-text":
+                respuesta = {"entidades": analizar_textos_lote([_cadena(cuerpo, "texto")])[0]}
+            elif url.path == "/score-texts":
+                respuesta = {"resultados": analizar_textos_lote(_lista_de_cadenas(cuerpo, "textos"))}
+            else:
+                self._responder(404, {"error": "Ruta no encontrada"})
+                return
+        except CuerpoDemasiadoGrande as e:
+            self._responder(413, {"error": str(e)})
+            return
+        except LongitudRequerida as e:
+            self._responder(411, {"error": str(e)})
+            return
+        except ErrorPeticion as e:
+            self._responder(400, {"error": str(e)})
+            return
+        except ServicioNoDisponible as e:
+            self._responder(503, {"error": str(e)})
+            return
+        except Exception as e:
+            self._responder(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        respuesta["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+        self._responder(200, respuesta)
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+
+def crear_servidor(host="127.0.0.1", puerto=8000, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, ocr=True, silencioso=True):
+    """Carga los modelos (una sola vez) y devuelve el servidor listo para serve_forever()."""
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorPuntuacion)
+    servidor.idiomas, servidor.gpu, servidor.ocr, servidor.silencioso = tuple(idiomas), gpu, ocr, silencioso
+    if ocr:
+        servidor.tiempos_carga = iniciar_modelos(servidor.idiomas, gpu)
+    else:
+        inicio = time.perf_counter()
+        cargar_pipeline()
+        servidor.tiempos_carga = {"nlp_s": round(time.perf_counter() - inicio, 2)}
+    return servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servicio HTTP de detección de disruptores.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--idiomas", nargs="+", default=list(IDIOMAS_POR_DEFECTO))
+    parser.add_argument("--sin-gpu", dest="gpu", action="store_false", help="Leer en CPU aunque haya GPU")
+    parser.add_argument("--sin-ocr", action="store_true", help="Solo carga el NLP (rutas de texto)")
+    parser.add_argument("--log", action="store_true", help="Registra cada petición en la consola")
+    parser.add_argument("--trazas", nargs="?", const="", default=None,
+                        help="Mide cada paso (ver /metricas); con una ruta guarda además cada tramo en JSON lines")
+    args = parser.parse_args()
+
+    if args.trazas is not None:
+        activar(args.trazas or None)
+
+    servidor = crear_servidor(args.host, args.port, args.idiomas, args.gpu, ocr=not args.sin_ocr, silencioso=not args.log)
+    print(f"Modelos cargados {servidor.tiempos_carga} | Escuchando en http://{args.host}:{args.port}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
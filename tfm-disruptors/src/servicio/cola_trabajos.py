@@ -0,0 +1,91 @@
+import time
+import uuid
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from src.ocr.ocr_reader import IDIOMAS_POR_DEFECTO
+from src.nlp.nlp_entityruler import construir_pipeline
+from src.servicio.analisis import iniciar_modelos, analizar_imagen
+
+
+class ColaTrabajos:
+    """
+    Cola de trabajos OCR + NER en segundo plano con un pool de procesos.
+    Cada worker carga su lector OCR y su pipeline NLP una sola vez (en caliente para todos los trabajos).
+    La interfaz envía la imagen en memoria, recibe un id de trabajo y consulta su estado:
+    no hay archivos temporales compartidos y el rendimiento crece con el nº de workers.
+    """
+
+    def __init__(self, n_workers=2, idiomas=IDIOMAS_POR_DEFECTO, gpu=True, ttl_segundos=3600):
+        self.idiomas = tuple(idiomas)
+        self.gpu = gpu
+        self.n_workers = n_workers
+        self.ttl_segundos = ttl_segundos
+        # El pipeline NLP se compila aquí (si falta) antes de arrancar el pool: si lo compilaran los initializers
+        # a la vez y uno fallara, toda la cola quedaría en BrokenProcessPool. Los workers solo lo cargan
+        construir_pipeline()
+        self._pool = ProcessPoolExecutor(max_workers=n_workers, initializer=iniciar_modelos,
+                                         initargs=(self.idiomas, gpu))
+        self._trabajos = {}   # id -> (futuro, instante de envío)
+        self._lock = threading.Lock()
+
+    def calentar(self):
+        """
+        Envía n_workers tareas de carga de modelos y espera a que terminen, para que el pool arranque sus procesos
+        antes del primer trabajo. ProcessPoolExecutor no garantiza que cada tarea caiga en un worker distinto,
+        así que es una ayuda: un worker que no reciba ninguna carga sus modelos (en el initializer) con su primer
+        trabajo. Devuelve los tiempos de carga de cada tarea.
+        """
+        futuros = [self._pool.submit(iniciar_modelos, self.idiomas, self.gpu) for _ in range(self.n_workers)]
+        return [f.result() for f in futuros]
+
+    def enviar(self, imagen, **kwargs):
+        """
+        Encola el análisis de una imagen (bytes) y devuelve el id del trabajo.
+        kwargs van a analizar_imagen (preprocesado, usar_cache, trazas).
+        """
+        self._limpiar()
+        futuro = self._pool.submit(analizar_imagen, bytes(imagen), self.idiomas, self.gpu, **kwargs)
+        id_trabajo = uuid.uuid4().hex
+        with self._lock:
+            self._trabajos[id_trabajo] = (futuro, time.time())
+        return id_trabajo
+
+    def estado(self, id_trabajo):
+        """
+        Estado de un trabajo: {"estado": "pendiente" | "en_curso" | "terminado" | "error" | "desconocido",
+        "resultado": dict o None, "error": str o None}.
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+        if trabajo is None:
+            return {"estado": "desconocido", "resultado": None, "error": None}
+
+        futuro = trabajo[0]
+        if not futuro.done():
+            return {"estado": "en_curso" if futuro.running() else "pendiente", "resultado": None, "error": None}
+        error = futuro.exception()
+        if error is not None:
+            return {"estado": "error", "resultado": None, "error": f"{type(error).__name__}: {error}"}
+        return {"estado": "terminado", "resultado": futuro.result(), "error": None}
+
+    def esperar(self, id_trabajo, intervalo=0.2, timeout=None):
+        """Consulta el trabajo cada 'intervalo' segundos hasta que termine (o venza el timeout)."""
+        inicio = time.time()
+        while True:
+            estado = self.estado(id_trabajo)
+            if estado["estado"] in ("terminado", "error", "desconocido"):
+                return estado
+            if timeout is not None and time.time() - inicio > timeout:
+                return estado
+            time.sleep(intervalo)
+
+    def _limpiar(self):
+        """Olvida los trabajos terminados hace más de ttl_segundos para no acumular resultados."""
+        limite = time.time() - self.ttl_segundos
+        with self._lock:
+            for id_trabajo in [i for i, (f, t) in self._trabajos.items() if t < limite and f.done()]:
+                del self._trabajos[id_trabajo]
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
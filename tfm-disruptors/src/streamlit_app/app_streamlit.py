@@ -1,12 +1,12 @@
 import os
-from pathlib import Path
-import tempfile
+import contextlib
 import pandas as pd
-import spacy
 import streamlit as st
-from src.nlp.nlp_entityruler import cargar_entity_ruler,  analizar_texto
-from src.nlp.nlp_functions import normalize, make_ent_id
-from src.ocr.ocr_process import procesar_ocr
+from src.nlp.nlp_entityruler import RUTA_DISRUPTORES, hash_parquet
+from src.nlp.nlp_fichas import construir_indice_fichas, fichas_detectadas
+from src.utils_hash import hash_bytes
+from src.servicio.cola_trabajos import ColaTrabajos
+from src.instrumentacion import recoger
  
 
 # PARA EJECUTAR CODIGO PONER EN LA TERMINAL->   python -m streamlit run src/streamlit_app/app_streamlit.py
@@ -14,28 +14,73 @@ from src.ocr.ocr_process import procesar_ocr
 st.set_page_config(page_title="Detector de Disruptores", layout="centered")
 st.title("🧪 Detector de Disruptores Endocrinos en Cosméticos")
 
+
+@st.cache_resource
+def obtener_cola():
+    """
+    Cola de trabajos compartida por todas las sesiones: sus workers tienen el OCR y el NLP cargados.
+    El nº de workers se configura con la variable de entorno TFM_WORKERS (por defecto 2).
+    """
+    cola = ColaTrabajos(n_workers=int(os.environ.get("TFM_WORKERS", 2)))
+    cola.calentar()
+    return cola
+
+
+# Compilamos el pipeline y arrancamos los workers al abrir la app para que las subidas no paguen la carga de modelos
+with st.spinner("Cargando modelos OCR y NLP..."):
+    cola = obtener_cola()
+
+
+@st.cache_resource
+def cargar_indice_fichas(version_parquet):
+    """
+    Índice de fichas por ent_id, calculado una vez por versión de disruptores_final.parquet
+    (version_parquet solo sirve de clave del caché de Streamlit).
+    """
+    return construir_indice_fichas(pd.read_parquet(RUTA_DISRUPTORES))
+
+
+# Panel opcional de tiempos: los workers devuelven los tramos (OCR, normalize, EntityRuler...) de cada análisis
+mostrar_tiempos = st.sidebar.checkbox("⏱️ Mostrar tiempos por etapa", value=False)
+
+
+def tabla_tramos(tramos):
+    """Tramos de un análisis como tabla, con el nombre sangrado según su nivel de anidamiento."""
+    nivel = {}
+    for t in sorted(tramos, key=lambda t: t["inicio"]):
+        nivel[t["id"]] = nivel.get(t["padre"], -1) + 1
+    filas = [{"etapa": "\u00a0\u00a0" * nivel[t["id"]] + t["tramo"], "segundos": round(t["wall_s"], 3),
+              "cpu_s": round(t["cpu_s"], 3), "rss_pico_mb": t["rss_pico_mb"], "inicio": t["inicio"]}
+             for t in tramos]
+    return pd.DataFrame(filas).sort_values("inicio").drop(columns="inicio")
+
+
 uploaded_file = st.file_uploader("📸 Sube una foto de la etiqueta del producto", type=["jpg", "jpeg", "png"])
 
 if uploaded_file is not None:
     # Mostramos imagen subida
-    st.image(uploaded_file, caption="📷 Imagen subida", use_column_width=True)
+    st.image(uploaded_file, caption="📷 Imagen subida", use_container_width=True)
 
-    # Guardamos temporalmente
-    temp_path = "temp_img.jpg"
-    with open(temp_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    # Enviamos la imagen EN MEMORIA a la cola (sin archivos temporales) y guardamos el id del trabajo en la sesión,
+    # así los reruns de Streamlit no vuelven a encolar la misma imagen
+    imagen = uploaded_file.getvalue()
+    trabajos = st.session_state.setdefault("trabajos", {})
+    clave = f"{hash_bytes(imagen)}-{int(mostrar_tiempos)}"
+    if clave not in trabajos or cola.estado(trabajos[clave])["estado"] in ("error", "desconocido"):
+        trabajos[clave] = cola.enviar(imagen, trazas=mostrar_tiempos)
 
-    # Ejecutamos flujo OCR - NLP
+    # Ejecutamos flujo OCR - NLP en los workers y consultamos hasta que termine
     with st.spinner("Analizando imagen..."):
-        nlp_model = spacy.load("en_core_web_md", disable=["ner"])
-        ruler = nlp_model.add_pipe("entity_ruler", config={"overwrite_ents": True, "validate": True}, before="ner" )
-        ruta_patrones = "./entity_ruler_patterns.jsonl"
-        ruler.from_disk(ruta_patrones) # Cargar patrones desde archivo JSONL
-        # nlp_model = cargar_entity_ruler()  # Alternativa si se quiere cargar desde función descomentar y comentar las 4 líneas anteriores.
-        texto_ocr = procesar_ocr(temp_path)
-        entidades = analizar_texto(texto_ocr, nlp_model)
-        # Normalización SOLO para mostrarla en pantalla
-        texto_normalizado = normalize(texto_ocr)
+        estado = cola.esperar(trabajos[clave])
+
+    if estado["estado"] != "terminado":
+        st.error(f"No se pudo analizar la imagen: {estado['error']}")
+        st.stop()
+
+    texto_ocr = estado["resultado"]["texto"]
+    entidades = estado["resultado"]["entidades"]
+    # Normalización SOLO para mostrarla en pantalla
+    texto_normalizado = estado["resultado"]["texto_normalizado"]
 
     # Mostramos textos
     st.subheader("📝 Texto extraído:")
@@ -43,35 +88,18 @@ if uploaded_file is not None:
     st.subheader(" ✅ Texto normalizado:")
     st.write(texto_normalizado)
 
+    tramos = list(estado["resultado"].get("tramos", []))
+
     # Mostramos entidades reconocidas
     st.subheader("⚠️ Disruptores detectados confirmados o en evaluación:")
     if entidades:
         for nombre, ids, etiqueta in entidades:
             st.write(f"🔹 **{nombre}** - {ids} - {etiqueta}")
 
-        # Ficha de disruptores detectados (filtrando POR NOMBRE y sin CAS/EC)
-        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-        processed_dir = os.path.join(base_dir, "data", "processed")
-        df = pd.read_parquet(os.path.join(processed_dir, "disruptores_final.parquet"))
-
-
-        # Elegimos columnas a usar
-        df = df[["EC Number", "CAS Number", "Fuente_original", "Anexo_cosIng", "Health_effects", "uso"]].copy()
-
-        # Mismo ID que en los patrones
-        df["detected_ids"] = df.apply(lambda r: make_ent_id(r["CAS Number"], r["EC Number"]), axis=1)
-
-        # Obtenemos IDs y NOMBRES detectados desde el analizador
-        ids_detectados = {ent[1] for ent in (entidades or []) if isinstance(ent, (list, tuple)) and len(ent) >= 2}
-        id_a_nombre = {ent[1]: ent[0] for ent in (entidades or []) if isinstance(ent, (list, tuple)) and len(ent) >= 2}
-
-        # Filtramos por ID y añadimos el nombre detectado
-        df_match = df[df["detected_ids"].isin(ids_detectados)].copy()
-        df_match["nombre_etiqueta"] = df_match["detected_ids"].map(id_a_nombre)
-
-        # Elimina duplicados por nombre para que solo muestre los nombres detectados no otros con el mismo CAS/EC Number
-        df_view = df_match.drop_duplicates(subset=["nombre_etiqueta"])
-        df_view = df_view[["nombre_etiqueta", "Fuente_original", "Anexo_cosIng", "Health_effects", "uso"]]
+        # Ficha de disruptores detectados: búsqueda por ID en el índice precalculado (sin releer el parquet)
+        with recoger() if mostrar_tiempos else contextlib.nullcontext([]) as tramos_fichas:
+            df_view = fichas_detectadas(cargar_indice_fichas(hash_parquet()), entidades)
+        tramos += tramos_fichas
 
         st.subheader("ℹ️ Información de los disruptores detectados.")
         st.text("RECUERDE: La Endocrine Society advierte que los EDC pueden tener efectos relevantes incluso en dosis muy bajas.")
@@ -83,3 +111,8 @@ if uploaded_file is not None:
     else:
         st.info("No se detectaron disruptores en el texto.")
 
+    if mostrar_tiempos and tramos:
+        st.subheader("⏱️ Tiempos por etapa")
+        st.caption("Tiempo real, CPU del proceso y pico de memoria (RSS). Si la imagen ya estaba en la caché de OCR no aparece readtext.")
+        st.table(tabla_tramos(tramos))
+
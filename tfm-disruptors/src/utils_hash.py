@@ -0,0 +1,15 @@
+import hashlib
+
+# Hashes de contenido compartidos por ETL, OCR y NLP (sin dependencias para no arrastrar pandas ni easyocr)
+
+def hash_bytes(datos: bytes) -> str:
+    """SHA-256 (hex) de un contenido en memoria."""
+    return hashlib.sha256(datos).hexdigest()
+
+def hash_archivo(ruta: str, bloque: int = 1 << 20) -> str:
+    """SHA-256 (hex) del contenido de un archivo, leído por bloques para no cargarlo entero."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for trozo in iter(lambda: f.read(bloque), b""):
+            h.update(trozo)
+    return h.hexdigest()
@@ -0,0 +1,54 @@
+import os
+import json
+
+import pandas as pd
+import pytest
+
+from src.nlp.nlp_entityruler import BASE_DIR, RUTA_DISRUPTORES, crear_entity_ruler
+from src.nlp.nlp_functions import normalize, build_patterns_from_df
+from src.nlp.nlp_matcher import MatcherDisruptores
+from src.nlp.nlp_optimizador import textos_control
+
+# PARA EJECUTAR:  python -m pytest tests/test_nlp_matcher.py
+# Paridad del matcher con trie con el EntityRuler: mismas entidades (texto, ent_id, label) en los textos etiquetados,
+# en la salida del OCR masivo (si existe) y en textos de control con cada forma de cada alias.
+
+
+def comparar_con_entity_ruler(textos, nlp_model, matcher):
+    """Lista de (texto, salida_entity_ruler, salida_matcher) que difieren (vacía = paridad)."""
+    diferencias = []
+    for texto in textos:
+        texto_norm = normalize(texto)
+        esperado = [(e.text, e.ent_id_, e.label_) for e in nlp_model(texto_norm).ents]
+        obtenido = matcher.entidades(texto_norm)
+        if esperado != obtenido:
+            diferencias.append((texto, esperado, obtenido))
+    return diferencias
+
+
+@pytest.fixture(scope="module")
+def nlp_model():
+    # Pipeline en memoria (no se guarda en data/processed ni reescribe entity_ruler_patterns.jsonl)
+    return crear_entity_ruler(pd.read_parquet(RUTA_DISRUPTORES))
+
+
+@pytest.fixture(scope="module")
+def matcher(nlp_model):
+    return MatcherDisruptores(nlp_model.get_pipe("entity_ruler").patterns)
+
+
+def test_paridad_textos_etiquetados(nlp_model, matcher):
+    textos = pd.read_parquet(RUTA_DISRUPTORES)["texto"].dropna().tolist()
+    ruta_ocr = os.path.join(BASE_DIR, "data", "processed", "ocr_output.jsonl")
+    if os.path.isfile(ruta_ocr):
+        with open(ruta_ocr, encoding="utf-8") as f:
+            textos += [r["text"] for r in map(json.loads, f) if r.get("text")]
+
+    diferencias = comparar_con_entity_ruler(textos, nlp_model, matcher)
+    assert not diferencias, diferencias[:5]
+
+
+def test_paridad_textos_control(nlp_model, matcher):
+    textos = textos_control(build_patterns_from_df(pd.read_parquet(RUTA_DISRUPTORES)))
+    diferencias = comparar_con_entity_ruler(textos, nlp_model, matcher)
+    assert not diferencias, diferencias[:5]
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+import spacy
+
+from src.nlp.nlp_entityruler import RUTA_DISRUPTORES, _entidades
+from src.nlp.nlp_functions import normalize, build_patterns_from_df
+from src.nlp.nlp_optimizador import optimizar_patrones, textos_control, ids_compartidos_patrones
+from benchmarks.corpus import textos_corpus
+
+# PARA EJECUTAR:  python -m pytest tests/test_nlp_optimizador.py
+# Paridad del optimizador de patrones: el EntityRuler con los patrones optimizados da las mismas entidades que con
+# los de build_patterns_from_df, en el corpus, en los textos de control y con alias compartidos entre varios CAS.
+
+
+def ruler_con(patrones, config):
+    nlp = spacy.blank("en")
+    nlp.add_pipe("entity_ruler", config={"overwrite_ents": True, "validate": True, **config}).add_patterns(patrones)
+    return nlp
+
+
+def diferencias(patrones, textos):
+    """Textos (normalizados) en los que el EntityRuler original y el optimizado dan entidades distintas."""
+    nlp_orig = ruler_con(patrones, {})
+    nlp_opt = ruler_con(optimizar_patrones(patrones, spacy.blank("en")), {"phrase_matcher_attr": "LOWER"})
+    textos = [normalize(t) for t in textos]
+    return [t for t, a, b in zip(textos, nlp_orig.pipe(textos), nlp_opt.pipe(textos)) if _entidades(a) != _entidades(b)]
+
+
+@pytest.fixture(scope="module")
+def disruptores():
+    return pd.read_parquet(RUTA_DISRUPTORES)
+
+
+def test_paridad_corpus(disruptores):
+    patrones = build_patterns_from_df(disruptores)
+    assert not diferencias(patrones, textos_corpus(n=5000))
+
+
+def test_paridad_textos_control(disruptores):
+    patrones = build_patterns_from_df(disruptores)
+    assert not diferencias(patrones, textos_control(patrones))
+
+
+def test_paridad_alias_compartidos(disruptores):
+    """El mismo alias con otro CAS (y con guiones en lugar de espacios): el desempate no debe cambiar."""
+    mismo_nombre = disruptores.sample(60, random_state=1).copy()
+    mismo_nombre["CAS Number"] = [f"999-{i:02d}-{i % 10}" for i in range(len(mismo_nombre))]
+    mismo_nombre["EC Number"] = None
+    con_guiones = disruptores.sample(40, random_state=2).copy()
+    con_guiones["CAS Number"] = [f"888-{i:02d}-{i % 10}" for i in range(len(con_guiones))]
+    con_guiones["nombre_etiqueta"] = con_guiones["nombre_etiqueta"].str.replace(" ", "-")
+    patrones = build_patterns_from_df(pd.concat([disruptores, mismo_nombre, con_guiones], ignore_index=True))
+
+    assert ids_compartidos_patrones(patrones)
+    assert not diferencias(patrones, textos_control(patrones))
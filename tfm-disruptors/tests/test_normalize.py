@@ -0,0 +1,39 @@
+import random
+
+import pandas as pd
+
+from src.nlp.nlp_functions import normalize, normalize_series, get_tokens, to_lowercase, no_symbols
+
+# PARA EJECUTAR:  python -m pytest tests/test_normalize.py
+# Test de propiedad: normalize (una pasada) y normalize_series dan lo mismo que la implementación por pasos original.
+
+# Alfabeto con los casos delicados: guiones unicode, comas, acentos, mayúsculas no ASCII que al bajarlas dan ASCII
+ALFABETO = ("abcXYZ019" + "-,;:/()[]. \t\n" + "‐–—−" + "áéíñÑÜç" + "İK" + "µ%+'\"")
+
+
+def normalize_original(text):
+    """Implementación original de normalize en varias pasadas (referencia)."""
+    words = get_tokens(text)
+    words = to_lowercase(words)
+    words = no_symbols(words)
+    return " ".join(words)
+
+
+def casos_aleatorios(n_casos=20000, semilla=0):
+    rnd = random.Random(semilla)
+    casos = ["".join(rnd.choice(ALFABETO) for _ in range(rnd.randint(0, 60))) for _ in range(n_casos)]
+    return casos + [None, float("nan"), 123, ""]
+
+
+def test_normalize_igual_que_original():
+    fallos = [c for c in casos_aleatorios() if normalize(c) != normalize_original(c)]
+    assert not fallos, f"{len(fallos)} diferencias, p. ej. {fallos[:3]!r}"
+
+
+def test_normalize_series_igual_que_normalize():
+    """La versión vectorizada da lo mismo que normalize salvo en nulos, que se mantienen nulos."""
+    casos = casos_aleatorios()
+    esperado = [None if pd.isna(c) else normalize(c) for c in casos]
+    obtenido = [None if pd.isna(v) else v for v in normalize_series(pd.Series(casos, dtype=object))]
+    fallos = [c for c, e, o in zip(casos, esperado, obtenido) if e != o]
+    assert not fallos, f"{len(fallos)} diferencias, p. ej. {fallos[:3]!r}"